@@ -1,5 +1,6 @@
-from django.contrib import admin
-from .models import AppointmentStatus, Appointment, AppointmentHistory
+from django.contrib import admin, messages
+from .models import AppointmentStatus, Appointment, AppointmentHistory, DailyAvailability, DoctorDailyStats, WaitlistEntry
+from .transitions import apply_transition, TransitionError
 
 @admin.register(AppointmentStatus)
 class AppointmentStatusAdmin(admin.ModelAdmin):
@@ -13,10 +14,59 @@ class AppointmentAdmin(admin.ModelAdmin):
     search_fields = ('booking_id', 'patient__email', 'doctor__user__email')
     date_hierarchy = 'appointment_date'
     readonly_fields = ('booking_id', 'created_at', 'updated_at')
+    actions = ('mark_confirmed', 'mark_completed', 'mark_cancelled', 'mark_no_show')
+
+    def _transition(self, request, queryset, to_status):
+        try:
+            moved = apply_transition(queryset, to_status, changed_by=request.user)
+        except TransitionError as e:
+            self.message_user(request, str(e), messages.ERROR)
+            return
+        skipped = queryset.count() - len(moved)
+        self.message_user(request, f"{len(moved)} appointment(s) marked as {to_status}, {skipped} skipped.")
+
+    @admin.action(description='Mark selected appointments as confirmed')
+    def mark_confirmed(self, request, queryset):
+        self._transition(request, queryset, 'confirmed')
+
+    @admin.action(description='Mark selected appointments as completed')
+    def mark_completed(self, request, queryset):
+        self._transition(request, queryset, 'completed')
+
+    @admin.action(description='Cancel selected appointments')
+    def mark_cancelled(self, request, queryset):
+        self._transition(request, queryset, 'cancelled')
+
+    @admin.action(description='Mark selected appointments as no-show')
+    def mark_no_show(self, request, queryset):
+        self._transition(request, queryset, 'no_show')
 
 @admin.register(AppointmentHistory)
 class AppointmentHistoryAdmin(admin.ModelAdmin):
     list_display = ('appointment', 'old_status', 'new_status', 'changed_by', 'created_at')
     list_filter = ('old_status', 'new_status')
     search_fields = ('appointment__booking_id',)
-    readonly_fields = ('created_at',)
\ No newline at end of file
+    readonly_fields = ('created_at',)
+
+@admin.register(DailyAvailability)
+class DailyAvailabilityAdmin(admin.ModelAdmin):
+    list_display = ('doctor', 'clinic', 'date', 'total_slots', 'booked_slots', 'free_slots', 'updated_at')
+    list_filter = ('date',)
+    search_fields = ('doctor__user__first_name', 'doctor__user__last_name')
+    date_hierarchy = 'date'
+    readonly_fields = ('updated_at',)
+
+@admin.register(DoctorDailyStats)
+class DoctorDailyStatsAdmin(admin.ModelAdmin):
+    list_display = ('doctor', 'date', 'appointments', 'completed', 'cancelled', 'no_shows', 'revenue', 'new_patients')
+    list_filter = ('date',)
+    search_fields = ('doctor__user__first_name', 'doctor__user__last_name')
+    date_hierarchy = 'date'
+    readonly_fields = ('updated_at',)
+
+@admin.register(WaitlistEntry)
+class WaitlistEntryAdmin(admin.ModelAdmin):
+    list_display = ('patient', 'doctor', 'start_date', 'end_date', 'status', 'offered_date', 'offered_time', 'created_at')
+    list_filter = ('status',)
+    search_fields = ('patient__email', 'doctor__user__email')
+    readonly_fields = ('offered_at', 'created_at')
@@ -0,0 +1,149 @@
+import logging
+from datetime import datetime, timedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from django_redis.exceptions import ConnectionInterrupted
+from redis.exceptions import RedisError
+from .registry import appointment_statuses
+
+logger = logging.getLogger(__name__)
+
+CACHE_ERRORS = (ConnectionInterrupted, RedisError)
+
+# A doctor's agenda for one day is cached whole under agenda:<doctor>:<date>
+# and dropped after commit by anything that changes that day.
+
+
+def _cache_key(doctor_id, day):
+    return f"agenda:{doctor_id}:{day.isoformat()}"
+
+
+def _end_time(start, minutes):
+    return (datetime.combine(datetime.min, start) + timedelta(minutes=minutes)).time()
+
+
+def _hhmm(value):
+    return value.strftime('%H:%M') if value else None
+
+
+def build_agenda(doctor_id, day):
+    """
+    Return a doctor's day as plain data, in three queries.
+
+    ``blocks`` are the day's working hours per clinic; ``timeline`` merges
+    the appointments (with a PatientProfile summary of each patient) and the
+    unavailability gaps in time order.
+    """
+    from doctors.models import Schedule, Unavailability
+    from .models import Appointment
+
+    blocks = [
+        {
+            'clinic_id': schedule.clinic_id,
+            'clinic_name': schedule.clinic.name,
+            'start_time': _hhmm(schedule.start_time),
+            'end_time': _hhmm(schedule.end_time),
+            'slot_duration': schedule.slot_duration,
+        }
+        for schedule in Schedule.objects.filter(
+            doctor_id=doctor_id, day_of_week=day.weekday(), is_active=True
+        ).select_related('clinic').order_by('start_time')
+    ]
+
+    timeline = [
+        {
+            'type': 'unavailable',
+            'start_time': None if gap.is_full_day else _hhmm(gap.start_time),
+            'end_time': None if gap.is_full_day else _hhmm(gap.end_time),
+            'is_full_day': gap.is_full_day,
+            'reason': gap.reason,
+        }
+        for gap in Unavailability.objects.filter(doctor_id=doctor_id, date=day)
+    ]
+
+    appointments = Appointment.objects.filter(doctor_id=doctor_id, appointment_date=day).select_related(
+        'patient__patient_profile'
+    ).only(
+        'id', 'booking_id', 'clinic_id', 'appointment_time', 'duration', 'status_id', 'payment_status', 'symptoms',
+        'patient__id', 'patient__first_name', 'patient__last_name', 'patient__phone', 'patient__date_of_birth',
+        'patient__gender', 'patient__patient_profile__blood_group', 'patient__patient_profile__allergies',
+        'patient__patient_profile__medical_history'
+    ).order_by('appointment_time', 'id')
+    for appointment in appointments:
+        patient = appointment.patient
+        # Not every patient has a profile; the reverse one-to-one raises if missing
+        profile = getattr(patient, 'patient_profile', None)
+        timeline.append({
+            'type': 'appointment',
+            'id': appointment.id,
+            'booking_id': appointment.booking_id,
+            'clinic_id': appointment.clinic_id,
+            'start_time': _hhmm(appointment.appointment_time),
+            'end_time': _hhmm(_end_time(appointment.appointment_time, appointment.duration)),
+            'duration': appointment.duration,
+            'status_name': appointment_statuses.get_by_id(appointment.status_id).name,
+            'payment_status': appointment.payment_status,
+            'symptoms': appointment.symptoms,
+            'patient': {
+                'id': patient.id,
+                'name': patient.get_full_name(),
+                'phone': patient.phone,
+                'date_of_birth': patient.date_of_birth.isoformat() if patient.date_of_birth else None,
+                'gender': patient.gender,
+                'blood_group': profile.blood_group if profile else '',
+                'allergies': profile.allergies if profile else '',
+                'medical_history': profile.medical_history if profile else '',
+            },
+        })
+    # Full-day gaps first, then everything by start time
+    timeline.sort(key=lambda entry: (entry['start_time'] is not None, entry['start_time'] or ''))
+
+    return {
+        'doctor_id': doctor_id,
+        'date': day.isoformat(),
+        'blocks': blocks,
+        'timeline': timeline,
+    }
+
+
+def get_agenda(doctor_id, day):
+    """Return the doctor's agenda for ``day`` from the cache, building it on a miss."""
+    key = _cache_key(doctor_id, day)
+    try:
+        agenda = cache.get(key)
+    except CACHE_ERRORS:
+        logger.warning('Agenda cache unavailable', exc_info=True)
+        return build_agenda(doctor_id, day)
+    if agenda is None:
+        agenda = build_agenda(doctor_id, day)
+        try:
+            cache.set(key, agenda, settings.AGENDA_CACHE_SECONDS)
+        except CACHE_ERRORS:
+            logger.warning('Could not cache agenda', exc_info=True)
+    return agenda
+
+
+def invalidate_agenda(doctor_id, dates=None):
+    """
+    Drop a doctor's cached agendas for ``dates`` once the current transaction commits.
+
+    Without ``dates`` (a weekly schedule changed) every day from today to the
+    end of the availability horizon is dropped; older days expire on their own.
+    """
+    if doctor_id is None:
+        return
+    if dates is None:
+        today = timezone.localdate()
+        dates = [today + timedelta(days=offset) for offset in range(settings.AVAILABILITY_HORIZON_DAYS + 1)]
+    keys = [_cache_key(doctor_id, day) for day in set(dates) if day is not None]
+    if keys:
+        transaction.on_commit(lambda: _delete(keys), robust=True)
+
+
+def _delete(keys):
+    try:
+        cache.delete_many(keys)
+    except CACHE_ERRORS:
+        logger.warning('Could not invalidate cached agendas', exc_info=True)
@@ -0,0 +1,134 @@
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from .slots import SlotEngine
+
+
+def horizon(today=None):
+    """Return the (start, end) dates kept in the DailyAvailability table."""
+    today = today or timezone.localdate()
+    return today, today + timedelta(days=settings.AVAILABILITY_HORIZON_DAYS)
+
+
+def build_rows(engine, doctor_ids, dates):
+    """Build unsaved DailyAvailability rows from a loaded SlotEngine."""
+    from .models import DailyAvailability
+
+    rows = []
+    for doctor_id in doctor_ids:
+        for day in dates:
+            # Days without working hours still get a row so that the table
+            # tells "no slots" apart from "not materialized yet"
+            counts = engine.counts(doctor_id, day) or {None: (0, 0, 0)}
+            for clinic_id, (total, booked, free) in counts.items():
+                rows.append(DailyAvailability(
+                    doctor_id=doctor_id,
+                    clinic_id=clinic_id,
+                    date=day,
+                    total_slots=total,
+                    booked_slots=booked,
+                    free_slots=free
+                ))
+    return rows
+
+
+def rebuild_availability(doctor_ids, start=None, end=None, dates=None):
+    """
+    Recompute DailyAvailability rows for doctors over a date range.
+
+    When ``dates`` is given only those days are rewritten, which is what
+    the booking and schedule signals use for incremental refreshes.
+    Returns the number of rows written.
+    """
+    from doctors.models import DoctorProfile
+    from .models import DailyAvailability
+
+    doctor_ids = sorted(set(doctor_ids))
+    horizon_start, horizon_end = horizon()
+    if dates is not None:
+        dates = sorted({day for day in dates if horizon_start <= day <= horizon_end})
+        if not dates:
+            return 0
+        start, end = dates[0], dates[-1]
+    else:
+        start = max(start or horizon_start, horizon_start)
+        end = min(end or horizon_end, horizon_end)
+        if start > end:
+            return 0
+    if not doctor_ids:
+        return 0
+
+    with transaction.atomic():
+        # Serialize refreshes per doctor; NO KEY UPDATE does not block
+        # appointment inserts that reference the doctor row.
+        list(DoctorProfile.objects.select_for_update(no_key=True).filter(
+            pk__in=doctor_ids
+        ).order_by('pk').values_list('pk', flat=True))
+        # Read only once the lock is held, so a refresh that waited on an
+        # earlier one writes a snapshot at least as new as what it replaces
+        engine = SlotEngine(doctor_ids, start, end)
+        if dates is None:
+            dates = list(engine.dates())
+        rows = build_rows(engine, doctor_ids, dates)
+        DailyAvailability.objects.filter(doctor_id__in=doctor_ids, date__in=dates).delete()
+        DailyAvailability.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
+
+
+def schedule_refresh(doctor_id, dates=None):
+    """
+    Refresh a doctor's availability once the current transaction commits.
+
+    The change is committed by then, so a failed refresh is logged instead of
+    failing the request; the next refresh of those days repairs them.
+    """
+    if doctor_id is None:
+        return
+    dates = list(dates) if dates is not None else None
+    transaction.on_commit(lambda: rebuild_availability([doctor_id], dates=dates), robust=True)
+
+
+def prune_availability(before=None):
+    """Delete rows that have rolled out of the horizon."""
+    from .models import DailyAvailability
+
+    before = before or timezone.localdate()
+    deleted, _ = DailyAvailability.objects.filter(date__lt=before).delete()
+    return deleted
+
+
+def availability_summary(doctor_id, dates, now=None):
+    """
+    Return {date: (total, booked, free)} for a doctor.
+
+    Dates inside the horizon are read from DailyAvailability; today and any
+    date that has not been materialized are computed live in one engine pass.
+    """
+    from django.db.models import Sum
+    from .models import DailyAvailability
+
+    now = now or timezone.localtime()
+    today = now.date()
+    summary = {}
+    stored = DailyAvailability.objects.filter(
+        doctor_id=doctor_id,
+        date__in=[day for day in dates if day > today]
+    ).values('date').annotate(
+        total=Sum('total_slots'),
+        booked=Sum('booked_slots'),
+        free=Sum('free_slots')
+    ).order_by()
+    for row in stored:
+        summary[row['date']] = (row['total'], row['booked'], row['free'])
+
+    missing = [day for day in dates if day >= today and day not in summary]
+    if missing:
+        engine = SlotEngine([doctor_id], min(missing), max(missing))
+        for day in missing:
+            counts = engine.counts(doctor_id, day).values()
+            total = sum(count[0] for count in counts)
+            booked = sum(count[1] for count in counts)
+            free = len(engine.free_slots(doctor_id, day, now=now))
+            summary[day] = (total, booked, free)
+    return summary
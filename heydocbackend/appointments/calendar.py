@@ -0,0 +1,138 @@
+import hashlib
+from datetime import timedelta, timezone as dt_timezone
+from django.core import signing
+from django.db.models import Count, Max, Q
+from django.utils import timezone
+from django.utils.crypto import salted_hmac
+from .expressions import window_bounds
+from .registry import appointment_statuses
+
+FEED_SALT = 'appointments.calendar-feed'
+
+# Days of appointments before and after today included in a feed
+FEED_PAST_DAYS = 30
+FEED_FUTURE_DAYS = 365
+
+# Rows fetched per round trip of the server-side cursor
+FEED_CHUNK_SIZE = 500
+
+
+def _user_key(user):
+    # Changing the password invalidates every feed URL handed out before
+    return salted_hmac(FEED_SALT, user.password).hexdigest()[:16]
+
+
+def feed_token(user):
+    """Return the token of ``user``'s calendar feed URL."""
+    return signing.dumps({'user': user.pk, 'key': _user_key(user)}, salt=FEED_SALT)
+
+
+def user_for_token(token):
+    """Return the user a feed token was issued to, or None if it is invalid or revoked."""
+    from accounts.models import CustomUser
+
+    try:
+        payload = signing.loads(token, salt=FEED_SALT)
+        user = CustomUser.objects.only(
+            'id', 'password', 'is_doctor', 'is_active', 'first_name', 'last_name'
+        ).get(pk=payload['user'], is_active=True)
+    except (signing.BadSignature, KeyError, TypeError, CustomUser.DoesNotExist):
+        return None
+    return user if payload.get('key') == _user_key(user) else None
+
+
+def feed_appointments(user, today=None):
+    """
+    Return the user's appointments inside the feed window, as a doctor or as a patient.
+
+    The window is a starts_at range, so the feed reads one range of the
+    patient or doctor timeline index.
+    """
+    from .models import Appointment
+
+    today = today or timezone.localdate()
+    owner = Q(doctor__user=user) if user.is_doctor else Q(patient=user)
+    return Appointment.objects.filter(
+        owner,
+        starts_at__gte=window_bounds(today - timedelta(days=FEED_PAST_DAYS)).lower,
+        starts_at__lt=window_bounds(today + timedelta(days=FEED_FUTURE_DAYS)).upper
+    )
+
+
+def feed_etag(user, appointments, today=None):
+    """
+    Return the ETag of a feed: it changes when a row in the window changes, enters or leaves it.
+
+    Count and latest updated_at are answered from the timeline index, which
+    carries updated_at, so an unchanged feed never reads the appointment rows.
+    """
+    today = today or timezone.localdate()
+    summary = appointments.aggregate(total=Count('*'), last_updated=Max('updated_at'))
+    last_updated = summary['last_updated'].isoformat() if summary['last_updated'] else ''
+    version = f"{user.pk}:{int(user.is_doctor)}:{today.isoformat()}:{summary['total']}:{last_updated}"
+    return hashlib.sha256(version.encode()).hexdigest()[:32]
+
+
+def _escape(value):
+    return (
+        value.replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+        .replace('\r\n', '\\n').replace('\n', '\\n')
+    )
+
+
+def _fold(line):
+    """Split a content line into 75-octet pieces, as RFC 5545 requires."""
+    encoded = line.encode()
+    if len(encoded) <= 75:
+        return line + '\r\n'
+    parts, start, limit = [], 0, 75
+    while start < len(encoded):
+        end = min(start + limit, len(encoded))
+        # Never split a multi-byte character
+        while end < len(encoded) and (encoded[end] & 0xC0) == 0x80:
+            end -= 1
+        parts.append(encoded[start:end].decode())
+        start, limit = end, 74
+    return '\r\n '.join(parts) + '\r\n'
+
+
+def _utc(value):
+    return value.astimezone(dt_timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+
+def render_feed(user, appointments, chunk_size=FEED_CHUNK_SIZE):
+    """Yield the iCalendar document of ``appointments`` a few lines at a time."""
+    yield (
+        'BEGIN:VCALENDAR\r\nVERSION:2.0\r\nPRODID:-//HeyDoc//Appointments//EN\r\n'
+        'CALSCALE:GREGORIAN\r\nMETHOD:PUBLISH\r\nX-WR-CALNAME:HeyDoc appointments\r\n'
+    )
+    # Doctors see who is coming, patients who they are seeing
+    other = ('patient__first_name', 'patient__last_name') if user.is_doctor else (
+        'doctor__user__first_name', 'doctor__user__last_name'
+    )
+    # Completed and missed visits no longer hold their slot, but did take place
+    cancelled_ids = set(appointment_statuses.ids(['cancelled']))
+    rows = appointments.order_by('starts_at', 'id').values_list(
+        'booking_id', 'starts_at', 'ends_at', 'updated_at', 'status_id', 'symptoms',
+        'clinic__name', 'clinic__address', *other
+    ).iterator(chunk_size=chunk_size)
+    for booking_id, starts_at, ends_at, updated_at, status_id, symptoms, clinic, address, first, last in rows:
+        name = f"{first} {last}".strip()
+        summary = f"Appointment with {name}" if user.is_doctor else f"Appointment with Dr. {name}"
+        lines = [
+            'BEGIN:VEVENT',
+            f'UID:{booking_id}@heydoc',
+            f'DTSTAMP:{_utc(updated_at)}',
+            f'LAST-MODIFIED:{_utc(updated_at)}',
+            f'DTSTART:{_utc(starts_at)}',
+            f'DTEND:{_utc(ends_at)}',
+            f'SUMMARY:{_escape(summary)}',
+            f"STATUS:{'CANCELLED' if status_id in cancelled_ids else 'CONFIRMED'}",
+        ]
+        if clinic:
+            lines.append(f"LOCATION:{_escape(', '.join(part for part in (clinic, address) if part))}")
+        if user.is_doctor and symptoms:
+            lines.append(f'DESCRIPTION:{_escape(symptoms)}')
+        lines.append('END:VEVENT')
+        yield ''.join(_fold(line) for line in lines)
+    yield 'END:VCALENDAR\r\n'
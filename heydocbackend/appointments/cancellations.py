@@ -0,0 +1,89 @@
+import json
+from django.db import transaction
+from .agenda import invalidate_agenda
+from .availability import schedule_refresh
+from .expressions import window_bounds
+from .transitions import apply_transition
+
+# Notification type used to tell patients their appointment was cancelled
+CANCELLED_NOTIFICATION_TYPE = 'appointment_cancelled'
+
+
+def _merge_windows(windows):
+    """Merge touching ranges so consecutive full days become one range."""
+    merged = []
+    for window in sorted(windows, key=lambda window: window.lower):
+        if merged and merged[-1].upper >= window.lower:
+            last = merged.pop()
+            window = type(window)(last.lower, max(last.upper, window.upper), '[)')
+        merged.append(window)
+    return merged
+
+
+def block_out(doctor, dates, start_time=None, end_time=None, reason='', changed_by=None):
+    """
+    Mark a doctor unavailable and cancel the appointments booked in that time.
+
+    Creates one Unavailability per date (full day unless both times are
+    given), cancels every overlapping active appointment with a single
+    transition and notifies the affected patients, all in one transaction.
+    Returns (unavailabilities, cancelled rows, notifications).
+    """
+    from doctors.models import Unavailability
+    from notifications.models import Notification
+    from notifications.registry import notification_types
+    from .models import Appointment
+
+    dates = sorted(set(dates))
+    is_full_day = start_time is None or end_time is None
+    windows = _merge_windows([window_bounds(day, start_time, end_time) for day in dates])
+
+    with transaction.atomic():
+        unavailabilities = Unavailability.objects.bulk_create([
+            Unavailability(
+                doctor=doctor,
+                date=day,
+                start_time=None if is_full_day else start_time,
+                end_time=None if is_full_day else end_time,
+                reason=reason,
+                is_full_day=is_full_day
+            )
+            for day in dates
+        ])
+
+        cancelled = apply_transition(
+            Appointment.objects.overlapping(doctor.pk, *windows),
+            'cancelled',
+            changed_by=changed_by,
+            reason=f"Doctor unavailable: {reason}" if reason else 'Doctor unavailable',
+            refresh_availability=False,
+            # The doctor is away, so there is nothing to offer
+            offer_freed_slots=False
+        )
+
+        notification_type = notification_types.get_or_create(
+            CANCELLED_NOTIFICATION_TYPE, description='An appointment was cancelled by the doctor'
+        ) if cancelled else None
+        notifications = Notification.objects.bulk_create([
+            Notification(
+                user_id=row.patient_id,
+                type=notification_type,
+                title='Appointment cancelled',
+                message=(
+                    f"Your appointment {row.booking_id} on {row.appointment_date:%B %d, %Y} at "
+                    f"{row.appointment_time:%H:%M} was cancelled because the doctor is unavailable."
+                ),
+                data=json.dumps({
+                    'appointment_id': row.id,
+                    'booking_id': row.booking_id,
+                    'date': row.appointment_date.isoformat(),
+                    'time': row.appointment_time.strftime('%H:%M'),
+                })
+            )
+            for row in cancelled
+        ], batch_size=1000)
+
+        # bulk_create and the transition skip the availability signals
+        schedule_refresh(doctor.pk, dates)
+        invalidate_agenda(doctor.pk, dates)
+    return unavailabilities, cancelled, notifications
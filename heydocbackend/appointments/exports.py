@@ -0,0 +1,105 @@
+import csv
+import json
+from rest_framework.renderers import BaseRenderer
+from .expressions import window_bounds
+from .registry import appointment_statuses
+
+# Rows fetched per round trip of the server-side cursor
+EXPORT_CHUNK_SIZE = 2000
+
+EXPORT_FORMATS = ('csv', 'ndjson')
+
+CONTENT_TYPES = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+# Columns of the export, in order
+EXPORT_COLUMNS = (
+    'booking_id', 'appointment_date', 'appointment_time', 'duration', 'status', 'payment_status',
+    'consultation_fee', 'doctor_id', 'doctor_name', 'clinic', 'patient_id', 'patient_email', 'created_at',
+)
+
+
+def export_rows(start_date=None, end_date=None, doctor_id=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Yield appointments as dicts of plain values, oldest first.
+
+    Rows are read through a server-side cursor ``chunk_size`` at a time, so
+    memory stays flat however many rows match. Both dates are inclusive.
+    """
+    from .models import Appointment
+
+    appointments = Appointment.objects.all()
+    # Bound on starts_at so a doctor's export is a range scan of the list index
+    if start_date:
+        appointments = appointments.filter(starts_at__gte=window_bounds(start_date).lower)
+    if end_date:
+        appointments = appointments.filter(starts_at__lt=window_bounds(end_date).upper)
+    if doctor_id:
+        appointments = appointments.filter(doctor_id=doctor_id)
+
+    rows = appointments.order_by('starts_at', 'id').values_list(
+        'booking_id', 'appointment_date', 'appointment_time', 'duration', 'status_id', 'payment_status',
+        'consultation_fee', 'doctor_id', 'doctor__user__first_name', 'doctor__user__last_name',
+        'clinic__name', 'patient_id', 'patient__email', 'created_at',
+        named=True
+    ).iterator(chunk_size=chunk_size)
+    for row in rows:
+        yield {
+            'booking_id': row.booking_id,
+            'appointment_date': row.appointment_date.isoformat(),
+            'appointment_time': row.appointment_time.strftime('%H:%M'),
+            'duration': row.duration,
+            'status': appointment_statuses.get_by_id(row.status_id).name,
+            'payment_status': row.payment_status,
+            'consultation_fee': str(row.consultation_fee),
+            'doctor_id': row.doctor_id,
+            'doctor_name': f"{row.doctor__user__first_name} {row.doctor__user__last_name}".strip(),
+            'clinic': row.clinic__name or '',
+            'patient_id': row.patient_id,
+            'patient_email': row.patient__email,
+            'created_at': row.created_at.isoformat(),
+        }
+
+
+class _Echo:
+    """File-like object whose write() returns the line instead of buffering it."""
+
+    def write(self, value):
+        return value
+
+
+def render_rows(rows, file_format):
+    """Yield ``rows`` as CSV (with a header line) or NDJSON text, one line at a time."""
+    if file_format == 'ndjson':
+        for row in rows:
+            yield json.dumps(row) + '\n'
+        return
+    writer = csv.writer(_Echo())
+    yield writer.writerow(EXPORT_COLUMNS)
+    for row in rows:
+        yield writer.writerow(row.values())
+
+
+class ExportRenderer(BaseRenderer):
+    """
+    Accept an export media type during content negotiation.
+
+    The export itself is a StreamingHttpResponse, which DRF does not render;
+    only error responses reach render(), and are written as JSON.
+    """
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return json.dumps(data).encode(self.charset)
+
+
+class CSVRenderer(ExportRenderer):
+    media_type = CONTENT_TYPES['csv']
+    format = 'csv'
+
+
+class NDJSONRenderer(ExportRenderer):
+    media_type = CONTENT_TYPES['ndjson']
+    format = 'ndjson'
@@ -0,0 +1,92 @@
+from datetime import datetime, timedelta
+from django.conf import settings
+from django.db import models
+from django.db.backends.postgresql.psycopg_any import DateTimeTZRange, NumericRange
+from django.contrib.postgres.fields import BigIntegerRangeField, DateTimeRangeField
+from django.utils import timezone
+
+
+def slot_bounds(date, time, duration):
+    """Return the aware [start, end) range matching SlotRange for a booking."""
+    start = timezone.make_aware(datetime.combine(date, time), timezone.get_default_timezone())
+    return DateTimeTZRange(start, start + timedelta(minutes=duration), '[)')
+
+
+def window_bounds(date, start_time=None, end_time=None):
+    """Return the aware [start, end) range of a time window, or of the whole day."""
+    tz = timezone.get_default_timezone()
+    if start_time is None or end_time is None:
+        start = timezone.make_aware(datetime.combine(date, datetime.min.time()), tz)
+        end = timezone.make_aware(datetime.combine(date + timedelta(days=1), datetime.min.time()), tz)
+    else:
+        start = timezone.make_aware(datetime.combine(date, start_time), tz)
+        end = timezone.make_aware(datetime.combine(date, end_time), tz)
+    return DateTimeTZRange(start, end, '[)')
+
+
+class SlotRange(models.Func):
+    """
+    tstzrange [start, start + duration) of an appointment.
+
+    Wall-clock date and time are interpreted in settings.TIME_ZONE; the
+    expression is immutable so it can back a stored generated column.
+    """
+    output_field = DateTimeRangeField()
+
+    def __init__(self, date='appointment_date', time='appointment_time', duration='duration', **extra):
+        super().__init__(models.F(date), models.F(time), models.F(duration), **extra)
+
+    def as_sql(self, compiler, connection, **extra_context):
+        date_sql, time_sql, duration_sql = [
+            compiler.compile(expression)[0] for expression in self.get_source_expressions()
+        ]
+        start = f"({date_sql} + {time_sql})"
+        return (
+            f"tstzrange(timezone(%s, {start}), "
+            f"timezone(%s, {start} + make_interval(mins => {duration_sql})))"
+        ), [settings.TIME_ZONE, settings.TIME_ZONE]
+
+
+class SlotStart(models.Func):
+    """Aware start of an appointment, with the same time zone rules as SlotRange."""
+    output_field = models.DateTimeField()
+
+    def __init__(self, date='appointment_date', time='appointment_time', **extra):
+        super().__init__(models.F(date), models.F(time), **extra)
+
+    def as_sql(self, compiler, connection, **extra_context):
+        date_sql, time_sql = [compiler.compile(expression)[0] for expression in self.get_source_expressions()]
+        return f"timezone(%s, ({date_sql} + {time_sql}))", [settings.TIME_ZONE]
+
+
+class SlotEnd(models.Func):
+    """Aware end (start + duration) of an appointment."""
+    output_field = models.DateTimeField()
+
+    def __init__(self, date='appointment_date', time='appointment_time', duration='duration', **extra):
+        super().__init__(models.F(date), models.F(time), models.F(duration), **extra)
+
+    def as_sql(self, compiler, connection, **extra_context):
+        date_sql, time_sql, duration_sql = [
+            compiler.compile(expression)[0] for expression in self.get_source_expressions()
+        ]
+        return f"timezone(%s, ({date_sql} + {time_sql}) + make_interval(mins => {duration_sql}))", [settings.TIME_ZONE]
+
+
+class DoctorKey(models.Func):
+    """
+    The doctor id as a single-value int8range.
+
+    GiST range_ops supports equality on ranges, so the overlap exclusion
+    constraint can be keyed per doctor without the btree_gist extension.
+    """
+    function = 'int8range'
+    output_field = BigIntegerRangeField()
+
+    def __init__(self, field='doctor', **extra):
+        super().__init__(models.F(field), models.F(field), models.Value('[]'), **extra)
+
+    @staticmethod
+    def value(doctor_id):
+        """Return the range to compare a DoctorKey() against."""
+        return NumericRange(doctor_id, doctor_id, '[]')
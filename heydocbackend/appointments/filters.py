@@ -1,10 +1,15 @@
 import django_filters
 from .models import Appointment
+from .registry import appointment_statuses
 
 class AppointmentFilter(django_filters.FilterSet):
     appointment_date = django_filters.DateFromToRangeFilter()
-    status = django_filters.CharFilter(field_name='status__name', lookup_expr='iexact')
+    status = django_filters.CharFilter(method='filter_status')
     
     class Meta:
         model = Appointment
-        fields = ['appointment_date', 'status', 'payment_status']
\ No newline at end of file
+        fields = ['appointment_date', 'status', 'payment_status']
+
+    def filter_status(self, queryset, name, value):
+        # Match the status name case-insensitively without joining the status table
+        return queryset.filter(status_id__in=appointment_statuses.ids([value], ignore_case=True))
\ No newline at end of file
@@ -0,0 +1,130 @@
+import json
+import logging
+import time as clock
+from datetime import date, datetime
+from django.conf import settings
+from django.core.cache import cache
+from django_redis import get_redis_connection
+from redis.exceptions import RedisError
+
+logger = logging.getLogger(__name__)
+
+# Slot holds live in Redis only:
+#   slot-hold:<doctor>:<date>:<HH:MM>  -> JSON owner info, SET NX with a TTL
+#   slot-holds:<doctor>:<date>         -> sorted set "<HH:MM>|<user>" scored by expiry,
+#                                         so a day's holds are listed in one round trip
+#   slot-hold-user:<doctor>:<user>     -> "<date>|<HH:MM>" of the user's checkout hold
+#                                         with that doctor, so a new one replaces it
+
+
+def _slot_key(doctor_id, day, slot_time):
+    return cache.make_key(f"slot-hold:{doctor_id}:{day.isoformat()}:{slot_time.strftime('%H:%M')}")
+
+
+def _day_key(doctor_id, day):
+    return cache.make_key(f"slot-holds:{doctor_id}:{day.isoformat()}")
+
+
+def _user_key(doctor_id, user_id):
+    return cache.make_key(f"slot-hold-user:{doctor_id}:{user_id}")
+
+
+def _member(slot_time, user_id):
+    return f"{slot_time.strftime('%H:%M')}|{user_id}"
+
+
+def place_hold(doctor_id, day, slot_time, user_id, clinic_id=None, ttl=None, waitlist_entry_id=None):
+    """
+    Reserve a slot for a user for ``ttl`` seconds (SLOT_HOLD_SECONDS by default).
+
+    Returns the hold's expiry timestamp, or None if another user holds the
+    slot. Holding a slot you already hold extends it. A user holds one slot
+    per doctor at checkout: a new hold releases their previous one. Holds
+    placed for a waitlist offer carry the offered entry's id and are not
+    counted against that limit.
+    """
+    client = get_redis_connection('default')
+    ttl = ttl or settings.SLOT_HOLD_SECONDS
+    expires_at = clock.time() + ttl
+    slot_key = _slot_key(doctor_id, day, slot_time)
+    hold = {'user_id': user_id, 'clinic_id': clinic_id, 'expires_at': expires_at}
+    if waitlist_entry_id is not None:
+        hold['waitlist_entry_id'] = waitlist_entry_id
+    value = json.dumps(hold)
+
+    if not client.set(slot_key, value, nx=True, ex=ttl):
+        current = get_hold(doctor_id, day, slot_time)
+        if not current or current['user_id'] != user_id:
+            return None
+        client.set(slot_key, value, ex=ttl)
+
+    day_key = _day_key(doctor_id, day)
+    pipe = client.pipeline()
+    pipe.zadd(day_key, {_member(slot_time, user_id): expires_at})
+    pipe.zremrangebyscore(day_key, '-inf', clock.time())
+    # Holds of different lengths share the day index, so it lives as long as the longest kind
+    pipe.expire(day_key, max(ttl, settings.SLOT_HOLD_SECONDS, settings.WAITLIST_OFFER_SECONDS))
+    pipe.execute()
+
+    if waitlist_entry_id is None:
+        slot = f"{day.isoformat()}|{slot_time.strftime('%H:%M')}"
+        previous = client.set(_user_key(doctor_id, user_id), slot, ex=ttl, get=True)
+        if previous and previous.decode() != slot:
+            previous_day, _, previous_time = previous.decode().partition('|')
+            release_hold(
+                doctor_id, date.fromisoformat(previous_day), datetime.strptime(previous_time, '%H:%M').time(), user_id
+            )
+    return expires_at
+
+
+def get_hold(doctor_id, day, slot_time):
+    """Return the owner info of a held slot, or None."""
+    try:
+        value = get_redis_connection('default').get(_slot_key(doctor_id, day, slot_time))
+    except RedisError:
+        # Holds only smooth out checkout; never block booking on Redis
+        logger.warning('Slot hold lookup failed', exc_info=True)
+        return None
+    return json.loads(value) if value else None
+
+
+def release_hold(doctor_id, day, slot_time, user_id):
+    """Release a user's hold on a slot. Returns True if a hold was removed."""
+    current = get_hold(doctor_id, day, slot_time)
+    if not current or current['user_id'] != user_id:
+        return False
+    try:
+        pipe = get_redis_connection('default').pipeline()
+        pipe.delete(_slot_key(doctor_id, day, slot_time))
+        pipe.zrem(_day_key(doctor_id, day), _member(slot_time, user_id))
+        pipe.execute()
+    except RedisError:
+        logger.warning('Slot hold release failed', exc_info=True)
+        return False
+    return True
+
+
+def held_times(doctor_id, days, exclude_user_id=None):
+    """
+    Return {date: {'HH:MM', ...}} of slots currently held by other users.
+
+    All requested days are read in a single pipelined round trip.
+    """
+    now = clock.time()
+    try:
+        pipe = get_redis_connection('default').pipeline()
+        for day in days:
+            pipe.zrangebyscore(_day_key(doctor_id, day), now, '+inf')
+        results = pipe.execute()
+    except RedisError:
+        logger.warning('Slot hold listing failed', exc_info=True)
+        return {day: set() for day in days}
+    held = {}
+    for day, members in zip(days, results):
+        times = set()
+        for member in members:
+            slot_time, _, user_id = member.decode().partition('|')
+            if exclude_user_id is None or user_id != str(exclude_user_id):
+                times.add(slot_time)
+        held[day] = times
+    return held
@@ -0,0 +1,40 @@
+import sys
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+from appointments.exports import EXPORT_CHUNK_SIZE, EXPORT_FORMATS, export_rows, render_rows
+
+
+class Command(BaseCommand):
+    help = 'Export appointments as CSV or NDJSON, streaming rows through a server-side cursor.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start-date', help='First appointment date to export (YYYY-MM-DD).')
+        parser.add_argument('--end-date', help='Last appointment date to export (YYYY-MM-DD).')
+        parser.add_argument('--doctor', type=int, help='Only export this doctor profile id.')
+        parser.add_argument('--format', dest='file_format', choices=EXPORT_FORMATS, default='csv')
+        parser.add_argument('--output', help='File to write; defaults to stdout.')
+        parser.add_argument('--chunk-size', type=int, default=EXPORT_CHUNK_SIZE,
+                            help='Rows fetched from the database per round trip.')
+
+    def handle(self, *args, **options):
+        dates = {}
+        for name in ('start_date', 'end_date'):
+            if options[name]:
+                dates[name] = parse_date(options[name])
+                if dates[name] is None:
+                    raise CommandError(f"--{name.replace('_', '-')} must be a date in YYYY-MM-DD format.")
+
+        rows = export_rows(
+            doctor_id=options['doctor'], chunk_size=max(options['chunk_size'], 1), **dates
+        )
+        output = open(options['output'], 'w', newline='') if options['output'] else sys.stdout
+        try:
+            count = -1 if options['file_format'] == 'csv' else 0
+            for line in render_rows(rows, options['file_format']):
+                output.write(line)
+                count += 1
+        finally:
+            if output is not sys.stdout:
+                output.close()
+        if options['output']:
+            self.stdout.write(self.style.SUCCESS(f"Exported {count} appointments to {options['output']}."))
@@ -0,0 +1,47 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from appointments.models import Appointment
+from appointments.registry import appointment_statuses
+from appointments.transitions import apply_transition, TransitionError
+
+
+class Command(BaseCommand):
+    help = 'Mark past appointments that were never confirmed as no_show.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace-hours', type=int, default=2,
+                            help='Hours after the start time before an appointment counts as missed.')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Appointments transitioned per transaction.')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only report how many appointments would be marked.')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(hours=options['grace_hours'])
+        missed = Appointment.objects.filter(
+            starts_at__lte=cutoff,
+            holds_slot=True,
+            status_id__in=appointment_statuses.ids(['scheduled'])
+        )
+
+        if options['dry_run']:
+            self.stdout.write(f'{missed.count()} appointments would be marked as no_show.')
+            return
+
+        batch_size = max(options['batch_size'], 1)
+        marked = 0
+        while True:
+            # Marked rows leave the 'scheduled' status, so each pass picks up the next batch
+            batch = list(missed.order_by('pk').values_list('pk', flat=True)[:batch_size])
+            if not batch:
+                break
+            try:
+                moved = apply_transition(batch, 'no_show', reason='Marked as no-show by nightly job')
+            except TransitionError as e:
+                raise CommandError(str(e))
+            if not moved:
+                break
+            marked += len(moved)
+
+        self.stdout.write(self.style.SUCCESS(f'Marked {marked} appointments as no_show.'))
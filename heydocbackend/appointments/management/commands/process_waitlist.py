@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from appointments.waitlist import process_queue
+
+
+class Command(BaseCommand):
+    help = 'Offer slots freed by cancellations to waitlisted patients.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true',
+                            help='Keep running and wait for newly freed slots.')
+        parser.add_argument('--block-timeout', type=int, default=30,
+                            help='Seconds to wait for a freed slot per poll in --loop mode.')
+
+    def handle(self, *args, **options):
+        if not options['loop']:
+            offered = process_queue()
+            self.stdout.write(self.style.SUCCESS(f'Offered {offered} freed slots.'))
+            return
+        while True:
+            offered = process_queue(block_timeout=max(options['block_timeout'], 1))
+            if offered:
+                self.stdout.write(f'Offered {offered} freed slots.')
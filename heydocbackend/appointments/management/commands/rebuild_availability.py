@@ -0,0 +1,63 @@
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+import os
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.utils import timezone
+from doctors.models import DoctorProfile
+from appointments.availability import rebuild_availability, prune_availability
+
+
+def _init_worker():
+    """Set up Django in a pool worker with fresh database connections."""
+    import django
+    django.setup()
+    connections.close_all()
+
+
+def _rebuild_chunk(doctor_ids, start, end):
+    try:
+        return rebuild_availability(doctor_ids, start, end)
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the materialized DailyAvailability table for the booking horizon.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None,
+                            help='Days ahead to rebuild (defaults to AVAILABILITY_HORIZON_DAYS).')
+        parser.add_argument('--doctor', type=int, action='append', dest='doctors',
+                            help='Only rebuild the given doctor id (repeatable).')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Number of worker processes.')
+        parser.add_argument('--chunk-size', type=int, default=200,
+                            help='Doctors per worker task.')
+
+    def handle(self, *args, **options):
+        start = timezone.localdate()
+        end = start + timedelta(days=options['days']) if options['days'] is not None else None
+
+        doctor_ids = options['doctors'] or list(
+            DoctorProfile.objects.order_by('pk').values_list('pk', flat=True)
+        )
+        chunk_size = max(options['chunk_size'], 1)
+        chunks = [doctor_ids[i:i + chunk_size] for i in range(0, len(doctor_ids), chunk_size)]
+
+        pruned = prune_availability(start)
+        written = 0
+        if options['workers'] > 1 and len(chunks) > 1:
+            # Workers must not share the parent's database connections
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=options['workers'], initializer=_init_worker) as pool:
+                futures = [pool.submit(_rebuild_chunk, chunk, start, end) for chunk in chunks]
+                for future in futures:
+                    written += future.result()
+        else:
+            for chunk in chunks:
+                written += rebuild_availability(chunk, start, end)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt availability for {len(doctor_ids)} doctors: {written} rows written, {pruned} expired rows pruned.'
+        ))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from doctors.models import DoctorProfile
+from appointments.stats import rebuild_stats
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the DoctorDailyStats rollup from the appointments table.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--doctor', type=int, action='append', dest='doctors',
+                            help='Only rebuild the given doctor id (repeatable).')
+        parser.add_argument('--chunk-size', type=int, default=50,
+                            help='Doctors rebuilt per transaction.')
+
+    def handle(self, *args, **options):
+        doctor_ids = options['doctors'] or list(
+            DoctorProfile.objects.order_by('pk').values_list('pk', flat=True)
+        )
+        chunk_size = max(options['chunk_size'], 1)
+        written = 0
+        for i in range(0, len(doctor_ids), chunk_size):
+            written += rebuild_stats(doctor_ids[i:i + chunk_size])
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt {written} daily stats rows for {len(doctor_ids)} doctors.'
+        ))
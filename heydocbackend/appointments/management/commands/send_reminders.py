@@ -0,0 +1,28 @@
+import time
+from django.core.management.base import BaseCommand
+from appointments.reminders import send_due_reminders
+from utils.locks import run_exclusive
+
+
+class Command(BaseCommand):
+    help = 'Create reminder notifications for appointments whose reminder time has passed.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Appointments claimed and reminded per transaction.')
+        parser.add_argument('--loop', action='store_true',
+                            help='Keep running, scanning every --interval seconds.')
+        parser.add_argument('--interval', type=int, default=60,
+                            help='Seconds between scans in --loop mode.')
+
+    def handle(self, *args, **options):
+        batch_size = max(options['batch_size'], 1)
+        while True:
+            sent = run_exclusive('send-reminders', send_due_reminders, batch_size=batch_size)
+            if sent is None:
+                self.stdout.write('Another worker is sending reminders; skipped.')
+            else:
+                self.stdout.write(self.style.SUCCESS(f'Sent {sent} reminders.'))
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
@@ -1,16 +1,14 @@
 from django.db import models
 from django.utils import timezone
 from datetime import datetime, timedelta
+from .registry import appointment_statuses
 
 class AppointmentManager(models.Manager):
     """Custom manager for Appointment model."""
     
     def upcoming(self):
         """Get upcoming appointments."""
-        return self.filter(
-            appointment_date__gte=timezone.now().date(),
-            status__name__in=['scheduled', 'confirmed']
-        )
+        return self.filter(starts_at__gte=timezone.now(), holds_slot=True)
 
     def today(self):
         """Get today's appointments."""
@@ -18,10 +16,23 @@ class AppointmentManager(models.Manager):
 
     def past(self):
         """Get past appointments."""
-        now = timezone.now()
-        return self.filter(
-            models.Q(appointment_date__lt=now.date()) |
-            models.Q(appointment_date=now.date(), appointment_time__lt=now.time())
+        return self.filter(starts_at__lt=timezone.now())
+
+    def overlapping(self, doctor_id, *slots):
+        """
+        Get active appointments of a doctor overlapping any of the slot ranges.
+
+        Filters on the same expressions as the overlap exclusion constraint,
+        so each range is a probe of its GiST index.
+        """
+        from .expressions import DoctorKey
+        overlaps = models.Q()
+        for slot in slots:
+            overlaps |= models.Q(slot_range__overlap=slot)
+        return self.alias(doctor_key=DoctorKey()).filter(
+            overlaps,
+            doctor_key=DoctorKey.value(doctor_id),
+            holds_slot=True
         )
 
     def for_patient(self, patient):
@@ -34,7 +45,7 @@ class AppointmentManager(models.Manager):
 
     def by_status(self, status_name):
         """Get appointments by status."""
-        return self.filter(status__name=status_name)
+        return self.filter(status_id__in=appointment_statuses.ids([status_name]))
 
     def pending_payment(self):
         """Get appointments with pending payment."""
@@ -42,8 +53,26 @@ class AppointmentManager(models.Manager):
 
     def completed(self):
         """Get completed appointments."""
-        return self.filter(status__name='completed')
+        return self.filter(status_id__in=appointment_statuses.ids(['completed']))
 
     def cancelled(self):
         """Get cancelled appointments."""
-        return self.filter(status__name='cancelled')
+        return self.filter(status_id__in=appointment_statuses.ids(['cancelled']))
+
+    def roster(self, doctor_id):
+        """
+        Get one row per patient of a doctor: visits, last visit, next appointment and last activity.
+
+        Every column it reads is in the doctor/patient index, so the grouping
+        is a single index-only pass in patient order. Most recently seen
+        patients come first.
+        """
+        completed = models.Q(status_id__in=appointment_statuses.ids(['completed']))
+        return self.filter(doctor_id=doctor_id).values('patient_id').annotate(
+            visits=models.Count('appointment_date', filter=completed),
+            last_visit=models.Max('appointment_date', filter=completed),
+            next_appointment=models.Min(
+                'appointment_date', filter=models.Q(holds_slot=True, appointment_date__gte=timezone.localdate())
+            ),
+            last_activity=models.Max('appointment_date')
+        ).order_by('-last_activity', 'patient_id')
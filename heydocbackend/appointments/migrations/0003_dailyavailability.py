@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:14
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0002_alter_appointmenthistory_options'),
+        ('doctors', '0002_alter_doctorprofile_options_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyAvailability',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('total_slots', models.PositiveIntegerField(default=0)),
+                ('booked_slots', models.PositiveIntegerField(default=0)),
+                ('free_slots', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('clinic', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='daily_availability', to='doctors.clinic')),
+                ('doctor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_availability', to='doctors.doctorprofile')),
+            ],
+            options={
+                'verbose_name_plural': 'daily availabilities',
+                'db_table': 'appointments_dailyavailability',
+                'ordering': ['date'],
+                'indexes': [models.Index(fields=['doctor', 'date'], name='appt_dailyavail_doctor_date')],
+                'unique_together': {('doctor', 'clinic', 'date')},
+            },
+        ),
+    ]
@@ -0,0 +1,80 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:16
+
+import logging
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+def populate_holds_slot(apps, schema_editor):
+    Appointment = apps.get_model('appointments', 'Appointment')
+    Appointment.objects.exclude(
+        status__name__in=['scheduled', 'confirmed']
+    ).update(holds_slot=False)
+
+
+def release_double_bookings(apps, schema_editor):
+    """
+    Cancel every active booking of a slot but the first one made.
+
+    Bookings that raced each other before the unique index existed would
+    otherwise make the index build fail. Each cancellation is recorded in
+    the appointment history and logged with its booking id.
+    """
+    Appointment = apps.get_model('appointments', 'Appointment')
+    AppointmentHistory = apps.get_model('appointments', 'AppointmentHistory')
+    AppointmentStatus = apps.get_model('appointments', 'AppointmentStatus')
+
+    duplicates = list(Appointment.objects.filter(holds_slot=True).annotate(
+        booking_rank=models.Window(
+            RowNumber(),
+            partition_by=[models.F('doctor_id'), models.F('appointment_date'), models.F('appointment_time')],
+            order_by=[models.F('created_at').asc(), models.F('id').asc()]
+        )
+    ).filter(booking_rank__gt=1).values_list('id', 'booking_id', 'status_id'))
+    if not duplicates:
+        return
+
+    cancelled, _ = AppointmentStatus.objects.get_or_create(name='cancelled')
+    Appointment.objects.filter(pk__in=[row[0] for row in duplicates]).update(
+        status=cancelled, holds_slot=False, updated_at=timezone.now()
+    )
+    AppointmentHistory.objects.bulk_create([
+        AppointmentHistory(
+            appointment_id=appointment_id, old_status_id=status_id, new_status=cancelled,
+            change_reason='Cancelled as a double booking of an already booked slot'
+        )
+        for appointment_id, booking_id, status_id in duplicates
+    ])
+    # Run the deferred foreign key checks now, before the table's schema changes
+    schema_editor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+    logger.warning(
+        'Cancelled %d double-booked appointments: %s',
+        len(duplicates), ', '.join(booking_id for _, booking_id, _ in duplicates)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0003_dailyavailability'),
+        ('doctors', '0002_alter_doctorprofile_options_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='appointment',
+            name='holds_slot',
+            field=models.BooleanField(default=True, editable=False),
+        ),
+        migrations.RunPython(populate_holds_slot, migrations.RunPython.noop),
+        migrations.RunPython(release_double_bookings, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='appointment',
+            constraint=models.UniqueConstraint(condition=models.Q(('holds_slot', True)), fields=('doctor', 'appointment_date', 'appointment_time'), name='unique_active_doctor_slot'),
+        ),
+    ]
@@ -0,0 +1,86 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:19
+
+import logging
+from collections import defaultdict
+import appointments.expressions
+import django.contrib.postgres.constraints
+import django.contrib.postgres.fields.ranges
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+def release_overlapping_bookings(apps, schema_editor):
+    """
+    Cancel active bookings that overlap an earlier booking of the same doctor.
+
+    The exclusion constraint cannot be built while overlaps exist. Bookings
+    are kept in the order they were made (created_at, then id), so the first
+    booking of a span wins. Each cancellation is recorded in the appointment
+    history and logged with its booking id.
+    """
+    Appointment = apps.get_model('appointments', 'Appointment')
+    AppointmentHistory = apps.get_model('appointments', 'AppointmentHistory')
+    AppointmentStatus = apps.get_model('appointments', 'AppointmentStatus')
+
+    active = Appointment.objects.filter(holds_slot=True)
+    candidates = active.filter(models.Exists(
+        active.filter(doctor_id=models.OuterRef('doctor_id'), slot_range__overlap=models.OuterRef('slot_range'))
+        .exclude(pk=models.OuterRef('pk'))
+    )).order_by('doctor_id', 'created_at', 'id').values_list('id', 'booking_id', 'status_id', 'doctor_id', 'slot_range')
+
+    kept = defaultdict(list)
+    overlapping = []
+    for appointment_id, booking_id, status_id, doctor_id, slot in candidates:
+        if any(slot.lower < other.upper and other.lower < slot.upper for other in kept[doctor_id]):
+            overlapping.append((appointment_id, booking_id, status_id))
+        else:
+            kept[doctor_id].append(slot)
+    if not overlapping:
+        return
+
+    cancelled, _ = AppointmentStatus.objects.get_or_create(name='cancelled')
+    Appointment.objects.filter(pk__in=[row[0] for row in overlapping]).update(
+        status=cancelled, holds_slot=False, updated_at=timezone.now()
+    )
+    AppointmentHistory.objects.bulk_create([
+        AppointmentHistory(
+            appointment_id=appointment_id, old_status_id=status_id, new_status=cancelled,
+            change_reason='Cancelled as it overlapped an earlier booking of the doctor'
+        )
+        for appointment_id, booking_id, status_id in overlapping
+    ])
+    # Run the deferred foreign key checks now, before the constraint is added
+    schema_editor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+    logger.warning(
+        'Cancelled %d overlapping appointments: %s',
+        len(overlapping), ', '.join(booking_id for _, booking_id, _ in overlapping)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0004_appointment_holds_slot'),
+        ('doctors', '0002_alter_doctorprofile_options_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='appointment',
+            name='unique_active_doctor_slot',
+        ),
+        migrations.AddField(
+            model_name='appointment',
+            name='slot_range',
+            field=models.GeneratedField(db_persist=True, expression=appointments.expressions.SlotRange(), output_field=django.contrib.postgres.fields.ranges.DateTimeRangeField()),
+        ),
+        migrations.RunPython(release_overlapping_bookings, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='appointment',
+            constraint=django.contrib.postgres.constraints.ExclusionConstraint(condition=models.Q(('holds_slot', True)), expressions=[(appointments.expressions.DoctorKey(), '='), ('slot_range', '&&')], name='exclude_overlapping_doctor_slots'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:28
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0005_appointment_slot_range'),
+        ('doctors', '0002_alter_doctorprofile_options_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='appointment',
+            name='reminder_sent_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(condition=models.Q(('holds_slot', True), ('reminder_sent_at__isnull', True)), fields=['appointment_date', 'appointment_time'], name='appt_pending_reminder_idx'),
+        ),
+    ]
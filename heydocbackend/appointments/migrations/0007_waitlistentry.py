@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:32
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0006_appointment_reminder_sent_at'),
+        ('doctors', '0002_alter_doctorprofile_options_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WaitlistEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start_date', models.DateField()),
+                ('end_date', models.DateField()),
+                ('status', models.CharField(choices=[('waiting', 'Waiting'), ('offered', 'Offered'), ('cancelled', 'Cancelled')], default='waiting', max_length=20)),
+                ('offered_date', models.DateField(blank=True, null=True)),
+                ('offered_time', models.TimeField(blank=True, null=True)),
+                ('offered_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('doctor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='waitlist_entries', to='doctors.doctorprofile')),
+                ('patient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='waitlist_entries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'waitlist entries',
+                'db_table': 'appointments_waitlistentry',
+                'ordering': ['created_at'],
+                'indexes': [models.Index(condition=models.Q(('status', 'waiting')), fields=['doctor', 'created_at'], name='appt_waitlist_queue_idx')],
+            },
+        ),
+    ]
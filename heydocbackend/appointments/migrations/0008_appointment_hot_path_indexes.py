@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:35
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('appointments', '0007_waitlistentry'),
+    ]
+
+    operations = [
+        # Build the new indexes without blocking writes
+        AddIndexConcurrently(
+            model_name='appointment',
+            index=models.Index(condition=models.Q(('holds_slot', True)), fields=['doctor', 'appointment_date', 'appointment_time'], name='appt_doctor_day_active_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='appointment',
+            index=models.Index(condition=models.Q(('holds_slot', True)), fields=['patient', 'appointment_date', 'appointment_time'], name='appt_patient_active_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='appointment',
+            index=models.Index(condition=models.Q(('payment_status', 'pending')), fields=['appointment_date'], name='appt_pending_payment_idx'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:38
+
+import appointments.expressions
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0008_appointment_hot_path_indexes'),
+        ('doctors', '0002_alter_doctorprofile_options_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='appointment',
+            name='appt_pending_reminder_idx',
+        ),
+        migrations.AddField(
+            model_name='appointment',
+            name='ends_at',
+            field=models.GeneratedField(db_persist=True, expression=appointments.expressions.SlotEnd(), output_field=models.DateTimeField()),
+        ),
+        migrations.AddField(
+            model_name='appointment',
+            name='starts_at',
+            field=models.GeneratedField(db_persist=True, expression=appointments.expressions.SlotStart(), output_field=models.DateTimeField()),
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(condition=models.Q(('holds_slot', True)), fields=['starts_at'], name='appt_active_starts_idx'),
+        ),
+    ]
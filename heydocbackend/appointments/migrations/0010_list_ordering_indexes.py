@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:40
+
+import django.db.models.deletion
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('appointments', '0009_appointment_starts_at'),
+        ('doctors', '0002_alter_doctorprofile_options_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='appointment',
+            options={'ordering': ['-starts_at', '-id']},
+        ),
+        # Build the list indexes without blocking writes, then drop the single
+        # column FK indexes they make redundant
+        AddIndexConcurrently(
+            model_name='appointment',
+            index=models.Index(fields=['patient', '-starts_at', '-id'], include=('updated_at',), name='appt_patient_timeline_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='appointment',
+            index=models.Index(fields=['doctor', '-starts_at', '-id'], include=('updated_at',), name='appt_doctor_timeline_idx'),
+        ),
+        migrations.AlterField(
+            model_name='appointment',
+            name='doctor',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='doctor_appointments', to='doctors.doctorprofile'),
+        ),
+        migrations.AlterField(
+            model_name='appointment',
+            name='patient',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='patient_appointments', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
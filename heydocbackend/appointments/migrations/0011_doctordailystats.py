@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0010_list_ordering_indexes'),
+        ('doctors', '0002_alter_doctorprofile_options_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DoctorDailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('appointments', models.PositiveIntegerField(default=0)),
+                ('scheduled', models.PositiveIntegerField(default=0)),
+                ('confirmed', models.PositiveIntegerField(default=0)),
+                ('completed', models.PositiveIntegerField(default=0)),
+                ('cancelled', models.PositiveIntegerField(default=0)),
+                ('no_shows', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('outstanding', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('new_patients', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('doctor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='doctors.doctorprofile')),
+            ],
+            options={
+                'verbose_name_plural': 'doctor daily stats',
+                'db_table': 'appointments_doctordailystats',
+                'ordering': ['date'],
+                'unique_together': {('doctor', 'date')},
+            },
+        ),
+    ]
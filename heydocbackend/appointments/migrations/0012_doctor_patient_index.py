@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:52
+
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('appointments', '0011_doctordailystats'),
+        ('doctors', '0002_alter_doctorprofile_options_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='appointment',
+            index=models.Index(fields=['doctor', 'patient', 'appointment_date'], include=('status_id', 'holds_slot'), name='appt_doctor_patient_idx'),
+        ),
+    ]
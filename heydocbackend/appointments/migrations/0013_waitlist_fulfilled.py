@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:12
+
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('appointments', '0012_doctor_patient_index'),
+        ('doctors', '0002_alter_doctorprofile_options_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='waitlistentry',
+            name='status',
+            field=models.CharField(choices=[('waiting', 'Waiting'), ('offered', 'Offered'), ('fulfilled', 'Fulfilled'), ('cancelled', 'Cancelled')], default='waiting', max_length=20),
+        ),
+        AddIndexConcurrently(
+            model_name='waitlistentry',
+            index=models.Index(condition=models.Q(('status', 'offered')), fields=['offered_at'], name='appt_waitlist_offered_idx'),
+        ),
+    ]
@@ -1,10 +1,14 @@
 from django.db import models
 from django.core.validators import MinValueValidator, MaxValueValidator
+from django.contrib.postgres.constraints import ExclusionConstraint
+from django.contrib.postgres.fields import DateTimeRangeField, RangeOperators
 from accounts.models import CustomUser
 from doctors.models import DoctorProfile, Clinic
 import uuid
 from django.utils import timezone
 from .managers import AppointmentManager
+from .expressions import DoctorKey, SlotEnd, SlotRange, SlotStart
+from .registry import appointment_statuses
 
 class AppointmentStatus(models.Model):
     name = models.CharField(max_length=50, unique=True)
@@ -36,8 +40,9 @@ class Appointment(models.Model):
         ('refunded', 'Refunded'),
     ]
 
-    patient = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='patient_appointments')
-    doctor = models.ForeignKey(DoctorProfile, on_delete=models.CASCADE, related_name='doctor_appointments')
+    # Covered by the composite indexes below, which lead with these columns
+    patient = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='patient_appointments', db_index=False)
+    doctor = models.ForeignKey(DoctorProfile, on_delete=models.CASCADE, related_name='doctor_appointments', db_index=False)
     clinic = models.ForeignKey(Clinic, on_delete=models.SET_NULL, null=True)
     appointment_date = models.DateField()
     appointment_time = models.TimeField()
@@ -51,6 +56,15 @@ class Appointment(models.Model):
     payment_status = models.CharField(max_length=20, choices=PAYMENT_STATUS_CHOICES, default='pending')
     payment_id = models.CharField(max_length=100, blank=True)
     booking_id = models.CharField(max_length=20, unique=True, blank=True)
+    # Denormalized from status (scheduled/confirmed) so the database can enforce one active booking per slot
+    holds_slot = models.BooleanField(default=True, editable=False)
+    # Time span occupied by the appointment, indexed by the overlap exclusion constraint
+    slot_range = models.GeneratedField(expression=SlotRange(), output_field=DateTimeRangeField(), db_persist=True)
+    # Aware start and end, so time-based scans are plain range conditions
+    starts_at = models.GeneratedField(expression=SlotStart(), output_field=models.DateTimeField(), db_persist=True)
+    ends_at = models.GeneratedField(expression=SlotEnd(), output_field=models.DateTimeField(), db_persist=True)
+    # Set by the reminder worker once the patient has been reminded
+    reminder_sent_at = models.DateTimeField(null=True, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -58,9 +72,61 @@ class Appointment(models.Model):
 
     class Meta:
         db_table = 'appointments_appointment'
-        ordering = ['-appointment_date', '-appointment_time']
-        # We'll handle duplicate prevention in serializer validation instead of DB constraints
-        # This allows more flexible validation based on appointment status
+        # Same order as (-appointment_date, -appointment_time); id makes it total for cursor pagination
+        ordering = ['-starts_at', '-id']
+        constraints = [
+            # Last line of defence against double booking: no two active
+            # appointments of a doctor may overlap, whatever their duration.
+            # The serializer reports conflicts first, under a row lock on the doctor.
+            ExclusionConstraint(
+                name='exclude_overlapping_doctor_slots',
+                expressions=[
+                    (DoctorKey(), RangeOperators.EQUAL),
+                    ('slot_range', RangeOperators.OVERLAPS),
+                ],
+                condition=models.Q(holds_slot=True)
+            ),
+        ]
+        indexes = [
+            # Appointment lists, newest first, for both page-number and cursor pages, and
+            # calendar feed windows; updated_at lets the feed ETag use an index-only scan
+            models.Index(
+                fields=['patient', '-starts_at', '-id'], name='appt_patient_timeline_idx', include=['updated_at']
+            ),
+            models.Index(
+                fields=['doctor', '-starts_at', '-id'], name='appt_doctor_timeline_idx', include=['updated_at']
+            ),
+            # Doctor's patient roster: one index-only pass grouped by patient
+            models.Index(
+                fields=['doctor', 'patient', 'appointment_date'],
+                name='appt_doctor_patient_idx',
+                include=['status_id', 'holds_slot']
+            ),
+            # Slot engine and conflict checks: a doctor's active appointments per day
+            models.Index(
+                fields=['doctor', 'appointment_date', 'appointment_time'],
+                name='appt_doctor_day_active_idx',
+                condition=models.Q(holds_slot=True)
+            ),
+            # A patient's upcoming active appointments
+            models.Index(
+                fields=['patient', 'appointment_date', 'appointment_time'],
+                name='appt_patient_active_idx',
+                condition=models.Q(holds_slot=True)
+            ),
+            # Payment follow-up scans only ever look at unpaid appointments
+            models.Index(
+                fields=['appointment_date'],
+                name='appt_pending_payment_idx',
+                condition=models.Q(payment_status='pending')
+            ),
+            # Upcoming(), reminder and no-show scans over active appointments by start time
+            models.Index(
+                fields=['starts_at'],
+                name='appt_active_starts_idx',
+                condition=models.Q(holds_slot=True)
+            ),
+        ]
 
     def __str__(self):
         return f"{self.booking_id} - {self.patient.get_full_name()} with {self.doctor.display_name}"
@@ -68,23 +134,48 @@ class Appointment(models.Model):
     def save(self, *args, **kwargs):
         if not self.booking_id:
             self.booking_id = self.generate_booking_id()
+        if self.status_id:
+            self.holds_slot = self.get_status().is_active_status
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'status' in update_fields:
+            kwargs['update_fields'] = set(update_fields) | {'holds_slot'}
+        adding = self._state.adding
         super().save(*args, **kwargs)
+        if not adding:
+            # An UPDATE does not return the generated columns; drop the stale
+            # values so they are derived again (or reloaded) on access
+            for field in ('starts_at', 'ends_at', 'slot_range'):
+                self.__dict__.pop(field, None)
 
     def generate_booking_id(self):
         """Generate unique booking ID."""
         return f"HEY{uuid.uuid4().hex[:8].upper()}"
 
+    def get_status(self):
+        """Return the status, from the in-process registry unless already loaded."""
+        if Appointment.status.is_cached(self):
+            return self.status
+        return appointment_statuses.get_by_id(self.status_id)
+
     # Frontend dependency properties
     @property
     def status_name(self):
         """Return status name for frontend serializer."""
-        return self.status.name
+        return self.get_status().name
 
     @property
     def appointment_datetime(self):
-        """Return combined datetime object."""
+        """Return the aware start time, from the stored starts_at column when loaded."""
+        starts_at = self.__dict__.get('starts_at')
+        default_timezone = timezone.get_default_timezone()
+        if starts_at is not None:
+            local = timezone.localtime(starts_at, default_timezone)
+            if (local.date(), local.time()) == (self.appointment_date, self.appointment_time):
+                return starts_at
+        # Not saved yet, deferred, or the date/time changed since it was loaded:
+        # derive it like SlotStart does, in settings.TIME_ZONE
         from datetime import datetime
-        return datetime.combine(self.appointment_date, self.appointment_time)
+        return timezone.make_aware(datetime.combine(self.appointment_date, self.appointment_time), default_timezone)
 
     @property
     def is_past_due(self):
@@ -105,16 +196,15 @@ class Appointment(models.Model):
     def can_be_cancelled(self):
         """Check if appointment can be cancelled."""
         # Can't cancel if already completed or past due
-        if self.status.is_completed_status or self.is_past_due:
+        if self.get_status().is_completed_status or self.is_past_due:
             return False
         # Can cancel up to 2 hours before appointment
-        time_diff = self.appointment_datetime - timezone.now()
-        return time_diff.total_seconds() > 7200  # 2 hours
+        return (self.appointment_datetime - timezone.now()).total_seconds() > 7200  # 2 hours
 
     @property
     def can_be_rescheduled(self):
         """Check if appointment can be rescheduled."""
-        return self.status.is_active_status and not self.is_past_due
+        return self.get_status().is_active_status and not self.is_past_due
 
     @property
     def time_until_appointment(self):
@@ -125,73 +215,43 @@ class Appointment(models.Model):
         return time_diff
 
     def get_reminder_time(self):
-        """Get reminder time (24 hours before appointment)."""
-        from datetime import timedelta
-        return self.appointment_datetime - timedelta(hours=24)
+        """Get reminder time (REMINDER_LEAD_TIME before appointment)."""
+        from .reminders import REMINDER_LEAD_TIME
+        return self.appointment_datetime - REMINDER_LEAD_TIME
 
-    def cancel(self, reason=None, cancelled_by=None):
-        """Cancel the appointment."""
+    def _transition(self, to_status, changed_by=None, reason=None, **fields):
+        from .transitions import apply_transition, TransitionError
         try:
-            cancelled_status = AppointmentStatus.objects.get(name='cancelled')
-            old_status = self.status
-            self.status = cancelled_status
-            self.save()
-            
-            # Create history entry
-            AppointmentHistory.objects.create(
-                appointment=self,
-                old_status=old_status,
-                new_status=cancelled_status,
-                changed_by=cancelled_by,
-                change_reason=reason or "Cancelled"
+            moved = apply_transition(
+                Appointment.objects.filter(pk=self.pk), to_status,
+                changed_by=changed_by, reason=reason, **fields
             )
-            return True
-        except AppointmentStatus.DoesNotExist:
+        except TransitionError:
+            return False
+        if not moved:
             return False
+        self.status = appointment_statuses.get(to_status)
+        self.holds_slot = self.status.is_active_status
+        for field, value in fields.items():
+            setattr(self, field, value)
+        return True
+
+    def cancel(self, reason=None, cancelled_by=None):
+        """Cancel the appointment."""
+        return self._transition('cancelled', changed_by=cancelled_by, reason=reason)
 
     def confirm(self, confirmed_by=None):
         """Confirm the appointment."""
-        try:
-            confirmed_status = AppointmentStatus.objects.get(name='confirmed')
-            old_status = self.status
-            self.status = confirmed_status
-            self.save()
-            
-            # Create history entry
-            AppointmentHistory.objects.create(
-                appointment=self,
-                old_status=old_status,
-                new_status=confirmed_status,
-                changed_by=confirmed_by,
-                change_reason="Appointment confirmed"
-            )
-            return True
-        except AppointmentStatus.DoesNotExist:
-            return False
+        return self._transition('confirmed', changed_by=confirmed_by)
 
     def complete(self, completed_by=None, notes=None, prescription=None):
         """Mark appointment as completed."""
-        try:
-            completed_status = AppointmentStatus.objects.get(name='completed')
-            old_status = self.status
-            self.status = completed_status
-            if notes:
-                self.notes = notes
-            if prescription:
-                self.prescription = prescription
-            self.save()
-            
-            # Create history entry
-            AppointmentHistory.objects.create(
-                appointment=self,
-                old_status=old_status,
-                new_status=completed_status,
-                changed_by=completed_by,
-                change_reason="Appointment completed"
-            )
-            return True
-        except AppointmentStatus.DoesNotExist:
-            return False
+        fields = {}
+        if notes:
+            fields['notes'] = notes
+        if prescription:
+            fields['prescription'] = prescription
+        return self._transition('completed', changed_by=completed_by, **fields)
 
 class AppointmentHistory(models.Model):
     appointment = models.ForeignKey(Appointment, on_delete=models.CASCADE, related_name='history')
@@ -231,3 +291,94 @@ class AppointmentHistory(models.Model):
         old_name = self.old_status.name if self.old_status else "None"
         new_name = self.new_status.name if self.new_status else "None"
         return f"{old_name} → {new_name}"
+
+class DailyAvailability(models.Model):
+    """Precomputed slot counts per doctor, clinic and day within the booking horizon."""
+    doctor = models.ForeignKey(DoctorProfile, on_delete=models.CASCADE, related_name='daily_availability')
+    clinic = models.ForeignKey(Clinic, on_delete=models.CASCADE, null=True, blank=True, related_name='daily_availability')
+    date = models.DateField()
+    total_slots = models.PositiveIntegerField(default=0)
+    booked_slots = models.PositiveIntegerField(default=0)
+    free_slots = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'appointments_dailyavailability'
+        verbose_name_plural = 'daily availabilities'
+        ordering = ['date']
+        unique_together = ['doctor', 'clinic', 'date']
+        indexes = [
+            models.Index(fields=['doctor', 'date'], name='appt_dailyavail_doctor_date'),
+        ]
+
+    def __str__(self):
+        return f"{self.doctor_id} - {self.date} ({self.free_slots}/{self.total_slots} free)"
+
+class DoctorDailyStats(models.Model):
+    """Per-doctor rollup of one day's appointments, so dashboards never scan Appointment."""
+    doctor = models.ForeignKey(DoctorProfile, on_delete=models.CASCADE, related_name='daily_stats')
+    date = models.DateField()
+    appointments = models.PositiveIntegerField(default=0)
+    scheduled = models.PositiveIntegerField(default=0)
+    confirmed = models.PositiveIntegerField(default=0)
+    completed = models.PositiveIntegerField(default=0)
+    cancelled = models.PositiveIntegerField(default=0)
+    no_shows = models.PositiveIntegerField(default=0)
+    # Fees of paid appointments, and of unpaid ones that were not cancelled
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    outstanding = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    # Patients whose first appointment with the doctor falls on this day
+    new_patients = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'appointments_doctordailystats'
+        verbose_name_plural = 'doctor daily stats'
+        ordering = ['date']
+        unique_together = ['doctor', 'date']
+
+    def __str__(self):
+        return f"{self.doctor_id} - {self.date} ({self.appointments} appointments)"
+
+class WaitlistEntry(models.Model):
+    """A patient waiting for a slot with a doctor within a date range."""
+    STATUS_CHOICES = [
+        ('waiting', 'Waiting'),
+        ('offered', 'Offered'),
+        ('fulfilled', 'Fulfilled'),
+        ('cancelled', 'Cancelled'),
+    ]
+
+    patient = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='waitlist_entries')
+    doctor = models.ForeignKey(DoctorProfile, on_delete=models.CASCADE, related_name='waitlist_entries')
+    start_date = models.DateField()
+    end_date = models.DateField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='waiting')
+    # The freed slot offered to the patient
+    offered_date = models.DateField(null=True, blank=True)
+    offered_time = models.TimeField(null=True, blank=True)
+    offered_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'appointments_waitlistentry'
+        verbose_name_plural = 'waitlist entries'
+        ordering = ['created_at']
+        indexes = [
+            # First-come queue of a doctor's waiting patients
+            models.Index(
+                fields=['doctor', 'created_at'],
+                name='appt_waitlist_queue_idx',
+                condition=models.Q(status='waiting')
+            ),
+            # Offers whose hold has run out, for the process_waitlist worker
+            models.Index(
+                fields=['offered_at'],
+                name='appt_waitlist_offered_idx',
+                condition=models.Q(status='offered')
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.patient.get_full_name()} waiting for {self.doctor.display_name} ({self.start_date} - {self.end_date})"
+
@@ -0,0 +1,6 @@
+from utils.registry import LookupRegistry
+
+# Statuses that hold a slot
+ACTIVE_STATUS_NAMES = ['scheduled', 'confirmed']
+
+appointment_statuses = LookupRegistry('appointments.AppointmentStatus')
@@ -0,0 +1,73 @@
+import json
+from datetime import timedelta
+from django.db import transaction
+from django.utils import timezone
+
+# How long before the appointment the patient is reminded
+REMINDER_LEAD_TIME = timedelta(hours=24)
+
+# Notification type of the reminders
+REMINDER_NOTIFICATION_TYPE = 'appointment_reminder'
+
+
+def send_due_reminders(now=None, batch_size=1000):
+    """
+    Create reminder notifications for every appointment whose reminder time has passed.
+
+    Each batch is claimed with FOR UPDATE SKIP LOCKED and marked sent in the
+    same transaction as the notifications are created, so concurrent workers
+    never remind twice. Returns the number of reminders created.
+    """
+    from notifications.models import Notification
+    from notifications.registry import notification_types
+    from .models import Appointment
+
+    now = now or timezone.now()
+    pending = Appointment.objects.filter(
+        starts_at__gte=now,
+        starts_at__lt=now + REMINDER_LEAD_TIME,
+        holds_slot=True,
+        reminder_sent_at__isnull=True
+    )
+    notification_type = None
+    sent = 0
+    while True:
+        with transaction.atomic():
+            batch = list(
+                pending.select_for_update(of=('self',), skip_locked=True).order_by('starts_at').values_list(
+                    'id', 'booking_id', 'patient_id', 'appointment_date', 'appointment_time',
+                    'doctor__user__first_name', 'doctor__user__last_name', 'clinic__name',
+                    named=True
+                )[:batch_size]
+            )
+            if not batch:
+                break
+            if notification_type is None:
+                notification_type = notification_types.get_or_create(
+                    REMINDER_NOTIFICATION_TYPE, description='Reminder of an upcoming appointment'
+                )
+            Appointment.objects.filter(pk__in=[row.id for row in batch]).update(reminder_sent_at=now)
+            Notification.objects.bulk_create([
+                Notification(
+                    user_id=row.patient_id,
+                    type=notification_type,
+                    title='Upcoming appointment',
+                    message=(
+                        f"Reminder: your appointment {row.booking_id} with Dr. {row.doctor__user__first_name} "
+                        f"{row.doctor__user__last_name} is on {row.appointment_date:%B %d, %Y} at "
+                        f"{row.appointment_time:%H:%M}" + (f" ({row.clinic__name})." if row.clinic__name else ".")
+                    ),
+                    data=json.dumps({
+                        'appointment_id': row.id,
+                        'booking_id': row.booking_id,
+                        'date': row.appointment_date.isoformat(),
+                        'time': row.appointment_time.strftime('%H:%M'),
+                    })
+                )
+                for row in batch
+            ], batch_size=batch_size)
+        sent += len(batch)
+        if len(batch) < batch_size:
+            break
+    return sent
+
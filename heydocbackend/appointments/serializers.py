@@ -1,10 +1,31 @@
+from datetime import timedelta
 from rest_framework import serializers
-from django.db import IntegrityError
-from django.db.models import Q
-from .models import Appointment, AppointmentStatus, AppointmentHistory
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Exists, OuterRef, Q, Subquery, Value
+from django.utils import timezone
+from .models import Appointment, AppointmentStatus, AppointmentHistory, WaitlistEntry
+from .expressions import DoctorKey, slot_bounds
+from .slots import DEFAULT_SLOT_DURATION
+from .holds import get_hold
+from .waitlist import fulfil_offer
+from .registry import appointment_statuses
+from .exports import EXPORT_FORMATS
 from accounts.serializers import UserSerializer
-from doctors.serializers import DoctorListSerializer, ClinicSerializer
-from doctors.models import DoctorProfile
+from doctors.serializers import DoctorListSerializer, ClinicSerializer, SpecializationSerializer
+from doctors.models import DoctorProfile, Schedule, Clinic
+from accounts.models import CustomUser
+
+# Longest date range a patient can wait for
+MAX_WAITLIST_RANGE_DAYS = 92
+
+# Longest date range of one stats request
+MAX_STATS_RANGE_DAYS = 366
+
+def lock_booking_rows(patient_id, doctor_id):
+    """Take row locks on the patient and doctor for the current transaction."""
+    # NO KEY UPDATE still lets other transactions insert rows referencing them
+    list(CustomUser.objects.select_for_update(no_key=True).filter(pk=patient_id).values_list('pk', flat=True))
+    list(DoctorProfile.objects.select_for_update(no_key=True).filter(pk=doctor_id).values_list('pk', flat=True))
 
 class AppointmentStatusSerializer(serializers.ModelSerializer):
     class Meta:
@@ -20,80 +41,166 @@ class AppointmentSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Appointment
-        fields = '__all__'
-        read_only_fields = ('booking_id', 'created_at', 'updated_at')
+        # Columns kept for the database's constraints, indexes and workers, not for clients
+        exclude = ('holds_slot', 'slot_range', 'starts_at', 'ends_at', 'reminder_sent_at')
+        # Moves go through the reschedule endpoint and status changes through the
+        # transition endpoints, which run the conflict checks and transition rules
+        read_only_fields = (
+            'appointment_date', 'appointment_time', 'duration', 'booking_id', 'created_at', 'updated_at'
+        )
+
+class AppointmentUserSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = CustomUser
+        fields = ('id', 'email', 'first_name', 'last_name', 'phone')
+
+class AppointmentDoctorSerializer(serializers.ModelSerializer):
+    user = AppointmentUserSerializer(read_only=True)
+    specializations = SpecializationSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = DoctorProfile
+        fields = ('id', 'user', 'specializations')
+
+class AppointmentClinicSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Clinic
+        fields = ('id', 'name', 'address')
+
+class PatientRosterSerializer(serializers.Serializer):
+    """One patient of a doctor's roster, from a row of ``Appointment.objects.roster()``."""
+    patient = AppointmentUserSerializer(read_only=True)
+    visits = serializers.IntegerField(read_only=True)
+    last_visit = serializers.DateField(read_only=True)
+    next_appointment = serializers.DateField(read_only=True)
+    last_activity = serializers.DateField(read_only=True)
+
+class AppointmentListSerializer(serializers.ModelSerializer):
+    """
+    Compact appointment for list pages.
+
+    Only reads relations the list view loads up front (patient, doctor user
+    and clinic joined, specializations prefetched); the status name comes
+    from the status registry. AppointmentSerializer keeps the full shape for
+    the detail view.
+    """
+    patient = AppointmentUserSerializer(read_only=True)
+    doctor = AppointmentDoctorSerializer(read_only=True)
+    clinic = AppointmentClinicSerializer(read_only=True)
+    status_name = serializers.CharField(read_only=True)
 
-class CreateAppointmentSerializer(serializers.ModelSerializer):
     class Meta:
         model = Appointment
-        fields = ['doctor', 'clinic', 'appointment_date', 'appointment_time', 
-                 'symptoms', 'consultation_fee']
+        fields = ('id', 'booking_id', 'patient', 'doctor', 'clinic', 'appointment_date', 'appointment_time',
+                  'duration', 'status_name', 'consultation_fee', 'payment_status', 'symptoms', 'notes',
+                  'created_at')
+        read_only_fields = fields
 
-    def validate(self, data):
+class BookingChecksMixin:
+    """Slot length and conflict checks shared by booking and rescheduling."""
+
+    def get_slot_duration(self, data):
+        """
+        Return the slot length of the doctor's schedule for the booked day.
+
+        The doctor and clinic are validated by the same query.
         """
-        Check for booking conflicts before creating appointment.
+        doctor_id, clinic_id = data['doctor_id'], data.get('clinic_id')
+        schedules = Schedule.objects.filter(
+            doctor=OuterRef('pk'),
+            day_of_week=data['appointment_date'].weekday(),
+            is_active=True
+        )
+        if clinic_id:
+            schedules = schedules.filter(clinic_id=clinic_id)
+        booking = DoctorProfile.objects.filter(pk=doctor_id).annotate(
+            # The earliest block of the day decides when several match
+            slot_duration=Subquery(schedules.order_by('start_time', 'pk').values('slot_duration')[:1]),
+            clinic_valid=Exists(Clinic.objects.filter(pk=clinic_id, doctor=OuterRef('pk'))) if clinic_id else Value(True)
+        ).values('slot_duration', 'clinic_valid').first()
+
+        if booking is None:
+            raise serializers.ValidationError({'doctor': f'Invalid pk "{doctor_id}" - object does not exist.'})
+        if not booking['clinic_valid']:
+            raise serializers.ValidationError({'clinic': 'The clinic does not belong to this doctor.'})
+        return booking['slot_duration'] or DEFAULT_SLOT_DURATION
+
+    def check_conflicts(self, patient, data, exclude=None):
         """
-        patient = self.context['request'].user
-        doctor = data.get('doctor')
+        Raise a ValidationError if the slot or the patient's quota is taken.
+
+        ``exclude`` is the pk of an appointment being moved, which must not
+        conflict with itself.
+        """
+        doctor_id = data['doctor_id']
         appointment_date = data.get('appointment_date')
         appointment_time = data.get('appointment_time')
+        slot = slot_bounds(appointment_date, appointment_time, data.get('duration') or DEFAULT_SLOT_DURATION)
 
-        # Get valid active statuses
-        try:
-            active_statuses = AppointmentStatus.objects.filter(
-                name__in=['scheduled', 'confirmed']
-            )
-            active_status_names = [status.name for status in active_statuses if status.name]
-        except Exception:
-            active_status_names = ['scheduled', 'confirmed']
-
-        # Check if doctor is already booked at this time
-        doctor_conflict = Appointment.objects.filter(
-            doctor=doctor,
-            appointment_date=appointment_date,
-            appointment_time=appointment_time,
-            status__name__in=active_status_names
-        ).exists()
-
-        if doctor_conflict:
+        # Check if another patient is holding this slot during checkout
+        hold = get_hold(doctor_id, appointment_date, appointment_time)
+        if hold and hold['user_id'] != patient.pk:
             raise serializers.ValidationError({
-                'appointment_time': f'This doctor is already booked at {appointment_time} on {appointment_date}. Please select a different time slot.'
+                'appointment_time': 'This time slot is being held by another patient. Please select a different time slot.'
             })
 
-        # Check if patient already has an appointment with this doctor at this time
-        patient_conflict = Appointment.objects.filter(
-            patient=patient,
-            doctor=doctor,
-            appointment_date=appointment_date,
-            appointment_time=appointment_time,
-            status__name__in=active_status_names
-        ).exists()
+        # Doctor overlap, patient overlap and the patient's daily quota in one
+        # query: the doctor's rows come from the overlap constraint's GiST index,
+        # the patient's rows for the day from the patient index
+        patient_day = Q(patient_id=patient.pk, appointment_date=appointment_date)
+        active = Appointment.objects.alias(doctor_key=DoctorKey()).filter(
+            Q(doctor_key=DoctorKey.value(doctor_id), slot_range__overlap=slot) | patient_day,
+            holds_slot=True
+        )
+        if exclude is not None:
+            active = active.exclude(pk=exclude)
+        counts = active.aggregate(
+            doctor_conflicts=Count('pk', filter=Q(doctor_id=doctor_id, slot_range__overlap=slot)),
+            patient_conflicts=Count('pk', filter=patient_day & Q(slot_range__overlap=slot)),
+            daily_appointments=Count('pk', filter=patient_day)
+        )
 
-        if patient_conflict:
+        if counts['doctor_conflicts']:
             raise serializers.ValidationError({
-                'appointment_time': 'You already have an appointment with this doctor at this time.'
+                'appointment_time': f'This doctor is already booked at {appointment_time} on {appointment_date}. Please select a different time slot.'
             })
 
-        # Check if patient has too many appointments on the same day
-        daily_appointments = Appointment.objects.filter(
-            patient=patient,
-            appointment_date=appointment_date,
-            status__name__in=active_status_names
-        ).count()
+        if counts['patient_conflicts']:
+            raise serializers.ValidationError({
+                'appointment_time': 'You already have an appointment at this time.'
+            })
 
-        if daily_appointments >= 3:  # Limit to 3 appointments per day per patient
+        if counts['daily_appointments'] >= 3:  # Limit to 3 appointments per day per patient
             raise serializers.ValidationError({
                 'appointment_date': 'You can only book up to 3 appointments per day.'
             })
 
+class CreateAppointmentSerializer(BookingChecksMixin, serializers.ModelSerializer):
+    # Plain ids: the doctor and clinic are checked together with the slot length
+    doctor = serializers.IntegerField(source='doctor_id')
+    clinic = serializers.IntegerField(source='clinic_id', required=False, allow_null=True)
+
+    class Meta:
+        model = Appointment
+        fields = ['doctor', 'clinic', 'appointment_date', 'appointment_time', 
+                 'symptoms', 'consultation_fee']
+
+    def validate(self, data):
+        """
+        Check the doctor and clinic and set the slot length.
+
+        Conflicts are checked once, under the locks taken by create().
+        """
+        data['duration'] = self.get_slot_duration(data)
         return data
 
     def create(self, validated_data):
-        validated_data['patient'] = self.context['request'].user
+        patient = self.context['request'].user
+        validated_data['patient'] = patient
         
         # Set default status to 'scheduled'
         try:
-            scheduled_status = AppointmentStatus.objects.get(name='scheduled')
+            scheduled_status = appointment_statuses.get('scheduled')
             validated_data['status'] = scheduled_status
         except AppointmentStatus.DoesNotExist:
             # Create scheduled status if it doesn't exist
@@ -104,11 +211,83 @@ class CreateAppointmentSerializer(serializers.ModelSerializer):
             validated_data['status'] = scheduled_status
         
         try:
-            return super().create(validated_data)
-        except IntegrityError as e:
-            # Handle any unexpected database constraint violations
+            with transaction.atomic():
+                # Serialize concurrent bookings for the same patient and doctor
+                # (always in this order to avoid deadlocks), then check
+                # conflicts against everything committed before them.
+                lock_booking_rows(patient.pk, validated_data['doctor_id'])
+                self.check_conflicts(patient, validated_data)
+                appointment = super().create(validated_data)
+                # The patient's hold (if any) turns into the appointment on commit
+                transaction.on_commit(lambda: fulfil_offer(
+                    appointment.doctor_id, appointment.appointment_date, appointment.appointment_time, patient.pk
+                ), robust=True)
+                return appointment
+        except IntegrityError:
+            # The partial unique index caught a booking that slipped past the checks
             raise serializers.ValidationError({
-                'non_field_errors': 'Unable to create appointment due to a database constraint.'
+                'appointment_time': 'This time slot has just been booked. Please select a different time slot.'
+            })
+
+class RescheduleAppointmentSerializer(BookingChecksMixin, serializers.Serializer):
+    """Move an appointment to a new slot, keeping its booking_id."""
+    appointment_date = serializers.DateField()
+    appointment_time = serializers.TimeField()
+    clinic = serializers.IntegerField(required=False)
+    reason = serializers.CharField(required=False, allow_blank=True)
+
+    def validate(self, data):
+        appointment = self.instance
+        if not appointment.can_be_rescheduled:
+            raise serializers.ValidationError('This appointment can no longer be rescheduled.')
+        data['doctor_id'] = appointment.doctor_id
+        data['clinic_id'] = data.pop('clinic', appointment.clinic_id)
+        if (data['appointment_date'], data['appointment_time']) == (appointment.appointment_date, appointment.appointment_time):
+            raise serializers.ValidationError({'appointment_time': 'The appointment is already booked at this time.'})
+        if slot_bounds(data['appointment_date'], data['appointment_time'], 0).lower <= timezone.now():
+            raise serializers.ValidationError({'appointment_time': 'Appointments cannot be moved into the past.'})
+        data['duration'] = self.get_slot_duration(data)
+        return data
+
+    def update(self, instance, validated_data):
+        old_slot = instance.appointment_date, instance.appointment_time
+        try:
+            with transaction.atomic():
+                # Same lock order as booking, then the appointment itself
+                lock_booking_rows(instance.patient_id, instance.doctor_id)
+                locked = Appointment.objects.select_for_update(no_key=True).only('status_id').get(pk=instance.pk)
+                if locked.status_id != instance.status_id:
+                    raise serializers.ValidationError('This appointment was changed in the meantime. Please try again.')
+                self.check_conflicts(instance.patient, validated_data, exclude=instance.pk)
+
+                instance.appointment_date = validated_data['appointment_date']
+                instance.appointment_time = validated_data['appointment_time']
+                instance.clinic_id = validated_data['clinic_id']
+                instance.duration = validated_data['duration']
+                # The reminder is due again for the new time
+                instance.reminder_sent_at = None
+                # The exclusion constraint rejects the move if the slot was taken
+                # concurrently; the save signal refreshes both days' availability
+                instance.save(update_fields=[
+                    'appointment_date', 'appointment_time', 'clinic', 'duration', 'reminder_sent_at', 'updated_at'
+                ])
+                AppointmentHistory.objects.create(
+                    appointment=instance,
+                    old_status_id=instance.status_id,
+                    new_status_id=instance.status_id,
+                    changed_by=self.context['request'].user,
+                    change_reason=validated_data.get('reason') or (
+                        f"Rescheduled from {old_slot[0]} {old_slot[1]:%H:%M} to "
+                        f"{instance.appointment_date} {instance.appointment_time:%H:%M}"
+                    )
+                )
+                transaction.on_commit(lambda: fulfil_offer(
+                    instance.doctor_id, instance.appointment_date, instance.appointment_time, instance.patient_id
+                ), robust=True)
+                return instance
+        except IntegrityError:
+            raise serializers.ValidationError({
+                'appointment_time': 'This time slot has just been booked. Please select a different time slot.'
             })
 
 class AppointmentHistorySerializer(serializers.ModelSerializer):
@@ -118,4 +297,73 @@ class AppointmentHistorySerializer(serializers.ModelSerializer):
 
     class Meta:
         model = AppointmentHistory
-        fields = '__all__'
\ No newline at end of file
+        fields = '__all__'
+
+class WaitlistEntrySerializer(serializers.ModelSerializer):
+    doctor_name = serializers.CharField(source='doctor.display_name', read_only=True)
+
+    class Meta:
+        model = WaitlistEntry
+        fields = ['id', 'doctor', 'doctor_name', 'start_date', 'end_date', 'status',
+                  'offered_date', 'offered_time', 'offered_at', 'created_at']
+        read_only_fields = ('status', 'offered_date', 'offered_time', 'offered_at', 'created_at')
+
+    def validate(self, data):
+        if data['start_date'] < timezone.localdate():
+            raise serializers.ValidationError({'start_date': 'The waitlist range cannot start in the past.'})
+        if data['end_date'] < data['start_date']:
+            raise serializers.ValidationError({'end_date': 'end_date must not be before start_date.'})
+        if (data['end_date'] - data['start_date']).days + 1 > MAX_WAITLIST_RANGE_DAYS:
+            raise serializers.ValidationError({'end_date': f'The waitlist range cannot exceed {MAX_WAITLIST_RANGE_DAYS} days.'})
+        already_waiting = WaitlistEntry.objects.filter(
+            patient=self.context['request'].user,
+            doctor=data['doctor'],
+            status='waiting',
+            start_date__lte=data['end_date'],
+            end_date__gte=data['start_date']
+        ).exists()
+        if already_waiting:
+            raise serializers.ValidationError('You are already on this doctor\'s waitlist for these dates.')
+        return data
+
+    def create(self, validated_data):
+        validated_data['patient'] = self.context['request'].user
+        return super().create(validated_data)
+
+class BulkStatusUpdateSerializer(serializers.Serializer):
+    """Body of a bulk status change: which of the doctor's appointments move to which status."""
+    appointment_ids = serializers.ListField(child=serializers.IntegerField(), allow_empty=False)
+    status = serializers.CharField()
+    reason = serializers.CharField(required=False, allow_blank=True)
+    strict = serializers.BooleanField(default=True)
+
+class AppointmentExportSerializer(serializers.Serializer):
+    """Query parameters of the appointment export."""
+    start_date = serializers.DateField(required=False)
+    end_date = serializers.DateField(required=False)
+    doctor = serializers.IntegerField(source='doctor_id', required=False)
+    file_format = serializers.ChoiceField(choices=EXPORT_FORMATS, default='csv')
+
+    def validate(self, data):
+        if data.get('start_date') and data.get('end_date') and data['end_date'] < data['start_date']:
+            raise serializers.ValidationError({'end_date': 'end_date must not be before start_date.'})
+        return data
+
+class DoctorStatsQuerySerializer(serializers.Serializer):
+    """Date range of the doctor dashboard stats, the last 30 days by default."""
+    start_date = serializers.DateField(required=False)
+    end_date = serializers.DateField(required=False)
+
+    def validate(self, data):
+        end_date = data.get('end_date') or timezone.localdate()
+        start_date = data.get('start_date') or end_date - timedelta(days=29)
+        if end_date < start_date:
+            raise serializers.ValidationError({'end_date': 'end_date must not be before start_date.'})
+        if (end_date - start_date).days + 1 > MAX_STATS_RANGE_DAYS:
+            raise serializers.ValidationError({'end_date': f'The range cannot exceed {MAX_STATS_RANGE_DAYS} days.'})
+        return {'start_date': start_date, 'end_date': end_date}
+
+class AgendaQuerySerializer(serializers.Serializer):
+    """Day and optional clinic of the doctor's agenda; today by default."""
+    date = serializers.DateField(required=False)
+    clinic = serializers.IntegerField(source='clinic_id', required=False)
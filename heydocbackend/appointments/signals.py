@@ -0,0 +1,155 @@
+from collections import defaultdict
+from django.db.models.signals import post_init, post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+from accounts.models import CustomUser, PatientProfile
+from doctors.models import Schedule, Unavailability
+from .models import Appointment, AppointmentStatus
+from .agenda import invalidate_agenda
+from .availability import schedule_refresh
+from .registry import appointment_statuses
+from .stats import STATS_FIELDS, schedule_stats_refresh
+
+# Fields whose change affects a day's availability
+AVAILABILITY_FIELDS = {
+    Appointment: ('doctor_id', 'appointment_date', 'appointment_time', 'duration', 'status_id'),
+    Unavailability: ('doctor_id', 'date', 'start_time', 'end_time', 'is_full_day'),
+}
+
+def _availability_state(instance):
+    return tuple(instance.__dict__.get(field) for field in AVAILABILITY_FIELDS[type(instance)])
+
+@receiver(post_init, sender=Appointment)
+@receiver(post_init, sender=Unavailability)
+def remember_availability_state(sender, instance, **kwargs):
+    """Remember the loaded state so that saves can detect moved slots."""
+    instance._availability_state = _availability_state(instance)
+
+def _refresh_changed_days(instance, force=False):
+    old_state = getattr(instance, '_availability_state', None)
+    new_state = _availability_state(instance)
+    if force or old_state != new_state:
+        # The first two fields are always (doctor_id, date); a move within
+        # one doctor's calendar refreshes both days in a single rebuild
+        days = defaultdict(set)
+        for doctor_id, day in {tuple(new_state[:2]), tuple((old_state or new_state)[:2])}:
+            if doctor_id is not None and day is not None:
+                days[doctor_id].add(day)
+        for doctor_id, dates in days.items():
+            schedule_refresh(doctor_id, dates)
+    instance._availability_state = new_state
+
+@receiver(post_save, sender=Appointment)
+@receiver(post_save, sender=Unavailability)
+def refresh_availability_on_save(sender, instance, created, **kwargs):
+    """Refresh the materialized availability of the affected day(s)."""
+    _refresh_changed_days(instance, force=created)
+
+@receiver(post_delete, sender=Appointment)
+@receiver(post_delete, sender=Unavailability)
+def refresh_availability_on_delete(sender, instance, **kwargs):
+    """Refresh the materialized availability after a slot is freed."""
+    _refresh_changed_days(instance, force=True)
+
+def _stats_state(instance):
+    return tuple(instance.__dict__.get(field) for field in STATS_FIELDS)
+
+@receiver(post_init, sender=Appointment)
+def remember_stats_state(sender, instance, **kwargs):
+    instance._stats_state = _stats_state(instance)
+
+def _refresh_changed_stats(instance, force=False):
+    old_state = getattr(instance, '_stats_state', None)
+    new_state = _stats_state(instance)
+    if force or old_state != new_state:
+        # STATS_FIELDS start with (doctor_id, appointment_date, patient_id)
+        days, patients = defaultdict(set), defaultdict(set)
+        for doctor_id, day, patient_id in {tuple(new_state[:3]), tuple((old_state or new_state)[:3])}:
+            days[doctor_id].add(day)
+            patients[doctor_id].add(patient_id)
+        for doctor_id, dates in days.items():
+            schedule_stats_refresh(doctor_id, dates, patients[doctor_id])
+    instance._stats_state = new_state
+
+@receiver(post_save, sender=Appointment)
+def refresh_stats_on_save(sender, instance, created, **kwargs):
+    """Refresh the doctor's daily rollup for the day(s) the appointment counts in."""
+    _refresh_changed_stats(instance, force=created)
+
+@receiver(post_delete, sender=Appointment)
+def refresh_stats_on_delete(sender, instance, **kwargs):
+    _refresh_changed_stats(instance, force=True)
+
+@receiver(post_save, sender=Schedule)
+@receiver(post_delete, sender=Schedule)
+def refresh_availability_for_schedule(sender, instance, **kwargs):
+    """Schedules repeat weekly, so refresh the doctor's whole horizon."""
+    schedule_refresh(instance.doctor_id)
+    invalidate_agenda(instance.doctor_id)
+
+def _agenda_day(instance):
+    # AVAILABILITY_FIELDS start with (doctor_id, date) for both models
+    return tuple(instance.__dict__.get(field) for field in AVAILABILITY_FIELDS[type(instance)][:2])
+
+@receiver(post_init, sender=Appointment)
+@receiver(post_init, sender=Unavailability)
+def remember_agenda_day(sender, instance, **kwargs):
+    instance._agenda_day = _agenda_day(instance)
+
+@receiver(post_save, sender=Appointment)
+@receiver(post_save, sender=Unavailability)
+@receiver(post_delete, sender=Appointment)
+@receiver(post_delete, sender=Unavailability)
+def invalidate_agenda_for_day(sender, instance, **kwargs):
+    """Any change to an appointment or absence drops the cached agenda of its day, and of the day it left."""
+    new_day = _agenda_day(instance)
+    for doctor_id, day in {new_day, getattr(instance, '_agenda_day', None) or new_day}:
+        invalidate_agenda(doctor_id, [day])
+    instance._agenda_day = new_day
+
+def _invalidate_patient_agendas(patient_id):
+    # Drop the agendas of the days the patient is still expected
+    days = defaultdict(set)
+    for doctor_id, day in Appointment.objects.filter(
+        patient_id=patient_id, holds_slot=True, appointment_date__gte=timezone.localdate()
+    ).values_list('doctor_id', 'appointment_date'):
+        days[doctor_id].add(day)
+    for doctor_id, dates in days.items():
+        invalidate_agenda(doctor_id, dates)
+
+# Fields the agenda shows of each patient
+AGENDA_PATIENT_FIELDS = {
+    CustomUser: ('first_name', 'last_name', 'phone', 'date_of_birth', 'gender'),
+    PatientProfile: ('blood_group', 'allergies', 'medical_history'),
+}
+
+def _agenda_patient(instance):
+    return tuple(instance.__dict__.get(field) for field in AGENDA_PATIENT_FIELDS[type(instance)])
+
+@receiver(post_init, sender=CustomUser)
+@receiver(post_init, sender=PatientProfile)
+def remember_agenda_patient(sender, instance, **kwargs):
+    instance._agenda_patient = _agenda_patient(instance)
+
+@receiver(post_save, sender=CustomUser)
+@receiver(post_save, sender=PatientProfile)
+def invalidate_agenda_for_patient(sender, instance, created, **kwargs):
+    """
+    Agendas embed the patient's name, contact and profile summary, so drop the
+    days they are still expected when one of those changes.
+
+    Saving a user also saves their profile (accounts.signals); saves that
+    touch nothing shown, like logins, skip the appointment lookup.
+    """
+    new_state = _agenda_patient(instance)
+    # A new user has no appointments yet; a new profile may belong to a user who has
+    user_created = created and sender is CustomUser
+    if not user_created and (created or new_state != getattr(instance, '_agenda_patient', None)):
+        _invalidate_patient_agendas(instance.user_id if sender is PatientProfile else instance.pk)
+    instance._agenda_patient = new_state
+
+@receiver(post_save, sender=AppointmentStatus)
+@receiver(post_delete, sender=AppointmentStatus)
+def invalidate_status_registry(sender, **kwargs):
+    """Reload the status registry after the lookup table changes."""
+    appointment_statuses.invalidate()
@@ -0,0 +1,219 @@
+from collections import defaultdict, namedtuple
+from bisect import bisect_right
+from datetime import time, timedelta
+from django.utils import timezone
+
+# Working hours used for doctors that have not configured any schedule yet
+DEFAULT_WORKING_HOURS = [(time(9, 0), time(12, 0)), (time(14, 0), time(18, 0))]
+DEFAULT_SLOT_DURATION = 30
+
+MINUTES_PER_DAY = 24 * 60
+
+Slot = namedtuple('Slot', ['time', 'duration', 'clinic_id', 'is_free'])
+
+
+def to_minutes(value):
+    """Convert a time object to minutes since midnight."""
+    return value.hour * 60 + value.minute
+
+
+def from_minutes(minutes):
+    """Convert minutes since midnight to a time object."""
+    return time(minutes // 60, minutes % 60)
+
+
+def merge_intervals(intervals):
+    """Merge overlapping (start, end) minute intervals into a sorted list."""
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+
+def overlaps(start, end, merged):
+    """Check whether [start, end) intersects any interval of a merged list."""
+    index = bisect_right(merged, [start, MINUTES_PER_DAY + 1]) - 1
+    if index >= 0 and merged[index][1] > start:
+        return True
+    return index + 1 < len(merged) and merged[index + 1][0] < end
+
+
+class SlotEngine:
+    """
+    Compute bookable slots for one or more doctors over a date range.
+
+    Schedules, unavailabilities and active appointments are loaded up front
+    with one query each; slots are then derived in memory with interval
+    arithmetic, so the query count does not depend on the number of doctors,
+    days or slots.
+    """
+
+    def __init__(self, doctor_ids, start_date, end_date=None):
+        self.doctor_ids = list(doctor_ids)
+        self.start_date = start_date
+        self.end_date = end_date or start_date
+        self._schedules = defaultdict(list)
+        self._blocked = defaultdict(list)
+        self._booked = defaultdict(list)
+        self._merged = {}
+        if self.doctor_ids:
+            self._load()
+
+    def _load(self):
+        from doctors.models import Schedule, Unavailability
+        from .models import Appointment
+
+        schedules = Schedule.objects.filter(
+            doctor_id__in=self.doctor_ids,
+            is_active=True
+        ).values_list('doctor_id', 'clinic_id', 'day_of_week', 'start_time', 'end_time', 'slot_duration')
+        for doctor_id, clinic_id, weekday, start, end, duration in schedules:
+            self._schedules[doctor_id].append((weekday, to_minutes(start), to_minutes(end), duration, clinic_id))
+
+        unavailabilities = Unavailability.objects.filter(
+            doctor_id__in=self.doctor_ids,
+            date__range=(self.start_date, self.end_date)
+        ).values_list('doctor_id', 'date', 'start_time', 'end_time', 'is_full_day')
+        for doctor_id, day, start, end, is_full_day in unavailabilities:
+            if is_full_day or (start is None and end is None):
+                interval = (0, MINUTES_PER_DAY)
+            else:
+                interval = (to_minutes(start) if start else 0, to_minutes(end) if end else MINUTES_PER_DAY)
+            self._blocked[(doctor_id, day)].append(interval)
+
+        booked = Appointment.objects.filter(
+            doctor_id__in=self.doctor_ids,
+            appointment_date__range=(self.start_date, self.end_date),
+            holds_slot=True
+        ).values_list('doctor_id', 'appointment_date', 'appointment_time', 'duration')
+        for doctor_id, day, start, duration in booked:
+            self._booked[(doctor_id, day)].append((to_minutes(start), to_minutes(start) + duration))
+
+    def _working_blocks(self, doctor_id, day):
+        """Return (start, end, slot_duration, clinic_id) blocks for a day."""
+        schedules = self._schedules.get(doctor_id)
+        if not schedules:
+            return [
+                (to_minutes(start), to_minutes(end), DEFAULT_SLOT_DURATION, None)
+                for start, end in DEFAULT_WORKING_HOURS
+            ]
+        weekday = day.weekday()
+        return sorted(
+            (start, end, duration, clinic_id)
+            for day_of_week, start, end, duration, clinic_id in schedules
+            if day_of_week == weekday
+        )
+
+    def _merged_intervals(self, kind, doctor_id, day):
+        key = (kind, doctor_id, day)
+        if key not in self._merged:
+            source = self._blocked if kind == 'blocked' else self._booked
+            self._merged[key] = merge_intervals(source.get((doctor_id, day), []))
+        return self._merged[key]
+
+    def booked_times(self, doctor_id, day):
+        """Return start times of active appointments on a day."""
+        return [from_minutes(start) for start, end in sorted(self._booked.get((doctor_id, day), []))]
+
+    def _iter_slots(self, doctor_id, day):
+        """Yield (start, duration, clinic_id, is_blocked, is_booked) for a day."""
+        blocked = self._merged_intervals('blocked', doctor_id, day)
+        booked = self._merged_intervals('booked', doctor_id, day)
+        for start, end, duration, clinic_id in self._working_blocks(doctor_id, day):
+            if not duration:
+                continue
+            current = start
+            while current + duration <= end:
+                yield (
+                    current, duration, clinic_id,
+                    overlaps(current, current + duration, blocked),
+                    overlaps(current, current + duration, booked)
+                )
+                current += duration
+
+    def slots(self, doctor_id, day):
+        """Return every slot of a doctor's working day in time order, flagged free or taken."""
+        return sorted(
+            (
+                Slot(
+                    time=from_minutes(start),
+                    duration=duration,
+                    clinic_id=clinic_id,
+                    is_free=not (is_blocked or is_booked)
+                )
+                for start, duration, clinic_id, is_blocked, is_booked in self._iter_slots(doctor_id, day)
+            ),
+            key=lambda slot: slot.time
+        )
+
+    def counts(self, doctor_id, day):
+        """
+        Return {clinic_id: (total, booked, free)} for a day.
+
+        Slots covered by an unavailability are not counted as bookable.
+        """
+        counts = {}
+        for start, duration, clinic_id, is_blocked, is_booked in self._iter_slots(doctor_id, day):
+            if is_blocked:
+                continue
+            total, booked = counts.get(clinic_id, (0, 0))
+            counts[clinic_id] = (total + 1, booked + int(is_booked))
+        return {
+            clinic_id: (total, booked, total - booked)
+            for clinic_id, (total, booked) in counts.items()
+        }
+
+    def free_slots(self, doctor_id, day, now=None):
+        """Return free slots for a day, skipping ones that already started."""
+        now = now or timezone.localtime()
+        if day < now.date():
+            return []
+        slots = [slot for slot in self.slots(doctor_id, day) if slot.is_free]
+        if day == now.date():
+            current_time = now.time()
+            slots = [slot for slot in slots if slot.time > current_time]
+        return slots
+
+    def window_slots(self, doctor_id, day, now=None, time_from=None, time_to=None):
+        """Return free slots of a day that start within [time_from, time_to)."""
+        return [
+            slot for slot in self.free_slots(doctor_id, day, now=now)
+            if (time_from is None or slot.time >= time_from)
+            and (time_to is None or slot.time < time_to)
+        ]
+
+    def first_free_slot(self, doctor_id, now=None, time_from=None, time_to=None):
+        """Return (date, Slot) for the earliest free slot in the range, or None."""
+        now = now or timezone.localtime()
+        for day in self.dates():
+            slots = self.window_slots(doctor_id, day, now=now, time_from=time_from, time_to=time_to)
+            if slots:
+                return day, slots[0]
+        return None
+
+    def dates(self):
+        """Iterate over every date covered by the engine."""
+        day = self.start_date
+        while day <= self.end_date:
+            yield day
+            day += timedelta(days=1)
+
+
+def next_available_slots(doctor_ids, days=14, now=None):
+    """
+    Return {doctor_id: (date, Slot)} with each doctor's next free slot.
+
+    The lookup covers ``days`` days from today for all doctors in one
+    engine load, so its cost does not grow with the number of doctors.
+    """
+    now = now or timezone.localtime()
+    engine = SlotEngine(doctor_ids, now.date(), now.date() + timedelta(days=days - 1))
+    result = {}
+    for doctor_id in engine.doctor_ids:
+        found = engine.first_free_slot(doctor_id, now=now)
+        if found:
+            result[doctor_id] = found
+    return result
@@ -0,0 +1,145 @@
+from collections import defaultdict
+from django.db import transaction
+from django.db.models import Count, Exists, OuterRef, Q, Sum
+from .registry import appointment_statuses
+
+# Rollup column -> appointment status counted in it
+STATUS_COLUMNS = {
+    'scheduled': 'scheduled',
+    'confirmed': 'confirmed',
+    'completed': 'completed',
+    'cancelled': 'cancelled',
+    'no_shows': 'no_show',
+}
+
+# Appointment fields whose change moves a day's rollup
+STATS_FIELDS = ('doctor_id', 'appointment_date', 'patient_id', 'status_id', 'payment_status', 'consultation_fee')
+
+
+def build_stats(doctor_ids, dates=None):
+    """
+    Build unsaved DoctorDailyStats rows from the appointments of ``doctor_ids``.
+
+    Only ``dates`` are aggregated when given, otherwise the doctors' whole
+    history. One grouped query, whatever the number of days.
+    """
+    from .models import Appointment, DoctorDailyStats
+
+    appointments = Appointment.objects.filter(doctor_id__in=doctor_ids)
+    if dates is not None:
+        appointments = appointments.filter(appointment_date__in=dates)
+    earlier_visit = Appointment.objects.filter(
+        doctor_id=OuterRef('doctor_id'),
+        patient_id=OuterRef('patient_id'),
+        appointment_date__lt=OuterRef('appointment_date')
+    )
+    cancelled_ids = appointment_statuses.ids(['cancelled'])
+    rows = appointments.values('doctor_id', 'appointment_date').annotate(
+        total=Count('pk'),
+        revenue=Sum('consultation_fee', filter=Q(payment_status='paid'), default=0),
+        outstanding=Sum(
+            'consultation_fee', filter=Q(payment_status='pending') & ~Q(status_id__in=cancelled_ids), default=0
+        ),
+        new_patients=Count('patient_id', distinct=True, filter=~Exists(earlier_visit)),
+        **{
+            column: Count('pk', filter=Q(status_id__in=appointment_statuses.ids([status])))
+            for column, status in STATUS_COLUMNS.items()
+        }
+    ).order_by()
+    return [
+        DoctorDailyStats(
+            doctor_id=row['doctor_id'],
+            date=row['appointment_date'],
+            appointments=row['total'],
+            revenue=row['revenue'],
+            outstanding=row['outstanding'],
+            new_patients=row['new_patients'],
+            **{column: row[column] for column in STATUS_COLUMNS}
+        )
+        for row in rows
+    ]
+
+
+def rebuild_stats(doctor_ids, dates=None):
+    """
+    Recompute the DoctorDailyStats rows of doctors, for ``dates`` or their whole history.
+
+    Days left without appointments lose their row. Returns the number of
+    rows written.
+    """
+    from doctors.models import DoctorProfile
+    from .models import DoctorDailyStats
+
+    doctor_ids = sorted(set(doctor_ids))
+    if not doctor_ids or dates is not None and not dates:
+        return 0
+    dates = sorted(set(dates)) if dates is not None else None
+
+    with transaction.atomic():
+        # Serialize with other refreshes of the same doctors, like the availability rebuild
+        list(DoctorProfile.objects.select_for_update(no_key=True).filter(
+            pk__in=doctor_ids
+        ).order_by('pk').values_list('pk', flat=True))
+        # Aggregate only once the lock is held, so a refresh that waited on it
+        # sees the appointments committed by the one before it
+        rows = build_stats(doctor_ids, dates)
+        stale = DoctorDailyStats.objects.filter(doctor_id__in=doctor_ids)
+        if dates is not None:
+            stale = stale.filter(date__in=dates)
+        stale.delete()
+        DoctorDailyStats.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
+
+
+def refresh_stats(doctor_id, dates, patient_ids=()):
+    """
+    Recompute a doctor's rollup for ``dates`` and for the first-visit days of their patients.
+
+    A booking, move or delete can shift which day is a patient's first visit
+    with the doctor. That day is always one of the changed days or one of
+    the patient's first two visit days now, so those are refreshed as well.
+    ``patient_ids`` names patients whose rows left ``dates`` (e.g. deleted).
+    """
+    from .models import Appointment
+
+    dates = set(dates)
+    patient_ids = set(patient_ids) | set(Appointment.objects.filter(
+        doctor_id=doctor_id, appointment_date__in=dates
+    ).values_list('patient_id', flat=True).distinct())
+    visit_days = defaultdict(list)
+    for patient_id, day in Appointment.objects.filter(
+        doctor_id=doctor_id, patient_id__in=patient_ids
+    ).values_list('patient_id', 'appointment_date').distinct().order_by('patient_id', 'appointment_date'):
+        visit_days[patient_id].append(day)
+    for days in visit_days.values():
+        dates.update(days[:2])
+    return rebuild_stats([doctor_id], dates)
+
+
+def schedule_stats_refresh(doctor_id, dates, patient_ids=()):
+    """
+    Refresh a doctor's daily rollup for ``dates`` once the current transaction commits.
+
+    A failed refresh is logged instead of failing the already committed request.
+    """
+    dates = {day for day in dates if day is not None}
+    if doctor_id is None or not dates:
+        return
+    patient_ids = {patient_id for patient_id in patient_ids if patient_id is not None}
+    transaction.on_commit(lambda: refresh_stats(doctor_id, dates, patient_ids), robust=True)
+
+
+def stats_summary(doctor_id, start, end):
+    """
+    Return the totals and per-day rows of a doctor's rollup between two dates (inclusive).
+
+    Reads only DoctorDailyStats: one row per day with appointments.
+    """
+    from .models import DoctorDailyStats
+
+    columns = ['appointments', *STATUS_COLUMNS, 'revenue', 'outstanding', 'new_patients']
+    days = list(DoctorDailyStats.objects.filter(
+        doctor_id=doctor_id, date__gte=start, date__lte=end
+    ).order_by('date').values('date', *columns))
+    totals = {column: sum(day[column] for day in days) for column in columns}
+    return totals, days
@@ -0,0 +1,59 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+from accounts.models import CustomUser
+from doctors.models import DoctorProfile, Clinic
+from .models import Appointment, AppointmentStatus
+
+# Tests keep their cache keys under a prefix of their own, so clearing them
+# never touches the holds, idempotency keys or agendas of a shared Redis
+TEST_CACHES = {'default': {**settings.CACHES['default'], 'KEY_PREFIX': 'heydoc-tests'}}
+
+
+def clear_test_cache():
+    """Delete the keys written under the test prefix, and nothing else."""
+    cache.delete_pattern('*')
+
+
+@override_settings(CACHES=TEST_CACHES)
+class BookingTestCase(TestCase):
+    """
+    Shared fixture of the appointment tests: a verified doctor with a primary clinic, and a patient.
+
+    Subclasses list the appointment statuses they need in ``statuses`` and
+    extend ``setUpTestData`` with their own rows. Every test starts with an
+    empty test cache.
+    """
+
+    statuses = ['scheduled']
+
+    @classmethod
+    def setUpTestData(cls):
+        for name in cls.statuses:
+            AppointmentStatus.objects.create(name=name)
+        doctor_user = CustomUser.objects.create(
+            email='doctor@heydoc.test', first_name='Ada', last_name='Doc', is_doctor=True, is_patient=False
+        )
+        cls.doctor = DoctorProfile.objects.create(
+            user=doctor_user, license_number='LIC-0001', consultation_fee=100, is_verified=True
+        )
+        cls.clinic = Clinic.objects.create(doctor=cls.doctor, name='Main', address='1 Street', is_primary=True)
+        cls.patient = CustomUser.objects.create(email='patient@heydoc.test', first_name='Pat', last_name='Ient')
+
+    def setUp(self):
+        clear_test_cache()
+
+    @classmethod
+    def create_appointment(cls, appointment_date, appointment_time, status='scheduled', **fields):
+        """Book the patient with the doctor at the main clinic, unless ``fields`` say otherwise."""
+        fields = {'patient': cls.patient, 'doctor': cls.doctor, 'clinic': cls.clinic, 'consultation_fee': 100, **fields}
+        return Appointment.objects.create(
+            appointment_date=appointment_date, appointment_time=appointment_time,
+            status=AppointmentStatus.objects.get(name=status), **fields
+        )
+
+    def client_for(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
@@ -1,3 +1,1240 @@
-from django.test import TestCase
+import json
+import threading
+import time as clock
+from datetime import datetime, time, timedelta
+from io import StringIO
+from types import SimpleNamespace
+from unittest import mock
+from urllib.parse import urlencode
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from accounts.models import CustomUser, PatientProfile
+from doctors.models import DoctorProfile, Clinic, Schedule, Specialization, Unavailability
+from notifications.models import Notification
+from notifications.registry import notification_types
+from .availability import availability_summary, horizon, rebuild_availability
+from .calendar import feed_appointments, feed_etag
+from .expressions import slot_bounds
+from .holds import get_hold, release_hold
+from .models import Appointment, AppointmentStatus, DailyAvailability, DoctorDailyStats, WaitlistEntry
+from .registry import appointment_statuses
+from .reminders import REMINDER_NOTIFICATION_TYPE, send_due_reminders
+from .serializers import CreateAppointmentSerializer
+from .testing import BookingTestCase
+from .transitions import ALLOWED_TRANSITIONS, DEFAULT_REASONS, TransitionError, apply_transition
+from .slots import SlotEngine
+from .stats import rebuild_stats
+from .waitlist import OFFER_NOTIFICATION_TYPE, expire_offers, process_queue
 
-# Create your tests here.
+
+class BookingConcurrencyBenchmark(TransactionTestCase):
+    """Fire parallel bookings at one slot: exactly one must win."""
+
+    parallel_requests = 16
+
+    def setUp(self):
+        for name in ['scheduled', 'confirmed', 'completed', 'cancelled', 'no_show']:
+            AppointmentStatus.objects.create(name=name)
+        doctor_user = CustomUser.objects.create_user(
+            email='doctor@heydoc.test', password='pass', first_name='Ada', last_name='Doc',
+            is_doctor=True, is_patient=False
+        )
+        self.doctor = DoctorProfile.objects.create(
+            user=doctor_user, license_number='LIC-0001', consultation_fee=100, is_verified=True
+        )
+        self.clinic = Clinic.objects.create(doctor=self.doctor, name='Main', address='1 Street', is_primary=True)
+        self.patients = [
+            CustomUser.objects.create_user(
+                email=f'patient{i}@heydoc.test', password='pass', first_name='Pat', last_name=str(i)
+            )
+            for i in range(self.parallel_requests)
+        ]
+
+    def test_parallel_bookings_for_one_slot(self):
+        payload = {
+            'doctor': self.doctor.id,
+            'clinic': self.clinic.id,
+            'appointment_date': (timezone.localdate() + timedelta(days=1)).isoformat(),
+            'appointment_time': time(10, 0).strftime('%H:%M'),
+            'consultation_fee': '100.00',
+        }
+        barrier = threading.Barrier(self.parallel_requests)
+        status_codes = []
+
+        def book(patient):
+            client = APIClient()
+            client.force_authenticate(patient)
+            try:
+                barrier.wait()
+                response = client.post('/api/appointments/', payload, format='json')
+                status_codes.append(response.status_code)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=book, args=(patient,)) for patient in self.patients]
+        started = clock.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = clock.perf_counter() - started
+
+        print(
+            f'\n{self.parallel_requests} parallel bookings in {elapsed:.3f}s '
+            f'({self.parallel_requests / elapsed:.1f} req/s)'
+        )
+        self.assertEqual(status_codes.count(201), 1)
+        self.assertEqual(status_codes.count(400), self.parallel_requests - 1)
+        self.assertEqual(Appointment.objects.filter(doctor=self.doctor, holds_slot=True).count(), 1)
+
+
+class SlotEngineTests(BookingTestCase):
+    """Slots come from the weekly schedule, minus absences and active bookings, per clinic."""
+
+    statuses = ['scheduled', 'cancelled']
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.annex = Clinic.objects.create(doctor=cls.doctor, name='Annex', address='2 Street')
+        cls.day = timezone.localdate() + timedelta(days=7)
+        Schedule.objects.create(
+            doctor=cls.doctor, clinic=cls.clinic, day_of_week=cls.day.weekday(),
+            start_time=time(9), end_time=time(11), slot_duration=30
+        )
+        Schedule.objects.create(
+            doctor=cls.doctor, clinic=cls.annex, day_of_week=cls.day.weekday(),
+            start_time=time(14), end_time=time(16), slot_duration=60
+        )
+
+    def book(self, start, duration=30, status='scheduled'):
+        return self.create_appointment(self.day, start, status, duration=duration)
+
+    def free_times(self, day=None):
+        day = day or self.day
+        return [slot.time for slot in SlotEngine([self.doctor.pk], day).free_slots(self.doctor.pk, day)]
+
+    def test_schedule_blocks_per_clinic(self):
+        slots = SlotEngine([self.doctor.pk], self.day).slots(self.doctor.pk, self.day)
+        self.assertEqual([(slot.time, slot.duration, slot.clinic_id) for slot in slots], [
+            (time(9), 30, self.clinic.pk), (time(9, 30), 30, self.clinic.pk),
+            (time(10), 30, self.clinic.pk), (time(10, 30), 30, self.clinic.pk),
+            (time(14), 60, self.annex.pk), (time(15), 60, self.annex.pk),
+        ])
+        # No schedule on the other weekdays
+        self.assertEqual(self.free_times(self.day + timedelta(days=1)), [])
+
+    def test_bookings_block_every_slot_they_overlap(self):
+        self.book(time(9, 15), duration=45)
+        self.book(time(10, 30), status='cancelled')
+        self.assertEqual(self.free_times(), [time(10), time(10, 30), time(14), time(15)])
+        self.assertEqual(SlotEngine([self.doctor.pk], self.day).booked_times(self.doctor.pk, self.day), [time(9, 15)])
+
+    def test_unavailability(self):
+        Unavailability.objects.create(doctor=self.doctor, date=self.day, start_time=time(10), end_time=time(14, 30))
+        self.book(time(9))
+        engine = SlotEngine([self.doctor.pk], self.day)
+        self.assertEqual([slot.time for slot in engine.free_slots(self.doctor.pk, self.day)], [time(9, 30), time(15)])
+        # Blocked slots are not bookable, so they are left out of the counts
+        self.assertEqual(engine.counts(self.doctor.pk, self.day), {self.clinic.pk: (2, 1, 1), self.annex.pk: (1, 0, 1)})
+
+        Unavailability.objects.create(doctor=self.doctor, date=self.day, is_full_day=True)
+        self.assertEqual(self.free_times(), [])
+
+    def test_past_and_started_slots(self):
+        now = timezone.make_aware(datetime.combine(self.day, time(10)))
+        engine = SlotEngine([self.doctor.pk], self.day)
+        self.assertEqual([slot.time for slot in engine.free_slots(self.doctor.pk, self.day, now=now)], [
+            time(10, 30), time(14), time(15)
+        ])
+        self.assertEqual(engine.free_slots(self.doctor.pk, self.day, now=now + timedelta(days=1)), [])
+
+    def test_default_hours_without_schedule(self):
+        other_user = CustomUser.objects.create(email='other@heydoc.test', is_doctor=True, is_patient=False)
+        other = DoctorProfile.objects.create(user=other_user, license_number='LIC-0002', consultation_fee=100)
+        engine = SlotEngine([other.pk], self.day)
+        self.assertEqual(len(engine.slots(other.pk, self.day)), 14)
+        self.assertEqual(engine.first_free_slot(other.pk)[1].time, time(9))
+
+    def test_first_free_slot_and_windows(self):
+        engine = SlotEngine([self.doctor.pk], self.day - timedelta(days=1), self.day + timedelta(days=7))
+        self.assertEqual(engine.first_free_slot(self.doctor.pk), (self.day, engine.slots(self.doctor.pk, self.day)[0]))
+        day, slot = engine.first_free_slot(self.doctor.pk, time_from=time(12))
+        self.assertEqual((day, slot.time, slot.clinic_id), (self.day, time(14), self.annex.pk))
+        self.assertIsNone(engine.first_free_slot(self.doctor.pk, time_from=time(17)))
+
+    def test_available_slots_view(self):
+        self.book(time(9))
+        client = self.client_for(self.patient)
+        with self.assertNumQueries(4):
+            response = client.get('/api/appointments/available-slots/', {
+                'doctor_id': self.doctor.pk, 'date': self.day.isoformat()
+            })
+        self.assertEqual(response.data['available_slots'], ['09:30', '10:00', '10:30', '14:00', '15:00'])
+        self.assertEqual(response.data['booked_slots'], ['09:00'])
+        self.assertEqual(response.data['total_slots'], 6)
+
+
+class DailyAvailabilityTests(BookingTestCase):
+    """The materialized table follows bookings day by day and serves the availability check."""
+
+    statuses = ['scheduled', 'confirmed', 'cancelled']
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        Schedule.objects.bulk_create([
+            Schedule(doctor=cls.doctor, clinic=cls.clinic, day_of_week=day, start_time=time(9), end_time=time(11),
+                     slot_duration=30)
+            for day in range(7)
+        ])
+        cls.day = timezone.localdate() + timedelta(days=5)
+
+    def setUp(self):
+        super().setUp()
+        appointment_statuses.ids(['scheduled'])
+        rebuild_availability([self.doctor.pk])
+
+    def stored(self, day):
+        row = DailyAvailability.objects.get(doctor=self.doctor, date=day)
+        return row.total_slots, row.booked_slots, row.free_slots
+
+    def test_rebuild_covers_the_horizon(self):
+        start, end = horizon()
+        self.assertEqual(
+            DailyAvailability.objects.filter(doctor=self.doctor).count(), (end - start).days + 1
+        )
+        self.assertEqual(self.stored(self.day), (4, 0, 4))
+
+    def test_bookings_refresh_only_their_days(self):
+        other_day = self.day + timedelta(days=1)
+        DailyAvailability.objects.filter(date=other_day).update(free_slots=99)
+        with self.captureOnCommitCallbacks(execute=True):
+            appointment = self.create_appointment(self.day, time(9))
+        self.assertEqual(self.stored(self.day), (4, 1, 3))
+        self.assertEqual(self.stored(other_day)[2], 99)
+
+        # A move refreshes the day it left and the day it landed on
+        with self.captureOnCommitCallbacks(execute=True):
+            appointment.appointment_date = other_day
+            appointment.save()
+        self.assertEqual(self.stored(self.day), (4, 0, 4))
+        self.assertEqual(self.stored(other_day), (4, 1, 3))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            apply_transition([appointment.pk], 'cancelled')
+        self.assertEqual(self.stored(other_day), (4, 0, 4))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Unavailability.objects.create(doctor=self.doctor, date=self.day, start_time=time(9), end_time=time(10))
+        self.assertEqual(self.stored(self.day), (2, 0, 2))
+
+    def test_failed_refresh_keeps_the_booking(self):
+        payload = {
+            'doctor': self.doctor.pk, 'clinic': self.clinic.pk, 'consultation_fee': '100.00',
+            'appointment_date': self.day.isoformat(), 'appointment_time': '09:00',
+        }
+        failure = mock.Mock(side_effect=RuntimeError('rebuild failed'))
+        with mock.patch('appointments.availability.rebuild_availability', failure), \
+                mock.patch('appointments.stats.refresh_stats', failure), \
+                self.assertLogs('django', 'ERROR'), \
+                self.captureOnCommitCallbacks(execute=True):
+            response = self.client_for(self.patient).post('/api/appointments/', payload, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(failure.called)
+        self.assertTrue(Appointment.objects.filter(doctor=self.doctor, appointment_date=self.day).exists())
+        # The stale row stays until the next refresh of that day
+        self.assertEqual(self.stored(self.day), (4, 0, 4))
+
+    def test_summary_reads_stored_rows(self):
+        DailyAvailability.objects.filter(date=self.day).update(free_slots=3)
+        with self.assertNumQueries(1):
+            summary = availability_summary(self.doctor.pk, [self.day])
+        self.assertEqual(summary, {self.day: (4, 0, 3)})
+
+    def test_summary_computes_today_and_missing_days_live(self):
+        today = timezone.localdate()
+        beyond = horizon()[1] + timedelta(days=1)
+        start_of_today = timezone.make_aware(datetime.combine(today, time(0)))
+        # One read of the stored rows, then one engine load for both live days
+        with self.assertNumQueries(4):
+            summary = availability_summary(self.doctor.pk, [today, self.day, beyond], now=start_of_today)
+        self.assertEqual(summary, {today: (4, 0, 4), self.day: (4, 0, 4), beyond: (4, 0, 4)})
+
+
+class SlotHoldTests(BookingTestCase):
+    """A held slot is hidden from, and cannot be booked by, other patients until it is released."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.day = timezone.localdate() + timedelta(days=2)
+        Schedule.objects.create(
+            doctor=cls.doctor, clinic=cls.clinic, day_of_week=cls.day.weekday(),
+            start_time=time(9), end_time=time(10), slot_duration=30
+        )
+        cls.holder = CustomUser.objects.create(email='holder@heydoc.test', first_name='Hol', last_name='Der')
+        cls.other = CustomUser.objects.create(email='other@heydoc.test', first_name='Oth', last_name='Er')
+
+    def hold(self, user, method='post', slot_time='09:00', doctor_id=None):
+        params = {'doctor_id': doctor_id or self.doctor.pk, 'date': self.day.isoformat(), 'time': slot_time}
+        if method == 'delete':
+            return self.client_for(user).delete(f'/api/appointments/holds/?{urlencode(params)}')
+        return self.client_for(user).post('/api/appointments/holds/', params, format='json')
+
+    def free_times(self, user):
+        return self.client_for(user).get('/api/appointments/available-slots/', {
+            'doctor_id': self.doctor.pk, 'date': self.day.isoformat()
+        }).data['available_slots']
+
+    def book(self, user):
+        return self.client_for(user).post('/api/appointments/', {
+            'doctor': self.doctor.pk, 'clinic': self.clinic.pk, 'appointment_date': self.day.isoformat(),
+            'appointment_time': '09:00', 'consultation_fee': '100.00'
+        }, format='json')
+
+    def test_hold_blocks_other_patients(self):
+        response = self.hold(self.holder)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['clinic_id'], self.clinic.pk)
+        # Holding again extends the hold; somebody else cannot take it
+        self.assertEqual(self.hold(self.holder).status_code, 201)
+        self.assertEqual(self.hold(self.other).status_code, 409)
+
+        self.assertEqual(self.free_times(self.holder), ['09:00', '09:30'])
+        self.assertEqual(self.free_times(self.other), ['09:30'])
+        self.assertEqual(self.book(self.other).status_code, 400)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.book(self.holder).status_code, 201)
+        # The booking took over the hold
+        self.assertIsNone(get_hold(self.doctor.pk, self.day, time(9)))
+
+    def test_conflicts_checked_once(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.book(self.holder).status_code, 201)
+        sql = [query['sql'] for query in queries.captured_queries]
+        conflict_checks = [query for query in sql if query.startswith('SELECT COUNT(')]
+        self.assertEqual(len(conflict_checks), 1)
+        # After the patient and doctor locks
+        self.assertGreater(sql.index(conflict_checks[0]), max(i for i, query in enumerate(sql) if 'FOR NO KEY UPDATE' in query))
+        self.assertEqual(self.book(self.holder).status_code, 400)
+
+    def test_release(self):
+        self.hold(self.holder)
+        self.assertEqual(self.hold(self.other, method='delete').status_code, 404)
+        self.assertEqual(self.hold(self.holder, method='delete').status_code, 204)
+        self.assertEqual(self.free_times(self.other), ['09:00', '09:30'])
+        self.assertEqual(self.hold(self.other).status_code, 201)
+
+    def test_only_free_slots_can_be_held(self):
+        self.assertEqual(self.hold(self.holder, slot_time='09:15').status_code, 409)
+        self.assertEqual(self.hold(self.holder, slot_time='10:00').status_code, 409)
+        self.assertEqual(self.client_for(self.holder).post('/api/appointments/holds/', {}).status_code, 400)
+
+    def test_only_verified_doctors(self):
+        unverified_user = CustomUser.objects.create(email='new@heydoc.test', is_doctor=True, is_patient=False)
+        unverified = DoctorProfile.objects.create(user=unverified_user, license_number='LIC-0002', consultation_fee=100)
+        Schedule.objects.create(
+            doctor=unverified, clinic=Clinic.objects.create(doctor=unverified, name='New', address='3 Street'),
+            day_of_week=self.day.weekday(), start_time=time(9), end_time=time(10), slot_duration=30
+        )
+        self.assertEqual(self.hold(self.holder, doctor_id=unverified.pk).status_code, 400)
+        self.assertEqual(self.hold(self.holder, doctor_id=unverified.pk + 1000).status_code, 400)
+        self.assertIsNone(get_hold(unverified.pk, self.day, time(9)))
+
+    def test_one_hold_per_doctor(self):
+        self.assertEqual(self.hold(self.holder).status_code, 201)
+        self.assertEqual(self.hold(self.holder, slot_time='09:30').status_code, 201)
+        # The second slot replaced the first
+        self.assertIsNone(get_hold(self.doctor.pk, self.day, time(9)))
+        self.assertEqual(self.free_times(self.other), ['09:00'])
+        self.assertEqual(self.hold(self.other).status_code, 201)
+        # Going back to the first slot cannot take it from the new holder
+        self.assertEqual(self.hold(self.holder).status_code, 409)
+        self.assertEqual(get_hold(self.doctor.pk, self.day, time(9, 30))['user_id'], self.holder.pk)
+
+
+class TransitionTests(BookingTestCase):
+    """apply_transition follows the transition table; the bulk endpoint validates its body strictly."""
+
+    statuses = ['scheduled', 'confirmed', 'completed', 'cancelled', 'no_show']
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        day = timezone.localdate() + timedelta(days=1)
+        cls.appointments = [cls.create_appointment(day, time(9 + i)) for i in range(3)]
+
+    def set_status(self, appointment, name):
+        status = appointment_statuses.get(name)
+        Appointment.objects.filter(pk=appointment.pk).update(status=status, holds_slot=status.is_active_status)
+
+    def status_of(self, appointment):
+        return Appointment.objects.select_related('status').get(pk=appointment.pk).status.name
+
+    def test_transition_table(self):
+        appointment = self.appointments[0]
+        for source in self.statuses:
+            for target in self.statuses:
+                with self.subTest(source=source, target=target):
+                    self.set_status(appointment, source)
+                    moved = apply_transition([appointment.pk], target)
+                    allowed = target in ALLOWED_TRANSITIONS.get(source, ())
+                    self.assertEqual(len(moved), int(allowed))
+                    self.assertEqual(self.status_of(appointment), target if allowed else source)
+
+    def test_history_and_fields(self):
+        moved = apply_transition(
+            [self.appointments[0].pk], 'completed', changed_by=self.doctor.user, notes='Fine', reason='Seen'
+        )
+        self.assertEqual([row.status_id for row in moved], [appointment_statuses.get('scheduled').pk])
+        appointment = Appointment.objects.get(pk=self.appointments[0].pk)
+        self.assertEqual((appointment.notes, appointment.holds_slot), ('Fine', False))
+        history = appointment.history.get()
+        self.assertEqual((history.old_status.name, history.new_status.name), ('scheduled', 'completed'))
+        self.assertEqual((history.changed_by, history.change_reason), (self.doctor.user, 'Seen'))
+
+        apply_transition([self.appointments[1].pk], 'cancelled')
+        self.assertEqual(self.appointments[1].history.get().change_reason, DEFAULT_REASONS['cancelled'])
+
+    def test_error_paths(self):
+        with self.assertRaisesMessage(TransitionError, "Unknown appointment status 'lost'"):
+            apply_transition([self.appointments[0].pk], 'lost')
+
+        self.set_status(self.appointments[0], 'completed')
+        ids = [appointment.pk for appointment in self.appointments]
+        with self.assertRaisesMessage(TransitionError, self.appointments[0].booking_id):
+            apply_transition(ids, 'confirmed', strict=True)
+        self.assertEqual(self.status_of(self.appointments[1]), 'scheduled')
+
+        moved = apply_transition(ids, 'confirmed')
+        self.assertEqual({row.id for row in moved}, set(ids[1:]))
+        self.assertEqual(apply_transition([], 'confirmed'), [])
+
+    def bulk(self, user, body):
+        return self.client_for(user).post('/api/appointments/bulk-status/', body, format='json')
+
+    def test_bulk_endpoint(self):
+        self.set_status(self.appointments[0], 'completed')
+        ids = [appointment.pk for appointment in self.appointments]
+        body = {'appointment_ids': ids, 'status': 'confirmed'}
+        self.assertEqual(self.bulk(self.patient, body).status_code, 403)
+        # Strict by default; the string 'false' turns it off
+        self.assertEqual(self.bulk(self.doctor.user, body).status_code, 400)
+        response = self.bulk(self.doctor.user, {**body, 'appointment_ids': ids + [0], 'strict': 'false'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['updated'], sorted(ids[1:]))
+        self.assertEqual(response.data['skipped'], [0, ids[0]])
+
+    def test_bulk_endpoint_rejects_malformed_ids(self):
+        for appointment_ids in [f'{self.appointments[0].pk}', [], ['one'], None, {'id': 1}]:
+            with self.subTest(appointment_ids=appointment_ids):
+                response = self.bulk(self.doctor.user, {'appointment_ids': appointment_ids, 'status': 'confirmed'})
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('appointment_ids', response.data)
+        self.assertEqual(self.status_of(self.appointments[0]), 'scheduled')
+
+
+class RescheduleTests(BookingTestCase):
+    """An appointment moves to a free slot in place, keeping its booking id and recording the move."""
+
+    statuses = ['scheduled', 'cancelled']
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.annex = Clinic.objects.create(doctor=cls.doctor, name='Annex', address='2 Street')
+        cls.day = timezone.localdate() + timedelta(days=3)
+        Schedule.objects.create(
+            doctor=cls.doctor, clinic=cls.annex, day_of_week=(cls.day + timedelta(days=1)).weekday(),
+            start_time=time(9), end_time=time(12), slot_duration=45
+        )
+        cls.other = CustomUser.objects.create(email='other@heydoc.test', first_name='Oth', last_name='Er')
+
+    def setUp(self):
+        super().setUp()
+        self.appointment = self.create_appointment(self.day, time(9))
+        self.taken = self.create_appointment(self.day, time(10), patient=self.other)
+
+    def reschedule(self, user=None, appointment=None, **body):
+        appointment = appointment or self.appointment
+        return self.client_for(user or self.patient).post(f'/api/appointments/{appointment.pk}/reschedule/', body, format='json')
+
+    def test_move_to_another_day_and_clinic(self):
+        next_day = self.day + timedelta(days=1)
+        response = self.reschedule(
+            appointment_date=next_day.isoformat(), appointment_time='09:45', clinic=self.annex.pk, reason='Trip'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['booking_id'], self.appointment.booking_id)
+        # The slot length follows the new day's schedule
+        self.assertEqual(response.data['duration'], 45)
+        moved = Appointment.objects.get(pk=self.appointment.pk)
+        self.assertEqual((moved.appointment_date, moved.appointment_time, moved.clinic_id),
+                         (next_day, time(9, 45), self.annex.pk))
+        self.assertEqual(moved.history.get().change_reason, 'Trip')
+
+    def test_may_overlap_its_own_slot(self):
+        response = self.reschedule(appointment_date=self.day.isoformat(), appointment_time='09:15')
+        self.assertEqual(response.status_code, 200)
+
+    def test_rejected_moves(self):
+        self.assertEqual(
+            self.reschedule(appointment_date=self.day.isoformat(), appointment_time='10:15').status_code, 400
+        )
+        self.assertEqual(
+            self.reschedule(appointment_date=self.day.isoformat(), appointment_time='09:00').status_code, 400
+        )
+        yesterday = timezone.localdate() - timedelta(days=1)
+        self.assertEqual(
+            self.reschedule(appointment_date=yesterday.isoformat(), appointment_time='09:00').status_code, 400
+        )
+        self.assertEqual(self.reschedule(
+            user=self.other, appointment_date=self.day.isoformat(), appointment_time='11:00'
+        ).status_code, 403)
+        apply_transition([self.appointment.pk], 'cancelled')
+        self.assertEqual(
+            self.reschedule(appointment_date=self.day.isoformat(), appointment_time='11:00').status_code, 400
+        )
+        self.assertFalse(self.appointment.history.exclude(new_status__name='cancelled').exists())
+
+
+class ReminderTests(BookingTestCase):
+    """Every active appointment starting within the lead time is reminded exactly once."""
+
+    statuses = ['scheduled', 'confirmed', 'cancelled']
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.now = timezone.make_aware(datetime.combine(timezone.localdate() + timedelta(days=5), time(12)))
+
+    def setUp(self):
+        super().setUp()
+        # Types cached by earlier tests were rolled back with them
+        notification_types.invalidate()
+
+    def book(self, starts_in, status='scheduled'):
+        starts_at = timezone.localtime(self.now + starts_in)
+        return self.create_appointment(starts_at.date(), starts_at.time(), status)
+
+    def test_due_appointments_are_reminded_once(self):
+        due = [self.book(timedelta(hours=hours), status) for hours, status in
+               [(1, 'scheduled'), (5, 'confirmed'), (23, 'scheduled')]]
+        self.book(timedelta(hours=25))
+        self.book(timedelta(hours=2), 'cancelled')
+        self.book(timedelta(hours=-1))
+
+        self.assertEqual(send_due_reminders(now=self.now, batch_size=2), 3)
+        self.assertEqual(
+            set(Appointment.objects.filter(reminder_sent_at=self.now).values_list('pk', flat=True)),
+            {appointment.pk for appointment in due}
+        )
+        notifications = Notification.objects.filter(user=self.patient, type__name=REMINDER_NOTIFICATION_TYPE)
+        self.assertEqual(notifications.count(), 3)
+        self.assertIn(due[0].booking_id, notifications.get(data__contains=due[0].booking_id).message)
+
+        self.assertEqual(send_due_reminders(now=self.now), 0)
+        self.assertEqual(send_due_reminders(now=self.now + timedelta(hours=2)), 1)
+
+    def test_command(self):
+        self.book(timedelta(hours=1))
+        out = StringIO()
+        call_command('send_reminders', stdout=out)
+        self.assertIn('Sent', out.getvalue())
+
+
+class WaitlistTests(BookingTestCase):
+    """Freed slots go to the first waiting patient; lapsed offers pass the slot on and rejoin the queue."""
+
+    statuses = ['scheduled', 'cancelled']
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.day = timezone.localdate() + timedelta(days=2)
+        Schedule.objects.create(
+            doctor=cls.doctor, clinic=cls.clinic, day_of_week=cls.day.weekday(),
+            start_time=time(9), end_time=time(10), slot_duration=30
+        )
+        cls.first = CustomUser.objects.create(email='first@heydoc.test', first_name='Fir', last_name='St')
+        cls.second = CustomUser.objects.create(email='second@heydoc.test', first_name='Sec', last_name='Ond')
+
+    def setUp(self):
+        super().setUp()
+        # Types cached by earlier tests were rolled back with them
+        notification_types.invalidate()
+        self.appointment = self.create_appointment(self.day, time(9))
+        self.entries = [
+            WaitlistEntry.objects.create(patient=patient, doctor=self.doctor, start_date=self.day, end_date=self.day)
+            for patient in (self.first, self.second)
+        ]
+
+    def entry(self, index):
+        return WaitlistEntry.objects.get(pk=self.entries[index].pk)
+
+    def cancel_and_offer(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            apply_transition([self.appointment.pk], 'cancelled')
+        self.assertEqual(process_queue(), 1)
+
+    def book(self, user):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client_for(user).post('/api/appointments/', {
+                'doctor': self.doctor.pk, 'clinic': self.clinic.pk, 'appointment_date': self.day.isoformat(),
+                'appointment_time': '09:00', 'consultation_fee': '100.00'
+            }, format='json')
+
+    def test_offer_is_fulfilled_by_booking(self):
+        self.cancel_and_offer()
+        offered = self.entry(0)
+        self.assertEqual((offered.status, offered.offered_time), ('offered', time(9)))
+        self.assertEqual(get_hold(self.doctor.pk, self.day, time(9))['waitlist_entry_id'], offered.pk)
+        self.assertTrue(Notification.objects.filter(user=self.first, type__name=OFFER_NOTIFICATION_TYPE).exists())
+        # The hold keeps the slot from the rest of the queue
+        self.assertEqual(self.book(self.second).status_code, 400)
+
+        self.assertEqual(self.book(self.first).status_code, 201)
+        self.assertEqual(self.entry(0).status, 'fulfilled')
+        self.assertEqual(self.entry(1).status, 'waiting')
+        self.assertIsNone(get_hold(self.doctor.pk, self.day, time(9)))
+
+    def test_lapsed_offer_moves_on(self):
+        self.cancel_and_offer()
+        expiry = self.entry(0).offered_at + timedelta(seconds=settings.WAITLIST_OFFER_SECONDS)
+        self.assertEqual(expire_offers(now=expiry - timedelta(seconds=1)), 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(expire_offers(now=expiry), 1)
+        lapsed = self.entry(0)
+        self.assertEqual((lapsed.status, lapsed.offered_at), ('waiting', None))
+
+        # The slot goes to the next patient, not back to the one who let it lapse
+        self.assertEqual(process_queue(), 1)
+        self.assertEqual(self.entry(1).status, 'offered')
+        self.assertEqual(get_hold(self.doctor.pk, self.day, time(9))['user_id'], self.second.pk)
+        self.assertEqual(self.entry(0).status, 'waiting')
+
+    def test_offer_booked_after_the_hold_lapsed(self):
+        self.cancel_and_offer()
+        release_hold(self.doctor.pk, self.day, time(9), self.first.pk)
+        self.assertEqual(self.book(self.first).status_code, 201)
+        self.assertEqual(self.entry(0).status, 'offered')
+        expiry = self.entry(0).offered_at + timedelta(seconds=settings.WAITLIST_OFFER_SECONDS)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(expire_offers(now=expiry), 0)
+        self.assertEqual(self.entry(0).status, 'fulfilled')
+        self.assertEqual(process_queue(), 0)
+
+    def test_withdrawn_offer_moves_on(self):
+        self.cancel_and_offer()
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client_for(self.first).delete(f'/api/appointments/waitlist/{self.entries[0].pk}/')
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.entry(0).status, 'cancelled')
+        self.assertIsNone(get_hold(self.doctor.pk, self.day, time(9)))
+
+        self.assertEqual(process_queue(), 1)
+        self.assertEqual(self.entry(1).status, 'offered')
+        self.assertEqual(get_hold(self.doctor.pk, self.day, time(9))['user_id'], self.second.pk)
+
+    def test_withdrawn_entry_is_kept_as_cancelled(self):
+        client = self.client_for(self.first)
+        self.assertEqual(client.delete(f'/api/appointments/waitlist/{self.entries[1].pk}/').status_code, 404)
+        self.assertEqual(client.delete(f'/api/appointments/waitlist/{self.entries[0].pk}/').status_code, 204)
+        self.assertEqual(client.get(f'/api/appointments/waitlist/{self.entries[0].pk}/').data['status'], 'cancelled')
+        # The freed slot skips the cancelled entry
+        self.cancel_and_offer()
+        self.assertEqual(self.entry(0).status, 'cancelled')
+        self.assertEqual(self.entry(1).status, 'offered')
+
+
+class AppointmentListQueryTests(TestCase):
+    """A page of appointments costs the same number of queries however many doctors it spans."""
+
+    @classmethod
+    def setUpTestData(cls):
+        scheduled = AppointmentStatus.objects.create(name='scheduled')
+        specializations = Specialization.objects.bulk_create(
+            [Specialization(name=name) for name in ['Cardiology', 'Dermatology', 'Neurology']]
+        )
+        cls.patient = CustomUser.objects.create(
+            email='patient@heydoc.test', first_name='Pat', last_name='Ient', phone='+15550100'
+        )
+        today = timezone.localdate()
+        for i in range(25):
+            doctor_user = CustomUser.objects.create(
+                email=f'doctor{i}@heydoc.test', first_name='Doc', last_name=str(i), is_doctor=True, is_patient=False
+            )
+            doctor = DoctorProfile.objects.create(
+                user=doctor_user, license_number=f'LIC-{i:04d}', consultation_fee=100, is_verified=True
+            )
+            doctor.specializations.set(specializations[i % 3:])
+            clinic = Clinic.objects.create(doctor=doctor, name=f'Clinic {i}', address='1 Street', is_primary=True)
+            Appointment.objects.create(
+                patient=cls.patient, doctor=doctor, clinic=clinic, status=scheduled,
+                appointment_date=today + timedelta(days=i + 1), appointment_time=time(10, 0),
+                consultation_fee=100
+            )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.patient)
+        # Load the status registry up front, as a warm worker would have it
+        appointment_statuses.ids(['scheduled'])
+
+    def test_page_number_list(self):
+        # COUNT, the page with its joined relations, the specializations prefetch
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/appointments/')
+        self.assertEqual(response.data['count'], 25)
+        self.assertEqual(len(response.data['results']), 20)
+        first = response.data['results'][0]
+        self.assertEqual(first['status_name'], 'scheduled')
+        # The doctor dashboard's patient list reads the contact details
+        self.assertEqual(first['patient']['phone'], '+15550100')
+        self.assertEqual(first['doctor']['user']['last_name'], '24')
+        self.assertEqual([spec['name'] for spec in first['doctor']['specializations']], [
+            'Cardiology', 'Dermatology', 'Neurology'
+        ])
+        self.assertEqual(first['clinic']['name'], 'Clinic 24')
+
+    def test_cursor_list(self):
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/appointments/?pagination=cursor')
+        self.assertEqual(len(response.data['results']), 20)
+
+
+class AppointmentDetailTests(BookingTestCase):
+    """The detail view keeps its original shape, without the internal bookkeeping columns."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.appointment = cls.create_appointment(timezone.localdate() + timedelta(days=1), time(10))
+
+    def test_start_follows_the_slot(self):
+        appointment = Appointment.objects.get(pk=self.appointment.pk)
+        self.assertEqual(appointment.appointment_datetime, appointment.starts_at)
+        # Moved in memory, then saved: the loaded starts_at is stale either way
+        later = appointment.appointment_date + timedelta(days=1)
+        appointment.appointment_date = later
+        expected = datetime.combine(later, time(10), tzinfo=timezone.get_default_timezone())
+        self.assertEqual(appointment.appointment_datetime, expected)
+        appointment.save(update_fields=['appointment_date', 'updated_at'])
+        self.assertEqual(appointment.appointment_datetime, expected)
+        self.assertEqual(appointment.starts_at, expected)
+
+    def test_unsaved_start_uses_the_site_timezone(self):
+        appointment = Appointment(appointment_date=self.appointment.appointment_date, appointment_time=time(10))
+        with timezone.override('Asia/Kolkata'):
+            self.assertEqual(appointment.appointment_datetime, self.appointment.starts_at)
+
+    def test_internal_columns_are_hidden(self):
+        response = self.client_for(self.patient).get(f'/api/appointments/{self.appointment.pk}/')
+        self.assertEqual(response.data['booking_id'], self.appointment.booking_id)
+        self.assertEqual(response.data['status_name'], 'scheduled')
+        for column in ('holds_slot', 'slot_range', 'starts_at', 'ends_at', 'reminder_sent_at'):
+            self.assertNotIn(column, response.data)
+
+    def test_update_cannot_move_the_slot(self):
+        taken = self.create_appointment(self.appointment.appointment_date, time(11))
+        response = self.client_for(self.patient).patch(
+            f'/api/appointments/{self.appointment.pk}/',
+            {'appointment_time': '11:00', 'duration': 60, 'status': taken.status_id, 'symptoms': 'Cough'},
+            format='json',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.appointment.refresh_from_db()
+        self.assertEqual((self.appointment.appointment_time, self.appointment.duration), (time(10), 30))
+        self.assertEqual(self.appointment.symptoms, 'Cough')
+
+
+class DoctorAgendaTests(BookingTestCase):
+    """The day agenda is built in a fixed number of queries, cached, and dropped when the day changes."""
+
+    statuses = ['scheduled', 'confirmed', 'cancelled']
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.day = timezone.localdate() + timedelta(days=3)
+        Schedule.objects.create(
+            doctor=cls.doctor, clinic=cls.clinic, day_of_week=cls.day.weekday(),
+            start_time=time(9), end_time=time(13), slot_duration=30
+        )
+        Unavailability.objects.create(
+            doctor=cls.doctor, date=cls.day, start_time=time(11), end_time=time(12), reason='Lunch'
+        )
+        cls.appointments = []
+        for i in range(6):
+            patient = CustomUser.objects.create(email=f'patient{i}@heydoc.test', first_name='Pat', last_name=str(i))
+            PatientProfile.objects.update_or_create(user=patient, defaults={'blood_group': 'O+'})
+            cls.appointments.append(
+                cls.create_appointment(cls.day, time(9 + i // 2, (i % 2) * 30), patient=patient)
+            )
+
+    def setUp(self):
+        super().setUp()
+        appointment_statuses.ids(['scheduled'])
+        self.client = self.client_for(self.doctor.user)
+
+    def get_agenda(self):
+        return self.client.get('/api/appointments/agenda/', {'date': self.day.isoformat()})
+
+    def test_fixed_queries_and_cache(self):
+        # Doctor, schedule blocks, absences, appointments with patients and profiles
+        with self.assertNumQueries(4):
+            response = self.get_agenda()
+        timeline = response.data['timeline']
+        self.assertEqual([entry['start_time'] for entry in timeline],
+                         ['09:00', '09:30', '10:00', '10:30', '11:00', '11:00', '11:30'])
+        self.assertEqual(timeline[0]['patient']['blood_group'], 'O+')
+        self.assertEqual(len(response.data['blocks']), 1)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.get_agenda().data, response.data)
+
+    def test_changes_to_the_day_invalidate(self):
+        self.get_agenda()
+        with self.captureOnCommitCallbacks(execute=True):
+            apply_transition([self.appointments[0].pk], 'confirmed')
+        with self.assertNumQueries(4):
+            response = self.get_agenda()
+        self.assertEqual(response.data['timeline'][0]['status_name'], 'confirmed')
+
+    def test_patient_changes_invalidate(self):
+        self.get_agenda()
+        patient = CustomUser.objects.get(pk=self.appointments[0].patient_id)
+        # A login touches no field the agenda shows (it re-saves the profile too)
+        with self.captureOnCommitCallbacks(execute=True), CaptureQueriesContext(connection) as queries:
+            patient.last_login = timezone.now()
+            patient.save(update_fields=['last_login'])
+        self.assertFalse([query for query in queries.captured_queries if 'appointments_appointment' in query['sql']])
+        with self.assertNumQueries(1):
+            self.get_agenda()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            patient.first_name = 'Renamed'
+            patient.phone = '+15550100'
+            patient.save()
+        with self.assertNumQueries(4):
+            response = self.get_agenda()
+        self.assertEqual(response.data['timeline'][0]['patient']['name'], 'Renamed 0')
+        self.assertEqual(response.data['timeline'][0]['patient']['phone'], '+15550100')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            PatientProfile.objects.filter(user=patient).update(blood_group='A+')
+            profile = PatientProfile.objects.get(user=patient)
+            profile.allergies = 'Penicillin'
+            profile.save()
+        self.assertEqual(self.get_agenda().data['timeline'][0]['patient']['blood_group'], 'A+')
+
+
+class ExportTests(BookingTestCase):
+    """Staff stream the export as CSV or NDJSON, chosen by parameter or Accept header."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.staff = CustomUser.objects.create(email='staff@heydoc.test', first_name='Sta', last_name='Ff', is_staff=True)
+        cls.day = timezone.localdate() + timedelta(days=1)
+        cls.appointments = [cls.create_appointment(cls.day, time(9 + hour)) for hour in range(3)]
+
+    def export(self, user=None, accept=None, **params):
+        headers = {'HTTP_ACCEPT': accept} if accept else {}
+        return self.client_for(user or self.staff).get('/api/appointments/export/', params, **headers)
+
+    def test_csv(self):
+        response = self.export(accept='text/csv', start_date=self.day.isoformat())
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0].split(',')[:3], ['booking_id', 'appointment_date', 'appointment_time'])
+        self.assertEqual(
+            [line.split(',')[0] for line in lines[1:]], [appointment.booking_id for appointment in self.appointments]
+        )
+
+    def test_ndjson(self):
+        response = self.export(accept='application/x-ndjson', end_date=self.day.isoformat())
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([row['appointment_time'] for row in rows], ['09:00', '10:00', '11:00'])
+        self.assertEqual(rows[0]['status'], 'scheduled')
+        # The parameter wins over a generic Accept header
+        response = self.export(accept='*/*', file_format='ndjson')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+
+    def test_errors(self):
+        self.assertEqual(self.export(user=self.patient, accept='text/csv').status_code, 403)
+        response = self.export(
+            accept='text/csv', start_date=self.day.isoformat(), end_date=(self.day - timedelta(days=1)).isoformat()
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('end_date', json.loads(response.content))
+
+
+class CalendarFeedTests(BookingTestCase):
+    """Calendar apps poll the tokenized feed; unchanged feeds answer 304 and revoked tokens 404."""
+
+    statuses = ['scheduled', 'completed', 'cancelled']
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.patient.set_password('first-password')
+        cls.patient.save()
+        cls.appointment = cls.create_appointment(timezone.localdate() + timedelta(days=1), time(10))
+
+    def setUp(self):
+        super().setUp()
+        # Statuses cached by earlier tests were rolled back with them
+        appointment_statuses.invalidate()
+
+    def feed_url(self):
+        return self.client_for(self.patient).get('/api/appointments/calendar/').data['url']
+
+    def event_statuses(self):
+        body = b''.join(self.client.get(self.feed_url(), HTTP_ACCEPT='text/calendar').streaming_content).decode()
+        return {
+            event.split('UID:', 1)[1].split('@', 1)[0]: event.split('STATUS:', 1)[1].split('\r\n', 1)[0]
+            for event in body.split('BEGIN:VEVENT\r\n')[1:]
+        }
+
+    def test_event_statuses(self):
+        last_week = timezone.localdate() - timedelta(days=7)
+        completed = self.create_appointment(last_week, time(9), 'completed')
+        cancelled = self.create_appointment(last_week, time(11), 'cancelled')
+        # A visit that took place is not a cancelled event, although it no longer holds its slot
+        self.assertEqual(self.event_statuses(), {
+            self.appointment.booking_id: 'CONFIRMED',
+            completed.booking_id: 'CONFIRMED',
+            cancelled.booking_id: 'CANCELLED',
+        })
+
+    def test_feed(self):
+        response = self.client.get(self.feed_url(), HTTP_ACCEPT='text/calendar')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/calendar; charset=utf-8')
+        body = b''.join(response.streaming_content).decode()
+        self.assertTrue(body.startswith('BEGIN:VCALENDAR\r\n'))
+        self.assertIn(f'UID:{self.appointment.booking_id}@heydoc\r\n', body)
+        self.assertIn('SUMMARY:Appointment with Dr. Ada Doc\r\n', body)
+
+    def test_unchanged_feed(self):
+        url = self.feed_url()
+        etag = self.client.get(url, HTTP_ACCEPT='text/calendar')['ETag']
+        response = self.client.get(url, HTTP_ACCEPT='text/calendar', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        # A change to an appointment in the window changes the ETag
+        Appointment.objects.filter(pk=self.appointment.pk).update(symptoms='Cough', updated_at=timezone.now())
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_revoked_token(self):
+        url = self.feed_url()
+        self.patient.set_password('second-password')
+        self.patient.save()
+        self.assertEqual(self.client.get(url, HTTP_ACCEPT='text/calendar').status_code, 404)
+        self.assertEqual(self.client.get(url.replace('.ics', 'x.ics')).status_code, 404)
+        # The new URL works again
+        self.assertEqual(self.client.get(self.feed_url(), HTTP_ACCEPT='text/calendar').status_code, 200)
+
+
+class DoctorStatsTests(BookingTestCase):
+    """The daily rollup follows bookings and status changes, and the stats endpoint reads only the rollup."""
+
+    statuses = ['scheduled', 'confirmed', 'completed', 'cancelled', 'no_show']
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.first = CustomUser.objects.create(email='first@heydoc.test', first_name='Fir', last_name='St')
+        cls.second = CustomUser.objects.create(email='second@heydoc.test', first_name='Sec', last_name='Ond')
+        cls.day = timezone.localdate() - timedelta(days=3)
+        cls.next_day = cls.day + timedelta(days=1)
+
+    def setUp(self):
+        super().setUp()
+        # Statuses cached by earlier tests were rolled back with them
+        appointment_statuses.invalidate()
+
+    def book(self, patient, day, slot_time, status, payment_status='pending'):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.create_appointment(day, slot_time, status, patient=patient, payment_status=payment_status)
+
+    def rollup(self):
+        return {
+            row.date: (row.appointments, row.scheduled, row.confirmed, row.completed, row.cancelled,
+                       row.revenue, row.outstanding, row.new_patients)
+            for row in DoctorDailyStats.objects.filter(doctor=self.doctor)
+        }
+
+    def test_rollup_follows_appointments(self):
+        self.book(self.first, self.day, time(9), 'completed', payment_status='paid')
+        early = self.book(self.second, self.day, time(10), 'scheduled')
+        self.book(self.first, self.next_day, time(9), 'cancelled')
+        self.book(self.second, self.next_day, time(10), 'confirmed')
+        self.assertEqual(self.rollup(), {
+            self.day: (2, 1, 0, 1, 0, 100, 100, 2),
+            # Cancelled fees are not outstanding; both patients came before
+            self.next_day: (2, 0, 1, 0, 1, 0, 100, 0),
+        })
+
+        # The second patient's first visit moves to the next day
+        with self.captureOnCommitCallbacks(execute=True):
+            early.delete()
+        self.assertEqual(self.rollup()[self.day], (1, 0, 0, 1, 0, 100, 0, 1))
+        self.assertEqual(self.rollup()[self.next_day][-1], 1)
+
+        # A rebuild from scratch gives the same rows
+        expected = self.rollup()
+        DoctorDailyStats.objects.all().delete()
+        call_command('rebuild_doctor_stats', stdout=StringIO())
+        self.assertEqual(self.rollup(), expected)
+
+    def test_aggregates_under_the_lock(self):
+        self.book(self.first, self.day, time(9), 'scheduled')
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(rebuild_stats([self.doctor.pk], [self.day]), 1)
+        sql = [query['sql'] for query in queries.captured_queries]
+        lock = next(i for i, query in enumerate(sql) if 'FOR NO KEY UPDATE' in query)
+        aggregate = next(i for i, query in enumerate(sql) if 'GROUP BY' in query)
+        self.assertLess(lock, aggregate)
+
+    def test_endpoint(self):
+        self.book(self.first, self.day, time(9), 'completed', payment_status='paid')
+        self.book(self.second, self.next_day, time(9), 'scheduled')
+        client = self.client_for(self.doctor.user)
+        # The doctor, then the rollup rows
+        with self.assertNumQueries(2):
+            response = client.get('/api/appointments/stats/', {
+                'start_date': self.day.isoformat(), 'end_date': self.next_day.isoformat()
+            })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([day['date'] for day in response.data['days']], [self.day, self.next_day])
+        totals = response.data['totals']
+        self.assertEqual((totals['appointments'], totals['completed'], totals['scheduled']), (2, 1, 1))
+        self.assertEqual((totals['revenue'], totals['outstanding'], totals['new_patients']), (100, 100, 2))
+
+        # The default range is the last 30 days, which ends today
+        self.assertEqual(client.get('/api/appointments/stats/').data['totals']['appointments'], 2)
+        self.assertEqual(client.get('/api/appointments/stats/', {
+            'start_date': self.next_day.isoformat(), 'end_date': self.day.isoformat()
+        }).status_code, 400)
+        self.assertEqual(client.get('/api/appointments/stats/', {
+            'start_date': self.day.isoformat(), 'end_date': (self.day + timedelta(days=366)).isoformat()
+        }).status_code, 400)
+        client.force_authenticate(self.first)
+        self.assertEqual(client.get('/api/appointments/stats/').status_code, 403)
+
+
+class PatientRosterTests(BookingTestCase):
+    """Doctors page through their patients, most recently seen first, in a fixed number of queries."""
+
+    statuses = ['scheduled', 'completed']
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        today = timezone.localdate()
+        cls.patients = []
+        for i in range(25):
+            patient = CustomUser.objects.create(email=f'patient{i}@heydoc.test', first_name='Pat', last_name=str(i))
+            cls.patients.append(patient)
+            # Patient i was last seen i + 1 days ago
+            cls.create_appointment(today - timedelta(days=i + 1), time(9), 'completed', patient=patient)
+        # The most recent patient has an earlier visit and an upcoming appointment
+        cls.create_appointment(today - timedelta(days=40), time(9), 'completed', patient=cls.patients[0])
+        cls.create_appointment(today + timedelta(days=5), time(9), patient=cls.patients[0])
+
+    def setUp(self):
+        super().setUp()
+        # Statuses cached by earlier tests were rolled back with them
+        appointment_statuses.invalidate()
+        appointment_statuses.ids(['completed'])
+        self.client = self.client_for(self.doctor.user)
+
+    def test_pages(self):
+        # The doctor, the count, the page of groups, the page's patients
+        with self.assertNumQueries(4):
+            response = self.client.get('/api/appointments/roster/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 25)
+        rows = response.data['results']
+        self.assertEqual([row['patient']['id'] for row in rows], [patient.pk for patient in self.patients[:20]])
+        today = timezone.localdate()
+        self.assertEqual(rows[0]['visits'], 2)
+        self.assertEqual(rows[0]['last_visit'], (today - timedelta(days=1)).isoformat())
+        self.assertEqual(rows[0]['next_appointment'], (today + timedelta(days=5)).isoformat())
+        self.assertEqual(rows[0]['last_activity'], (today + timedelta(days=5)).isoformat())
+        self.assertIsNone(rows[1]['next_appointment'])
+
+        response = self.client.get('/api/appointments/roster/', {'page': 2})
+        self.assertEqual([row['patient']['id'] for row in response.data['results']],
+                         [patient.pk for patient in self.patients[20:]])
+
+    def test_doctors_only(self):
+        self.client.force_authenticate(self.patients[0])
+        self.assertEqual(self.client.get('/api/appointments/roster/').status_code, 403)
+        self.client.force_authenticate(None)
+        self.assertEqual(self.client.get('/api/appointments/roster/').status_code, 401)
+
+
+class QueryPlanTests(TestCase):
+    """EXPLAIN the appointment hot paths on a seeded table: none may fall back to a sequential scan."""
+
+    doctors = 60
+    patients = 600
+    days_back = 120
+    days_ahead = 30
+    times = [time(9, 0), time(10, 0), time(11, 0), time(14, 0)]
+
+    @classmethod
+    def setUpTestData(cls):
+        statuses = {
+            name: AppointmentStatus.objects.create(name=name)
+            for name in ['scheduled', 'confirmed', 'completed', 'cancelled', 'no_show']
+        }
+        users = CustomUser.objects.bulk_create(
+            [CustomUser(email=f'doctor{i}@heydoc.test', first_name='Doc', last_name=str(i), is_doctor=True, is_patient=False)
+             for i in range(cls.doctors)] +
+            [CustomUser(email=f'patient{i}@heydoc.test', first_name='Pat', last_name=str(i))
+             for i in range(cls.patients)]
+        )
+        doctor_users, cls.patient_users = users[:cls.doctors], users[cls.doctors:]
+        cls.doctor_profiles = DoctorProfile.objects.bulk_create([
+            DoctorProfile(user=user, license_number=f'LIC-{user.pk}', consultation_fee=100, is_verified=True)
+            for user in doctor_users
+        ])
+        clinics = Clinic.objects.bulk_create([
+            Clinic(doctor=doctor, name=f'Clinic {doctor.pk}', address='1 Street', is_primary=True)
+            for doctor in cls.doctor_profiles
+        ])
+        Schedule.objects.bulk_create([
+            Schedule(doctor=clinic.doctor, clinic=clinic, day_of_week=day, start_time=time(9), end_time=time(17), slot_duration=60)
+            for clinic in clinics for day in range(7)
+        ])
+
+        today = timezone.localdate()
+        appointments = []
+        for offset in range(-cls.days_back, cls.days_ahead):
+            day = today + timedelta(days=offset)
+            for d, (doctor, clinic) in enumerate(zip(cls.doctor_profiles, clinics)):
+                for t, slot_time in enumerate(cls.times):
+                    n = len(appointments)
+                    if offset < 0:
+                        # History is mostly completed and paid
+                        status = statuses['cancelled'] if n % 10 == 0 else statuses['completed']
+                        payment_status = 'pending' if n % 50 == 0 else 'paid'
+                    else:
+                        status = statuses['cancelled'] if n % 10 == 0 else statuses['scheduled']
+                        payment_status = 'pending' if n % 3 else 'paid'
+                    appointments.append(Appointment(
+                        patient=cls.patient_users[(offset * 7 + d * 4 + t) % cls.patients],
+                        doctor=doctor,
+                        clinic=clinic,
+                        appointment_date=day,
+                        appointment_time=slot_time,
+                        duration=60,
+                        status=status,
+                        holds_slot=status.is_active_status,
+                        payment_status=payment_status,
+                        consultation_fee=100,
+                        booking_id=f'PLAN{n:07d}'
+                    ))
+        Appointment.objects.bulk_create(appointments, batch_size=5000)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE appointments_appointment')
+
+    def setUp(self):
+        self.doctor = self.doctor_profiles[7]
+        self.patient = self.patient_users[42]
+
+    def assertNoSeqScan(self, run):
+        """Run ``run`` and EXPLAIN every SELECT it issued against the appointment table."""
+        with CaptureQueriesContext(connection) as queries:
+            run()
+        selects = [
+            query['sql'] for query in queries.captured_queries
+            if query['sql'].startswith('SELECT') and '"appointments_appointment"' in query['sql']
+        ]
+        self.assertTrue(selects, 'No appointment query was issued')
+        for sql in selects:
+            with connection.cursor() as cursor:
+                cursor.execute(f'EXPLAIN {sql}')
+                plan = '\n'.join(row[0] for row in cursor.fetchall())
+            self.assertNotIn('Seq Scan on appointments_appointment', plan, f'{sql}\n\n{plan}')
+
+    def test_slot_engine_week(self):
+        today = timezone.localdate()
+        self.assertNoSeqScan(lambda: SlotEngine([self.doctor.pk], today, today + timedelta(days=6)))
+
+    def test_booking_conflict_checks(self):
+        serializer = CreateAppointmentSerializer(data={
+            'doctor': self.doctor.pk,
+            'appointment_date': (timezone.localdate() + timedelta(days=3)).isoformat(),
+            'appointment_time': '12:00',
+            'consultation_fee': '100.00',
+        }, context={'request': SimpleNamespace(user=self.patient)})
+        self.assertTrue(serializer.is_valid())
+        self.assertNoSeqScan(lambda: serializer.check_conflicts(self.patient, serializer.validated_data))
+
+    def test_overlap_probe(self):
+        slot = slot_bounds(timezone.localdate() + timedelta(days=2), time(10, 30), 60)
+        self.assertNoSeqScan(lambda: Appointment.objects.overlapping(self.doctor.pk, slot).exists())
+
+    def test_patient_appointment_list(self):
+        self.assertNoSeqScan(lambda: list(Appointment.objects.filter(patient=self.patient)[:20]))
+
+    def test_doctor_appointment_list(self):
+        self.assertNoSeqScan(lambda: list(Appointment.objects.filter(doctor=self.doctor)[:20]))
+
+    def test_patient_upcoming(self):
+        self.assertNoSeqScan(lambda: list(Appointment.objects.upcoming().filter(patient=self.patient)))
+
+    def test_overdue_payments(self):
+        self.assertNoSeqScan(lambda: list(
+            Appointment.objects.pending_payment().filter(appointment_date__lt=timezone.localdate())
+        ))
+
+    def test_no_show_scan(self):
+        self.assertNoSeqScan(lambda: call_command('mark_no_shows', dry_run=True, stdout=StringIO()))
+
+    def test_reminder_scan(self):
+        self.assertNoSeqScan(lambda: send_due_reminders(batch_size=500))
+
+    def test_doctor_patient_roster(self):
+        self.assertNoSeqScan(lambda: list(Appointment.objects.roster(self.doctor.pk)[:20]))
+
+    def test_calendar_feed_etag(self):
+        for user in (self.doctor.user, self.patient):
+            appointments = feed_appointments(user)
+            self.assertNoSeqScan(lambda: feed_etag(user, appointments))
+
+    def test_doctor_list_cursor_pages(self):
+        client = APIClient()
+        client.force_authenticate(self.doctor.user)
+        seen = []
+
+        def walk():
+            url = '/api/appointments/?pagination=cursor'
+            for _ in range(5):
+                response = client.get(url)
+                self.assertEqual(response.status_code, 200)
+                seen.extend(row['id'] for row in response.data['results'])
+                url = response.data['next']
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertNoSeqScan(walk)
+        self.assertEqual(len(seen), 100)
+        self.assertEqual(len(set(seen)), 100)
+        self.assertEqual(seen, list(
+            Appointment.objects.filter(doctor=self.doctor).order_by('-starts_at', '-id').values_list('id', flat=True)[:100]
+        ))
+        # Keyset pages never count or skip rows
+        self.assertFalse([query for query in queries if 'COUNT(' in query['sql'] or 'OFFSET' in query['sql']])
@@ -0,0 +1,118 @@
+from collections import defaultdict
+from django.db import transaction
+from django.db.models import QuerySet
+from django.utils import timezone
+from .agenda import invalidate_agenda
+from .availability import schedule_refresh
+from .registry import appointment_statuses
+from .stats import schedule_stats_refresh
+from .waitlist import enqueue_freed_slots
+
+# Status changes allowed by the transition engine (from -> to)
+ALLOWED_TRANSITIONS = {
+    'scheduled': {'confirmed', 'cancelled', 'completed', 'no_show'},
+    'confirmed': {'cancelled', 'completed', 'no_show'},
+    'no_show': {'completed'},
+}
+
+# Reason recorded in the history when the caller gives none
+DEFAULT_REASONS = {
+    'confirmed': 'Appointment confirmed',
+    'cancelled': 'Cancelled',
+    'completed': 'Appointment completed',
+    'no_show': 'Marked as no-show',
+}
+
+
+class TransitionError(Exception):
+    """Raised when appointments cannot be moved to the requested status."""
+
+
+def allowed_source_ids(to_status):
+    """Return the ids of the statuses that may move to ``to_status``."""
+    return appointment_statuses.ids(
+        [name for name, targets in ALLOWED_TRANSITIONS.items() if to_status in targets]
+    )
+
+
+def apply_transition(appointments, to_status, changed_by=None, reason=None, strict=False,
+                     refresh_availability=True, offer_freed_slots=True, **fields):
+    """
+    Move appointments to ``to_status`` with one UPDATE and one history insert.
+
+    ``appointments`` is a queryset or an iterable of ids. Appointments whose
+    current status cannot move to ``to_status`` are skipped, or make the whole
+    call fail with TransitionError when ``strict`` is set. Extra keyword
+    arguments are written to the updated rows as well. Callers that refresh
+    the affected days themselves pass ``refresh_availability=False``; slots
+    freed by the transition are queued for the waitlist unless
+    ``offer_freed_slots`` is False.
+
+    Returns the transitioned rows as (id, booking_id, patient_id, doctor_id,
+    appointment_date, appointment_time, status_id) tuples, where status_id is
+    the status before the transition.
+    """
+    from .models import Appointment, AppointmentHistory, AppointmentStatus
+
+    try:
+        target = appointment_statuses.get(to_status)
+    except AppointmentStatus.DoesNotExist:
+        raise TransitionError(f"Unknown appointment status '{to_status}'")
+    if not isinstance(appointments, QuerySet):
+        appointments = Appointment.objects.filter(pk__in=list(appointments))
+
+    with transaction.atomic():
+        # Lock in pk order so concurrent batches cannot deadlock
+        rows = list(
+            appointments.select_related(None).select_for_update(no_key=True).order_by('pk').values_list(
+                'id', 'booking_id', 'patient_id', 'doctor_id',
+                'appointment_date', 'appointment_time', 'status_id', named=True
+            )
+        )
+        source_ids = set(allowed_source_ids(to_status))
+        movable = [row for row in rows if row.status_id in source_ids]
+        if strict and len(movable) != len(rows):
+            rejected = [row.booking_id for row in rows if row.status_id not in source_ids]
+            raise TransitionError(
+                f"Appointment(s) {', '.join(rejected)} cannot be changed to '{to_status}' from their current status"
+            )
+        if not movable:
+            return []
+
+        # Queryset updates skip save(), so keep holds_slot and updated_at in step here
+        Appointment.objects.filter(pk__in=[row.id for row in movable]).update(
+            status=target,
+            holds_slot=target.is_active_status,
+            updated_at=timezone.now(),
+            **fields
+        )
+        AppointmentHistory.objects.bulk_create([
+            AppointmentHistory(
+                appointment_id=row.id,
+                old_status_id=row.status_id,
+                new_status=target,
+                changed_by=changed_by,
+                change_reason=reason or DEFAULT_REASONS.get(to_status, '')
+            )
+            for row in movable
+        ], batch_size=1000)
+
+        # ...and bypass the model signals, so refresh the affected rollups, agendas and days here
+        stats_days = defaultdict(set)
+        for row in movable:
+            stats_days[row.doctor_id].add(row.appointment_date)
+        for doctor_id, dates in stats_days.items():
+            schedule_stats_refresh(doctor_id, dates)
+            invalidate_agenda(doctor_id, dates)
+        changed = [
+            row for row in movable
+            if appointment_statuses.get_by_id(row.status_id).is_active_status != target.is_active_status
+        ]
+        days = defaultdict(set)
+        for row in changed if refresh_availability else ():
+            days[row.doctor_id].add(row.appointment_date)
+        for doctor_id, dates in days.items():
+            schedule_refresh(doctor_id, dates)
+        if offer_freed_slots and not target.is_active_status:
+            enqueue_freed_slots(changed)
+    return movable
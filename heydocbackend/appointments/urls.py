@@ -5,6 +5,17 @@ urlpatterns = [
     path('', views.AppointmentListCreateView.as_view(), name='appointment-list-create'),
     path('<int:pk>/', views.AppointmentDetailView.as_view(), name='appointment-detail'),
     path('<int:appointment_id>/cancel/', views.cancel_appointment, name='cancel-appointment'),
+    path('<int:appointment_id>/reschedule/', views.reschedule_appointment, name='reschedule-appointment'),
+    path('bulk-status/', views.bulk_update_status, name='bulk-update-status'),
+    path('export/', views.export_appointments, name='export-appointments'),
+    path('stats/', views.doctor_stats, name='doctor-stats'),
+    path('agenda/', views.doctor_agenda, name='doctor-agenda'),
+    path('roster/', views.PatientRosterView.as_view(), name='patient-roster'),
+    path('calendar/', views.calendar_feed_url, name='calendar-feed-url'),
+    path('calendar/<str:token>.ics', views.calendar_feed, name='calendar-feed'),
     path('available-slots/', views.available_slots, name='available-slots'),
     path('check-date-availability/', views.check_date_availability, name='check-date-availability'),
+    path('holds/', views.slot_hold, name='slot-hold'),
+    path('waitlist/', views.WaitlistListCreateView.as_view(), name='waitlist-list-create'),
+    path('waitlist/<int:pk>/', views.WaitlistEntryDetailView.as_view(), name='waitlist-detail'),
 ]
\ No newline at end of file
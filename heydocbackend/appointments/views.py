@@ -1,32 +1,66 @@
 from rest_framework import generics, permissions, status
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, permission_classes, renderer_classes
+from rest_framework.exceptions import PermissionDenied
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
 from django.shortcuts import get_object_or_404
-from django.db import models
-from .models import Appointment, AppointmentStatus
+from django.http import HttpResponseNotFound, StreamingHttpResponse
+from django.urls import reverse
+from django.utils.cache import get_conditional_response
+from django.views.decorators.http import require_safe
+from accounts.models import CustomUser
+from .models import Appointment, AppointmentStatus, WaitlistEntry
 from .serializers import (
-    AppointmentSerializer, 
+    AppointmentSerializer,
+    AppointmentListSerializer,
+    PatientRosterSerializer,
     CreateAppointmentSerializer,
+    RescheduleAppointmentSerializer,
+    BulkStatusUpdateSerializer,
+    WaitlistEntrySerializer,
+    AppointmentExportSerializer,
+    DoctorStatsQuerySerializer,
+    AgendaQuerySerializer,
     AppointmentStatusSerializer
 )
 from .filters import AppointmentFilter
+from .slots import SlotEngine
+from .availability import availability_summary
+from .holds import held_times, place_hold, release_hold
+from .transitions import apply_transition, TransitionError
+from .exports import CONTENT_TYPES, CSVRenderer, NDJSONRenderer, export_rows, render_rows
+from .stats import stats_summary
+from .agenda import get_agenda
+from .waitlist import withdraw_entry
+from .calendar import feed_appointments, feed_etag, feed_token, render_feed, user_for_token
+from utils.pagination import OptionalCursorPagination
+from redis.exceptions import RedisError
+
+class AppointmentPagination(OptionalCursorPagination):
+    ordering = ('-starts_at', '-id')
 
 class AppointmentListCreateView(generics.ListCreateAPIView):
     permission_classes = [permissions.IsAuthenticated]
     filter_backends = [DjangoFilterBackend]
     filterset_class = AppointmentFilter
+    pagination_class = AppointmentPagination
 
     def get_queryset(self):
         user = self.request.user
         if user.is_doctor:
-            return Appointment.objects.filter(doctor__user=user)
-        return Appointment.objects.filter(patient=user)
+            appointments = Appointment.objects.filter(doctor__user=user)
+        else:
+            appointments = Appointment.objects.filter(patient=user)
+        # Everything AppointmentListSerializer reads, in one join and one prefetch per page
+        return appointments.select_related('patient', 'doctor__user', 'clinic').prefetch_related(
+            'doctor__specializations'
+        )
 
     def get_serializer_class(self):
         if self.request.method == 'POST':
             return CreateAppointmentSerializer
-        return AppointmentSerializer
+        return AppointmentListSerializer
 
 class AppointmentDetailView(generics.RetrieveUpdateAPIView):
     serializer_class = AppointmentSerializer
@@ -38,35 +72,238 @@ class AppointmentDetailView(generics.RetrieveUpdateAPIView):
             return Appointment.objects.filter(doctor__user=user)
         return Appointment.objects.filter(patient=user)
 
+class PatientRosterView(generics.ListAPIView):
+    """The doctor's patients with visit count, last visit and next appointment."""
+    serializer_class = PatientRosterSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        from doctors.models import DoctorProfile
+        doctor = DoctorProfile.objects.only('id').filter(user=self.request.user).first()
+        if doctor is None:
+            raise PermissionDenied('Only doctors have a patient roster')
+        return Appointment.objects.roster(doctor.id)
+
+    def list(self, request, *args, **kwargs):
+        page = self.paginate_queryset(self.get_queryset())
+        # The grouped rows only carry ids; load the page's patients in one query
+        patients = CustomUser.objects.only('id', 'email', 'first_name', 'last_name', 'phone').in_bulk(
+            [row['patient_id'] for row in page]
+        )
+        for row in page:
+            row['patient'] = patients[row['patient_id']]
+        return self.get_paginated_response(self.get_serializer(page, many=True).data)
+
+class WaitlistListCreateView(generics.ListCreateAPIView):
+    serializer_class = WaitlistEntrySerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        return WaitlistEntry.objects.filter(patient=self.request.user).select_related('doctor__user')
+
+class WaitlistEntryDetailView(generics.RetrieveDestroyAPIView):
+    serializer_class = WaitlistEntrySerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        return WaitlistEntry.objects.filter(patient=self.request.user).select_related('doctor__user')
+
+    def perform_destroy(self, instance):
+        # Kept as cancelled; an open offer passes to the next patient
+        withdraw_entry(instance)
+
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
 def cancel_appointment(request, appointment_id):
-    appointment = get_object_or_404(Appointment, id=appointment_id)
+    appointment = get_object_or_404(Appointment.objects.select_related('doctor'), id=appointment_id)
     
     # Verify user has permission to cancel (either patient or doctor)
-    if appointment.patient != request.user and appointment.doctor.user != request.user:
+    if appointment.patient_id != request.user.id and appointment.doctor.user_id != request.user.id:
         return Response({'error': 'Permission denied'}, status=status.HTTP_403_FORBIDDEN)
     
     try:
-        cancelled_status = AppointmentStatus.objects.get(name='cancelled')
-        appointment.status = cancelled_status
-        appointment.save()
-        
-        return Response({
-            'message': 'Appointment cancelled successfully',
-            'booking_id': appointment.booking_id
-        })
-    except AppointmentStatus.DoesNotExist:
-        return Response(
-            {'error': 'Cancel status not found'}, 
-            status=status.HTTP_400_BAD_REQUEST
+        apply_transition(
+            [appointment.id], 'cancelled',
+            changed_by=request.user,
+            reason=request.data.get('reason'),
+            strict=True
         )
+    except TransitionError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    return Response({
+        'message': 'Appointment cancelled successfully',
+        'booking_id': appointment.booking_id
+    })
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def reschedule_appointment(request, appointment_id):
+    """Move an appointment to a new slot in one transaction."""
+    appointment = get_object_or_404(
+        Appointment.objects.select_related('doctor', 'clinic', 'patient'), id=appointment_id
+    )
+    
+    if appointment.patient_id != request.user.id and appointment.doctor.user_id != request.user.id:
+        return Response({'error': 'Permission denied'}, status=status.HTTP_403_FORBIDDEN)
+    
+    serializer = RescheduleAppointmentSerializer(appointment, data=request.data, context={'request': request})
+    serializer.is_valid(raise_exception=True)
+    appointment = serializer.save()
+    
+    return Response({
+        'message': 'Appointment rescheduled successfully',
+        'booking_id': appointment.booking_id,
+        'appointment_date': appointment.appointment_date.isoformat(),
+        'appointment_time': appointment.appointment_time.strftime('%H:%M'),
+        'clinic': appointment.clinic_id,
+        'duration': appointment.duration
+    })
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def bulk_update_status(request):
+    """Move several of the doctor's appointments to a new status at once."""
+    if not request.user.is_doctor:
+        return Response({'error': 'Only doctors can update appointment statuses'}, status=status.HTTP_403_FORBIDDEN)
+    
+    serializer = BulkStatusUpdateSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    appointment_ids = set(serializer.validated_data['appointment_ids'])
+    new_status = serializer.validated_data['status']
+    
+    appointments = Appointment.objects.filter(id__in=appointment_ids, doctor__user=request.user)
+    try:
+        moved = apply_transition(
+            appointments, new_status,
+            changed_by=request.user,
+            reason=serializer.validated_data.get('reason'),
+            strict=serializer.validated_data['strict']
+        )
+    except TransitionError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    moved_ids = {row.id for row in moved}
+    return Response({
+        'status': new_status,
+        'updated': sorted(moved_ids),
+        'skipped': sorted(appointment_ids - moved_ids),
+        'updated_count': len(moved_ids)
+    })
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAdminUser])
+@renderer_classes([JSONRenderer, CSVRenderer, NDJSONRenderer])
+def export_appointments(request):
+    """Stream appointments as CSV or NDJSON for reconciliation, filtered by date range and doctor."""
+    from django.utils import timezone
+    
+    params = request.query_params.copy()
+    # Without file_format, an Accept header naming an export type picks it
+    if 'file_format' not in params and request.accepted_renderer.format in CONTENT_TYPES:
+        params['file_format'] = request.accepted_renderer.format
+    serializer = AppointmentExportSerializer(data=params)
+    serializer.is_valid(raise_exception=True)
+    file_format = serializer.validated_data.pop('file_format')
+    
+    # Rows are read and written a chunk at a time, never held in memory together
+    response = StreamingHttpResponse(
+        render_rows(export_rows(**serializer.validated_data), file_format),
+        content_type=CONTENT_TYPES[file_format]
+    )
+    response['Content-Disposition'] = (
+        f'attachment; filename="appointments-{timezone.localdate():%Y%m%d}.{file_format}"'
+    )
+    return response
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def doctor_stats(request):
+    """Dashboard totals and per-day figures of the doctor's appointments, read from the daily rollup."""
+    from doctors.models import DoctorProfile
+    
+    doctor = DoctorProfile.objects.only('id').filter(user=request.user).first()
+    if doctor is None:
+        return Response({'error': 'Only doctors have appointment stats'}, status=status.HTTP_403_FORBIDDEN)
+    
+    serializer = DoctorStatsQuerySerializer(data=request.query_params)
+    serializer.is_valid(raise_exception=True)
+    start_date, end_date = serializer.validated_data['start_date'], serializer.validated_data['end_date']
+    totals, days = stats_summary(doctor.id, start_date, end_date)
+    return Response({
+        'start_date': start_date,
+        'end_date': end_date,
+        'totals': totals,
+        'days': days,
+    })
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def doctor_agenda(request):
+    """The doctor's day in time order: schedule blocks, absences and appointments with patient summaries."""
+    from django.utils import timezone
+    from doctors.models import DoctorProfile
+    
+    doctor = DoctorProfile.objects.only('id').filter(user=request.user).first()
+    if doctor is None:
+        return Response({'error': 'Only doctors have an agenda'}, status=status.HTTP_403_FORBIDDEN)
+    
+    serializer = AgendaQuerySerializer(data=request.query_params)
+    serializer.is_valid(raise_exception=True)
+    day = serializer.validated_data.get('date') or timezone.localdate()
+    clinic_id = serializer.validated_data.get('clinic_id')
+    
+    # Cached per (doctor, day); a clinic view is a filter of the whole day
+    agenda = get_agenda(doctor.id, day)
+    if clinic_id is not None:
+        agenda = {
+            **agenda,
+            'clinic_id': clinic_id,
+            'blocks': [block for block in agenda['blocks'] if block['clinic_id'] == clinic_id],
+            'timeline': [
+                entry for entry in agenda['timeline']
+                if entry['type'] != 'appointment' or entry['clinic_id'] == clinic_id
+            ],
+        }
+    return Response(agenda)
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def calendar_feed_url(request):
+    """Return the private iCalendar feed URL of the current user's appointments."""
+    url = reverse('calendar-feed', kwargs={'token': feed_token(request.user)})
+    return Response({'url': request.build_absolute_uri(url)})
+
+@require_safe
+def calendar_feed(request, token):
+    """
+    Stream a doctor's or patient's appointments as an .ics feed, authorized by the URL token.
+
+    A plain Django view: calendar apps send ``Accept: text/calendar``, which
+    DRF content negotiation would refuse.
+    """
+    user = user_for_token(token)
+    if user is None:
+        return HttpResponseNotFound()
+    
+    appointments = feed_appointments(user)
+    etag = f'"{feed_etag(user, appointments)}"'
+    # Calendar apps poll: an unchanged feed is answered from the ETag alone
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is not None:
+        return not_modified
+    
+    response = StreamingHttpResponse(render_feed(user, appointments), content_type='text/calendar; charset=utf-8')
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    response['Content-Disposition'] = 'inline; filename="heydoc.ics"'
+    return response
 
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def available_slots(request):
     """Get available time slots for a doctor on a specific date."""
-    from datetime import datetime, time, timedelta
+    from datetime import datetime
     from doctors.models import DoctorProfile
     
     doctor_id = request.query_params.get('doctor_id')
@@ -79,7 +316,7 @@ def available_slots(request):
         )
     
     try:
-        doctor = DoctorProfile.objects.get(id=doctor_id)
+        doctor = DoctorProfile.objects.only('id').get(id=doctor_id)
         appointment_date = datetime.strptime(date_str, '%Y-%m-%d').date()
     except (DoctorProfile.DoesNotExist, ValueError):
         return Response(
@@ -97,48 +334,32 @@ def available_slots(request):
             'message': 'Cannot book appointments for past dates'
         })
     
-    # Standard working hours (can be customized per doctor)
-    standard_slots = [
-        '09:00', '09:30', '10:00', '10:30', '11:00', '11:30',
-        '14:00', '14:30', '15:00', '15:30', '16:00', '16:30',
-        '17:00', '17:30'
+    # Schedules, unavailabilities and bookings are loaded in three queries
+    engine = SlotEngine([doctor.id], appointment_date)
+    all_slots = engine.slots(doctor.id, appointment_date)
+    # Slots held by other patients during checkout are not offered
+    held = held_times(doctor.id, [appointment_date], exclude_user_id=request.user.id)[appointment_date]
+    free_slots = [
+        slot for slot in engine.free_slots(doctor.id, appointment_date)
+        if slot.time.strftime('%H:%M') not in held
     ]
-    
-    # Get existing appointments for this doctor on this date (optimized query)
-    try:
-        active_status_names = list(AppointmentStatus.objects.filter(
-            name__in=['scheduled', 'confirmed']
-        ).values_list('name', flat=True))
-    except Exception:
-        active_status_names = ['scheduled', 'confirmed']
-        
-    booked_slots = Appointment.objects.filter(
-        doctor=doctor,
-        appointment_date=appointment_date,
-        status__name__in=active_status_names
-    ).select_related('status').values_list('appointment_time', flat=True)
-    
-    # Convert booked times to strings for comparison
-    booked_times = [time.strftime('%H:%M') for time in booked_slots]
-    
-    # Filter out booked slots
-    available_slots = [slot for slot in standard_slots if slot not in booked_times]
-    
-    # If it's today, filter out past times
-    if appointment_date == timezone.now().date():
-        current_time = timezone.now().time()
-        available_slots = [
-            slot for slot in available_slots 
-            if time.fromisoformat(slot + ':00') > current_time
-        ]
+    booked_times = [booked.strftime('%H:%M') for booked in engine.booked_times(doctor.id, appointment_date)]
     
     return Response({
         'doctor_id': doctor_id,
         'date': date_str,
-        'available_slots': available_slots,
+        'available_slots': [slot.time.strftime('%H:%M') for slot in free_slots],
+        'slots': [
+            {
+                'time': slot.time.strftime('%H:%M'),
+                'duration': slot.duration,
+                'clinic_id': slot.clinic_id
+            }
+            for slot in free_slots
+        ],
         'booked_slots': booked_times,
-        'total_slots': len(standard_slots),
-        'available_count': len(available_slots)
+        'total_slots': len(all_slots),
+        'available_count': len(free_slots)
     })
 
 @api_view(['GET'])
@@ -160,7 +381,7 @@ def check_date_availability(request):
         )
     
     try:
-        doctor = DoctorProfile.objects.select_related('user').get(id=doctor_id)
+        doctor = DoctorProfile.objects.only('id').get(id=doctor_id)
     except DoctorProfile.DoesNotExist:
         return Response(
             {'error': 'Invalid doctor_id'}, 
@@ -182,31 +403,12 @@ def check_date_availability(request):
             status=status.HTTP_400_BAD_REQUEST
         )
     
-    # Standard working hours (14 slots total)
-    total_standard_slots = 14
     today = timezone.now().date()
     
-    # Get active statuses once
-    try:
-        active_status_names = list(AppointmentStatus.objects.filter(
-            name__in=['scheduled', 'confirmed']
-        ).values_list('name', flat=True))
-    except Exception:
-        active_status_names = ['scheduled', 'confirmed']
-    
-    # Batch query for all dates at once - much more efficient
-    booked_counts = {}
-    if dates:
-        appointments_by_date = Appointment.objects.filter(
-            doctor=doctor,
-            appointment_date__in=dates,
-            status__name__in=active_status_names
-        ).values('appointment_date').annotate(
-            count=models.Count('id')
-        )
-        
-        for item in appointments_by_date:
-            booked_counts[item['appointment_date']] = item['count']
+    # Future dates are single indexed lookups on the materialized table;
+    # only today and not-yet-materialized dates are computed live
+    summary = availability_summary(doctor.id, dates)
+    held = held_times(doctor.id, [date for date in dates if date >= today], exclude_user_id=request.user.id)
     
     # Prepare results
     results = []
@@ -217,20 +419,87 @@ def check_date_availability(request):
                 'reason': 'Past date',
                 'available_count': 0,
                 'booked_count': 0,
-                'total_slots': total_standard_slots
+                'total_slots': 0
             })
         else:
-            booked_count = booked_counts.get(date, 0)
-            available_count = total_standard_slots - booked_count
+            total_slots, booked_count, available_count = summary.get(date, (0, 0, 0))
+            available_count = max(available_count - len(held.get(date, ())), 0)
             results.append({
                 'available': available_count > 0,
                 'available_count': available_count,
                 'booked_count': booked_count,
-                'total_slots': total_standard_slots
+                'total_slots': total_slots
             })
     
     # Return single result for backward compatibility or batch results
     if len(results) == 1:
         return Response(results[0])
     else:
-        return Response(results)
\ No newline at end of file
+        return Response(results)
+
+@api_view(['POST', 'DELETE'])
+@permission_classes([permissions.IsAuthenticated])
+def slot_hold(request):
+    """
+    Hold a slot for a few minutes during checkout, or release the hold.
+
+    Only verified doctors' slots can be held, and a patient holds one slot per
+    doctor: holding another slot of the same doctor releases the previous one.
+    """
+    from datetime import datetime, timezone as dt_timezone
+    from django.conf import settings
+    from doctors.models import DoctorProfile
+    
+    params = request.data if request.method == 'POST' else request.query_params
+    try:
+        doctor_id = int(params.get('doctor_id'))
+        appointment_date = datetime.strptime(params.get('date'), '%Y-%m-%d').date()
+        appointment_time = datetime.strptime(params.get('time'), '%H:%M').time()
+    except (TypeError, ValueError):
+        return Response(
+            {'error': 'doctor_id, date (YYYY-MM-DD) and time (HH:MM) are required'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    if request.method == 'DELETE':
+        released = release_hold(doctor_id, appointment_date, appointment_time, request.user.id)
+        if not released:
+            return Response({'error': 'Hold not found'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+    
+    if not DoctorProfile.objects.filter(id=doctor_id, is_verified=True).exists():
+        return Response({'error': 'Invalid doctor_id'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    # Only free slots of the doctor's schedule can be held
+    engine = SlotEngine([doctor_id], appointment_date)
+    slot = next(
+        (slot for slot in engine.free_slots(doctor_id, appointment_date) if slot.time == appointment_time),
+        None
+    )
+    if slot is None:
+        return Response(
+            {'error': 'This time slot is not available'},
+            status=status.HTTP_409_CONFLICT
+        )
+    
+    try:
+        expires_at = place_hold(doctor_id, appointment_date, appointment_time, request.user.id, slot.clinic_id)
+    except RedisError:
+        return Response(
+            {'error': 'Slot holds are temporarily unavailable'},
+            status=status.HTTP_503_SERVICE_UNAVAILABLE
+        )
+    if expires_at is None:
+        return Response(
+            {'error': 'This time slot is being held by another patient'},
+            status=status.HTTP_409_CONFLICT
+        )
+    
+    return Response({
+        'doctor_id': doctor_id,
+        'date': appointment_date.isoformat(),
+        'time': appointment_time.strftime('%H:%M'),
+        'clinic_id': slot.clinic_id,
+        'expires_at': datetime.fromtimestamp(expires_at, tz=dt_timezone.utc).isoformat(),
+        'hold_seconds': settings.SLOT_HOLD_SECONDS
+    }, status=status.HTTP_201_CREATED)
\ No newline at end of file
@@ -0,0 +1,244 @@
+import json
+import logging
+from datetime import date, time, timedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+from django_redis import get_redis_connection
+from redis.exceptions import RedisError
+from .expressions import slot_bounds
+from .holds import get_hold, place_hold, release_hold
+from .slots import SlotEngine
+
+logger = logging.getLogger(__name__)
+
+# Notification type of slot offers to waitlisted patients
+OFFER_NOTIFICATION_TYPE = 'waitlist_offer'
+
+# Freed slots wait in a Redis list until the process_waitlist worker offers them,
+# so cancelling never pays for the backfill
+
+
+def _queue_key():
+    return cache.make_key('waitlist:freed-slots')
+
+
+def enqueue_freed_slots(rows):
+    """
+    Queue freed slots for backfill once the current transaction commits.
+
+    ``rows`` carry doctor_id, appointment_date and appointment_time; past
+    slots are ignored.
+    """
+    today = timezone.localdate()
+    slots = [
+        json.dumps({
+            'doctor_id': row.doctor_id,
+            'date': row.appointment_date.isoformat(),
+            'time': row.appointment_time.strftime('%H:%M'),
+        })
+        for row in rows
+        if row.appointment_date >= today
+    ]
+    if slots:
+        transaction.on_commit(lambda: _push(slots), robust=True)
+
+
+def _push(slots):
+    try:
+        get_redis_connection('default').rpush(_queue_key(), *slots)
+    except RedisError:
+        # Without the queue, offer inline rather than lose the slots
+        logger.warning('Waitlist queue unavailable, offering freed slots inline', exc_info=True)
+        for slot in slots:
+            _offer_queued(slot)
+
+
+def _offer_queued(payload):
+    slot = json.loads(payload)
+    return offer_slot(
+        slot['doctor_id'], date.fromisoformat(slot['date']), time.fromisoformat(slot['time']),
+        exclude_entry_ids=slot.get('passed', ())
+    )
+
+
+def offer_slot(doctor_id, day, slot_time, now=None, exclude_entry_ids=()):
+    """
+    Offer a freed slot to the earliest waitlisted patient whose range covers it.
+
+    The slot is held for the patient for WAITLIST_OFFER_SECONDS and they are
+    notified. Entries in ``exclude_entry_ids`` already let this slot lapse and
+    are passed over. Returns the offered WaitlistEntry, or None when the slot
+    is no longer free or nobody is waiting.
+    """
+    from notifications.models import Notification
+    from notifications.registry import notification_types
+    from .models import WaitlistEntry
+
+    now = now or timezone.now()
+    if slot_bounds(day, slot_time, 0).lower <= now:
+        return None
+    engine = SlotEngine([doctor_id], day)
+    slot = next((slot for slot in engine.free_slots(doctor_id, day) if slot.time == slot_time), None)
+    if slot is None:
+        return None
+
+    with transaction.atomic():
+        # SKIP LOCKED lets parallel workers offer different slots to different patients
+        entry = WaitlistEntry.objects.select_for_update(skip_locked=True).filter(
+            doctor_id=doctor_id,
+            status='waiting',
+            start_date__lte=day,
+            end_date__gte=day
+        ).exclude(pk__in=exclude_entry_ids).order_by('created_at').first()
+        if entry is None:
+            return None
+
+        try:
+            held = place_hold(
+                doctor_id, day, slot_time, entry.patient_id, slot.clinic_id, ttl=settings.WAITLIST_OFFER_SECONDS,
+                waitlist_entry_id=entry.id
+            )
+        except RedisError:
+            logger.warning('Could not hold the offered slot', exc_info=True)
+            held = True
+        if held is None:
+            # Someone else is already checking out this slot
+            return None
+
+        entry.status = 'offered'
+        entry.offered_date = day
+        entry.offered_time = slot_time
+        entry.offered_at = now
+        entry.save(update_fields=['status', 'offered_date', 'offered_time', 'offered_at'])
+        Notification.objects.create(
+            user_id=entry.patient_id,
+            type=notification_types.get_or_create(
+                OFFER_NOTIFICATION_TYPE, description='A slot opened up for a waitlisted patient'
+            ),
+            title='A slot opened up',
+            message=(
+                f"A slot on {day:%B %d, %Y} at {slot_time:%H:%M} is now available. "
+                f"It is held for you for {settings.WAITLIST_OFFER_SECONDS // 60} minutes."
+            ),
+            data=json.dumps({
+                'waitlist_entry_id': entry.id,
+                'doctor_id': doctor_id,
+                'clinic_id': slot.clinic_id,
+                'date': day.isoformat(),
+                'time': slot_time.strftime('%H:%M'),
+            })
+        )
+    return entry
+
+
+def fulfil_offer(doctor_id, day, slot_time, patient_id):
+    """
+    Release a patient's hold on a slot they just booked.
+
+    If the hold came from a waitlist offer, the offer is closed as fulfilled.
+    """
+    from .models import WaitlistEntry
+
+    hold = get_hold(doctor_id, day, slot_time)
+    if hold and hold['user_id'] == patient_id and hold.get('waitlist_entry_id'):
+        WaitlistEntry.objects.filter(pk=hold['waitlist_entry_id'], status='offered').update(status='fulfilled')
+    release_hold(doctor_id, day, slot_time, patient_id)
+
+
+def expire_offers(now=None):
+    """
+    Settle offers whose hold has run out.
+
+    Offers that were booked (even after the hold lapsed) are marked fulfilled.
+    The rest go back to waiting, keeping their place in the queue, and their
+    slot is queued again for the next patient in line. Returns the number of
+    slots queued again.
+    """
+    from .models import Appointment, WaitlistEntry
+
+    now = now or timezone.now()
+    with transaction.atomic():
+        expired = list(WaitlistEntry.objects.select_for_update(skip_locked=True).filter(
+            status='offered',
+            offered_at__lte=now - timedelta(seconds=settings.WAITLIST_OFFER_SECONDS)
+        ).annotate(booked=Exists(Appointment.objects.filter(
+            patient_id=OuterRef('patient_id'),
+            doctor_id=OuterRef('doctor_id'),
+            appointment_date=OuterRef('offered_date'),
+            appointment_time=OuterRef('offered_time'),
+            holds_slot=True
+        ))))
+        if not expired:
+            return 0
+        booked = [entry for entry in expired if entry.booked]
+        lapsed = [entry for entry in expired if not entry.booked]
+        WaitlistEntry.objects.filter(pk__in=[entry.pk for entry in booked]).update(status='fulfilled')
+        WaitlistEntry.objects.filter(pk__in=[entry.pk for entry in lapsed]).update(
+            status='waiting', offered_date=None, offered_time=None, offered_at=None
+        )
+        if lapsed:
+            transaction.on_commit(lambda: _requeue(lapsed), robust=True)
+    return len(lapsed)
+
+
+def withdraw_entry(entry):
+    """
+    Take a patient off the waitlist, keeping the entry as cancelled.
+
+    An open offer goes with it: once the cancellation commits, the hold is
+    released and the slot passes to the next patient in line. Entries that
+    are already fulfilled or cancelled are left as they are.
+    """
+    from .models import WaitlistEntry
+
+    with transaction.atomic():
+        # Locked so a worker cannot settle the offer at the same time
+        entry = WaitlistEntry.objects.select_for_update().get(pk=entry.pk)
+        if entry.status not in ('waiting', 'offered'):
+            return entry
+        offered = entry.status == 'offered'
+        entry.status = 'cancelled'
+        entry.save(update_fields=['status'])
+        if offered:
+            transaction.on_commit(lambda: _requeue([entry]), robust=True)
+    return entry
+
+
+def _requeue(entries):
+    for entry in entries:
+        # Normally expired already; make sure the next patient can be offered the slot
+        release_hold(entry.doctor_id, entry.offered_date, entry.offered_time, entry.patient_id)
+    _push([
+        json.dumps({
+            'doctor_id': entry.doctor_id,
+            'date': entry.offered_date.isoformat(),
+            'time': entry.offered_time.strftime('%H:%M'),
+            'passed': [entry.id],
+        })
+        for entry in entries
+    ])
+
+
+def process_queue(block_timeout=None):
+    """
+    Settle expired offers, then offer queued freed slots until the queue is empty.
+
+    With ``block_timeout`` the worker waits that many seconds for new slots
+    before returning. Returns the number of slots offered.
+    """
+    client = get_redis_connection('default')
+    expire_offers()
+    offered = 0
+    while True:
+        if block_timeout:
+            item = client.blpop([_queue_key()], timeout=block_timeout)
+            payload = item[1] if item else None
+        else:
+            payload = client.lpop(_queue_key())
+        if payload is None:
+            return offered
+        if _offer_queued(payload):
+            offered += 1
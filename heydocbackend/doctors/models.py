@@ -131,33 +131,19 @@ class DoctorProfile(models.Model):
          # Frontend dependency methods
     def get_available_slots(self, date):
         """Get available appointment slots for a date."""
-        from datetime import datetime, timedelta
-        
-        slots = []
-        schedules = self.schedules.filter(
-            day_of_week=date.weekday(),
-            is_active=True
-        )
+        from appointments.slots import SlotEngine
         
-        for schedule in schedules:
-            current_time = datetime.combine(date, schedule.start_time)
-            end_time = datetime.combine(date, schedule.end_time)
-            
-            while current_time < end_time:
-                # Check if slot is available
-                if not self.doctor_appointments.filter(
-                    appointment_date=date,
-                    appointment_time=current_time.time(),
-                    status__name__in=['scheduled', 'confirmed']
-                ).exists():
-                    slots.append({
-                        'time': current_time.time(),
-                        'clinic': schedule.clinic
-                    })
-                
-                current_time += timedelta(minutes=schedule.slot_duration)
+        engine = SlotEngine([self.id], date)
+        slots = engine.free_slots(self.id, date)
+        clinics = self.clinics.in_bulk({slot.clinic_id for slot in slots if slot.clinic_id})
         
-        return slots
+        return [
+            {
+                'time': slot.time,
+                'clinic': clinics.get(slot.clinic_id)
+            }
+            for slot in slots
+        ]
 
 class Clinic(models.Model):
     doctor = models.ForeignKey(DoctorProfile, on_delete=models.CASCADE, related_name='clinics')
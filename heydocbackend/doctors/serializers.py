@@ -36,13 +36,32 @@ class DoctorListSerializer(serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
     specializations = SpecializationSerializer(many=True, read_only=True)
     primary_clinic = serializers.SerializerMethodField()
+    next_available = serializers.SerializerMethodField()
     
     class Meta:
         model = DoctorProfile
         fields = ['id', 'user', 'specializations', 'years_of_experience', 
                  'consultation_fee', 'rating', 'total_reviews', 'is_verified', 
-                 'is_available', 'primary_clinic']
+                 'is_available', 'primary_clinic', 'next_available']
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # next_available is opt-in: the view computes it in batch for the page
+        if 'next_available' not in self.context:
+            self.fields.pop('next_available')
     
     def get_primary_clinic(self, obj):
-        clinic = obj.clinics.filter(is_primary=True).first()
-        return ClinicSerializer(clinic).data if clinic else None
\ No newline at end of file
+        # Iterate the (usually prefetched) clinics instead of issuing a query per doctor
+        clinic = next((clinic for clinic in obj.clinics.all() if clinic.is_primary), None)
+        return ClinicSerializer(clinic).data if clinic else None
+    
+    def get_next_available(self, obj):
+        found = self.context['next_available'].get(obj.id)
+        if not found:
+            return None
+        day, slot = found
+        return {
+            'date': day.isoformat(),
+            'time': slot.time.strftime('%H:%M'),
+            'clinic_id': slot.clinic_id
+        }
@@ -1,3 +1,249 @@
+from datetime import time, timedelta
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from accounts.models import CustomUser
+from appointments.models import Appointment, AppointmentStatus
+from notifications.models import Notification
+from notifications.registry import notification_types
+from .models import DoctorProfile, Clinic, Schedule, Specialization, Unavailability
 
-# Create your tests here.
+
+def create_doctor(number, start=time(9), end=time(11), slot_duration=30, **profile):
+    """Create a verified doctor with one clinic open every day from ``start`` to ``end``."""
+    user = CustomUser.objects.create(
+        email=f'doctor{number}@heydoc.test', first_name='Doc', last_name=str(number), is_doctor=True,
+        is_patient=False
+    )
+    doctor = DoctorProfile.objects.create(
+        user=user, license_number=f'LIC-{number:04d}', consultation_fee=100, is_verified=True, **profile
+    )
+    clinic = Clinic.objects.create(doctor=doctor, name=f'Clinic {number}', address='1 Street', is_primary=True)
+    Schedule.objects.bulk_create([
+        Schedule(doctor=doctor, clinic=clinic, day_of_week=day, start_time=start, end_time=end,
+                 slot_duration=slot_duration)
+        for day in range(7)
+    ])
+    return doctor, clinic
+
+
+class DoctorAvailabilityRangeTests(TestCase):
+    """One request returns every day of a range, at a cost that does not grow with the range."""
+
+    @classmethod
+    def setUpTestData(cls):
+        scheduled = AppointmentStatus.objects.create(name='scheduled')
+        cls.doctor, clinic = create_doctor(1)
+        cls.patient = CustomUser.objects.create(email='patient@heydoc.test', first_name='Pat', last_name='Ient')
+        cls.start = timezone.localdate() + timedelta(days=1)
+        Appointment.objects.create(
+            patient=cls.patient, doctor=cls.doctor, clinic=clinic, status=scheduled, appointment_date=cls.start,
+            appointment_time=time(9), consultation_fee=100
+        )
+        Unavailability.objects.create(doctor=cls.doctor, date=cls.start + timedelta(days=1), is_full_day=True)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.patient)
+
+    def get_range(self, start, end):
+        return self.client.get(f'/api/doctors/{self.doctor.pk}/availability/', {
+            'start': start.isoformat(), 'end': end.isoformat()
+        })
+
+    def test_days_of_the_range(self):
+        yesterday = timezone.localdate() - timedelta(days=1)
+        # The doctor, then schedules, absences and bookings once for the whole range
+        with self.assertNumQueries(4):
+            response = self.get_range(yesterday, self.start + timedelta(days=2))
+        days = {day['date']: day for day in response.data['days']}
+        self.assertEqual(len(days), 5)
+        self.assertFalse(days[yesterday.isoformat()]['available'])
+        first = days[self.start.isoformat()]
+        self.assertEqual(
+            (first['available_count'], first['total_slots'], first['first_available_slot']), (3, 4, '09:30')
+        )
+        self.assertFalse(days[(self.start + timedelta(days=1)).isoformat()]['available'])
+        # Today depends on the time of the run; the following days do not
+        self.assertEqual(response.data['available_dates'][-2:], [
+            self.start.isoformat(), (self.start + timedelta(days=2)).isoformat()
+        ])
+
+        with self.assertNumQueries(4):
+            response = self.get_range(self.start, self.start + timedelta(days=60))
+        self.assertEqual(len(response.data['days']), 61)
+
+    def test_invalid_ranges(self):
+        self.assertEqual(self.get_range(self.start, self.start - timedelta(days=1)).status_code, 400)
+        self.assertEqual(self.get_range(self.start, self.start + timedelta(days=92)).status_code, 400)
+        response = self.client.get(f'/api/doctors/{self.doctor.pk}/availability/', {'start': 'tomorrow'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.get('/api/doctors/0/availability/').status_code, 404)
+
+
+class DoctorAvailabilitySearchTests(TestCase):
+    """Matching doctors are ranked by their earliest free slot in the window."""
+
+    @classmethod
+    def setUpTestData(cls):
+        scheduled = AppointmentStatus.objects.create(name='scheduled')
+        cardiology = Specialization.objects.create(name='Cardiology')
+        cls.patient = CustomUser.objects.create(email='patient@heydoc.test', first_name='Pat', last_name='Ient')
+        cls.start = timezone.localdate() + timedelta(days=1)
+        # Booked out on the first day
+        cls.morning, clinic = create_doctor(1, rating=5)
+        Appointment.objects.create(
+            patient=cls.patient, doctor=cls.morning, clinic=clinic, status=scheduled, appointment_date=cls.start,
+            appointment_time=time(9), duration=120, consultation_fee=100
+        )
+        cls.afternoon, _ = create_doctor(2, start=time(14), end=time(16), slot_duration=60, rating=4)
+        cls.other, _ = create_doctor(3)
+        for doctor in (cls.morning, cls.afternoon):
+            doctor.specializations.add(cardiology)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.patient)
+
+    def search(self, **params):
+        return self.client.get('/api/doctors/available/', {
+            'specialization': 'cardio', 'date': self.start.isoformat(), 'days': 3, **params
+        })
+
+    def test_ranked_by_earliest_slot(self):
+        response = self.search()
+        self.assertEqual(response.data['count'], 2)
+        self.assertEqual(
+            [(row['id'], row['earliest_slot']['date'], row['earliest_slot']['time']) for row in response.data['results']],
+            [
+                (self.afternoon.pk, self.start.isoformat(), '14:00'),
+                (self.morning.pk, (self.start + timedelta(days=1)).isoformat(), '09:00'),
+            ]
+        )
+
+    def test_time_window(self):
+        response = self.search(time_from='15:00', time_to='17:00')
+        self.assertEqual([row['id'] for row in response.data['results']], [self.afternoon.pk])
+        self.assertEqual(response.data['results'][0]['earliest_slot']['time'], '15:00')
+
+    def test_query_count_does_not_grow_with_candidates(self):
+        with CaptureQueriesContext(connection) as narrow:
+            self.search()
+        with CaptureQueriesContext(connection) as wide:
+            response = self.search(specialization='')
+        self.assertEqual(response.data['count'], 3)
+        self.assertEqual(len(wide), len(narrow))
+
+    def test_invalid_parameters(self):
+        self.assertEqual(self.search(days=0).status_code, 400)
+        self.assertEqual(self.search(days=15).status_code, 400)
+        self.assertEqual(self.search(time_from='noon').status_code, 400)
+
+
+class DoctorListNextAvailableTests(TestCase):
+    """next_available is opt-in and computed for the whole page at once."""
+
+    @classmethod
+    def setUpTestData(cls):
+        AppointmentStatus.objects.create(name='scheduled')
+        cls.doctors = [create_doctor(number, rating=5 - number)[0] for number in range(3)]
+        # Away for the next few days
+        Unavailability.objects.bulk_create([
+            Unavailability(doctor=cls.doctors[2], date=timezone.localdate() + timedelta(days=offset), is_full_day=True)
+            for offset in range(3)
+        ])
+
+    def test_opt_in(self):
+        response = self.client.get('/api/doctors/')
+        self.assertNotIn('next_available', response.json()['results'][0])
+
+        response = self.client.get('/api/doctors/', {'include': 'next_available'})
+        results = {row['id']: row['next_available'] for row in response.json()['results']}
+        tomorrow = timezone.localdate() + timedelta(days=1)
+        self.assertLessEqual(results[self.doctors[0].pk]['date'], tomorrow.isoformat())
+        self.assertEqual(results[self.doctors[2].pk], {
+            'date': (tomorrow + timedelta(days=2)).isoformat(), 'time': '09:00',
+            'clinic_id': self.doctors[2].clinics.get().pk
+        })
+
+    def test_one_batch_per_page(self):
+        with CaptureQueriesContext(connection) as plain:
+            self.client.get('/api/doctors/')
+        with CaptureQueriesContext(connection) as with_slots:
+            self.client.get('/api/doctors/', {'include': 'next_available'})
+        # Schedules, absences and bookings of every doctor on the page
+        self.assertEqual(len(with_slots), len(plain) + 3)
+
+
+class DoctorUnavailabilityTests(TestCase):
+    """Blocking out time cancels the overlapping bookings and notifies their patients."""
+
+    @classmethod
+    def setUpTestData(cls):
+        for name in ['scheduled', 'confirmed', 'cancelled']:
+            AppointmentStatus.objects.create(name=name)
+        cls.doctor, cls.clinic = create_doctor(1, end=time(12))
+        cls.patient = CustomUser.objects.create(email='patient@heydoc.test', first_name='Pat', last_name='Ient')
+        cls.start = timezone.localdate() + timedelta(days=2)
+
+    def setUp(self):
+        # Types cached by earlier tests were rolled back with them
+        notification_types.invalidate()
+        self.client = APIClient()
+        self.client.force_authenticate(self.doctor.user)
+
+    def book(self, day, slot_time, duration=30, status='scheduled'):
+        return Appointment.objects.create(
+            patient=self.patient, doctor=self.doctor, clinic=self.clinic, appointment_date=day,
+            appointment_time=slot_time, duration=duration, consultation_fee=100,
+            status=AppointmentStatus.objects.get(name=status)
+        )
+
+    def block(self, **body):
+        return self.client.post('/api/doctors/unavailability/', body, format='json')
+
+    def test_full_days(self):
+        first = self.book(self.start, time(9))
+        second = self.book(self.start + timedelta(days=1), time(11), status='confirmed')
+        kept = self.book(self.start + timedelta(days=2), time(9))
+        response = self.block(
+            start_date=self.start.isoformat(), end_date=(self.start + timedelta(days=1)).isoformat(), reason='Leave'
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(response.data['is_full_day'])
+        self.assertEqual(len(response.data['unavailability_ids']), 2)
+        self.assertEqual(sorted(response.data['cancelled_appointments']), sorted([first.booking_id, second.booking_id]))
+        self.assertEqual(response.data['notified_count'], 2)
+
+        self.assertEqual(Appointment.objects.get(pk=kept.pk).status.name, 'scheduled')
+        self.assertEqual(Appointment.objects.get(pk=first.pk).history.get().change_reason, 'Doctor unavailable: Leave')
+        notification = Notification.objects.filter(user=self.patient).order_by('id').first()
+        self.assertEqual(notification.type.name, 'appointment_cancelled')
+        self.assertIn(first.booking_id, notification.message)
+
+    def test_partial_day_cancels_overlaps_only(self):
+        # 09:30-10:30 overlaps the 10:00 window; 10:30 starts after it
+        overlapping = self.book(self.start, time(9, 30), duration=60)
+        after = self.book(self.start, time(10, 30))
+        response = self.block(start_date=self.start.isoformat(), start_time='10:00', end_time='10:30')
+        self.assertEqual(response.data['cancelled_appointments'], [overlapping.booking_id])
+        self.assertEqual(Appointment.objects.get(pk=after.pk).status.name, 'scheduled')
+        unavailability = Unavailability.objects.get(pk=response.data['unavailability_ids'][0])
+        self.assertEqual((unavailability.start_time, unavailability.end_time), (time(10), time(10, 30)))
+
+    def test_validation(self):
+        yesterday = timezone.localdate() - timedelta(days=1)
+        self.assertEqual(self.block(start_date=yesterday.isoformat()).status_code, 400)
+        self.assertEqual(self.block(start_date=self.start.isoformat(), start_time='10:00').status_code, 400)
+        self.assertEqual(
+            self.block(start_date=self.start.isoformat(), start_time='11:00', end_time='10:00').status_code, 400
+        )
+        self.assertEqual(
+            self.block(start_date=self.start.isoformat(),
+                       end_date=(self.start + timedelta(days=92)).isoformat()).status_code, 400
+        )
+        self.client.force_authenticate(self.patient)
+        self.assertEqual(self.block(start_date=self.start.isoformat()).status_code, 403)
+        self.assertFalse(Unavailability.objects.exists())
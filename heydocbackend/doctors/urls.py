@@ -3,6 +3,8 @@ from . import views
 
 urlpatterns = [
     path('', views.DoctorListView.as_view(), name='doctor-list'),
+    path('available/', views.DoctorAvailabilitySearchView.as_view(), name='doctor-availability-search'),
+    path('unavailability/', views.create_unavailability, name='doctor-unavailability'),
     path('<int:pk>/', views.DoctorDetailView.as_view(), name='doctor-detail'),
     path('<int:doctor_id>/availability/', views.doctor_availability, name='doctor-availability'),
     path('specializations/', views.SpecializationListView.as_view(), name='specializations'),
@@ -1,12 +1,27 @@
-from rest_framework import generics, filters, permissions
-from rest_framework.decorators import api_view
+from rest_framework import generics, filters, permissions, status
+from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
 from django.db.models import Q
+from django.shortcuts import get_object_or_404
 from .models import DoctorProfile, Specialization
 from .serializers import DoctorProfileSerializer, DoctorListSerializer, SpecializationSerializer
 from .filters import DoctorFilter
 
+# Range limits for the availability calendar endpoint
+DEFAULT_AVAILABILITY_RANGE_DAYS = 30
+MAX_AVAILABILITY_RANGE_DAYS = 92
+
+# Limits for the cross-doctor availability search
+MAX_SEARCH_WINDOW_DAYS = 14
+MAX_SEARCH_CANDIDATES = 500
+
+# Days ahead searched for the opt-in next_available field on the doctor list
+NEXT_AVAILABLE_WINDOW_DAYS = 14
+
+# Longest period a doctor can block out in one request
+MAX_UNAVAILABILITY_RANGE_DAYS = 92
+
 class SpecializationListView(generics.ListAPIView):
     queryset = Specialization.objects.all()
     serializer_class = SpecializationSerializer
@@ -25,7 +40,90 @@ class DoctorListView(generics.ListAPIView):
         return DoctorProfile.objects.filter(
             is_available=True, 
             user__is_active=True
-        ).select_related('user').prefetch_related('specializations', 'clinics')
+        ).select_related('user').prefetch_related('specializations', 'clinics__area__city')
+    
+    def list(self, request, *args, **kwargs):
+        from appointments.slots import next_available_slots
+        
+        includes = request.query_params.get('include', '').split(',')
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        doctors = page if page is not None else list(queryset)
+        
+        context = self.get_serializer_context()
+        if 'next_available' in includes:
+            # One batch for the whole page: schedules, unavailabilities and bookings
+            context['next_available'] = next_available_slots(
+                [doctor.id for doctor in doctors], days=NEXT_AVAILABLE_WINDOW_DAYS
+            )
+        serializer = self.get_serializer_class()(doctors, many=True, context=context)
+        if page is not None:
+            return self.get_paginated_response(serializer.data)
+        return Response(serializer.data)
+
+class DoctorAvailabilitySearchView(DoctorListView):
+    """
+    Rank doctors matching the DoctorFilter criteria by their earliest free slot.
+
+    Availability is evaluated for all candidate doctors at once, so a search
+    costs a fixed number of queries instead of one request per doctor.
+    """
+
+    def list(self, request, *args, **kwargs):
+        from datetime import datetime, timedelta
+        from django.utils import timezone
+        from appointments.slots import SlotEngine
+        
+        today = timezone.localdate()
+        try:
+            date_str = request.query_params.get('date')
+            start = datetime.strptime(date_str, '%Y-%m-%d').date() if date_str else today
+            days = int(request.query_params.get('days', 1))
+            time_from = request.query_params.get('time_from')
+            time_to = request.query_params.get('time_to')
+            time_from = datetime.strptime(time_from, '%H:%M').time() if time_from else None
+            time_to = datetime.strptime(time_to, '%H:%M').time() if time_to else None
+        except ValueError:
+            return Response(
+                {'error': 'Invalid parameters. Use date=YYYY-MM-DD, days=N, time_from/time_to=HH:MM'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not 1 <= days <= MAX_SEARCH_WINDOW_DAYS:
+            return Response(
+                {'error': f'days must be between 1 and {MAX_SEARCH_WINDOW_DAYS}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        start = max(start, today)
+        end = start + timedelta(days=days - 1)
+        queryset = self.filter_queryset(self.get_queryset())
+        candidate_ids = list(
+            queryset.order_by('-rating', 'id').values_list('id', flat=True).distinct()[:MAX_SEARCH_CANDIDATES]
+        )
+        
+        # Schedules, unavailabilities and bookings for every candidate in three queries
+        engine = SlotEngine(candidate_ids, start, end)
+        now = timezone.localtime()
+        earliest = {}
+        for doctor_id in candidate_ids:
+            found = engine.first_free_slot(doctor_id, now=now, time_from=time_from, time_to=time_to)
+            if found:
+                earliest[doctor_id] = found
+        ranked = sorted(earliest, key=lambda doctor_id: (earliest[doctor_id][0], earliest[doctor_id][1].time))
+        
+        page_ids = self.paginate_queryset(ranked)
+        doctors = self.get_queryset().in_bulk(page_ids)
+        data = []
+        for doctor_id in page_ids:
+            day, slot = earliest[doctor_id]
+            entry = self.get_serializer(doctors[doctor_id]).data
+            entry['earliest_slot'] = {
+                'date': day.isoformat(),
+                'time': slot.time.strftime('%H:%M'),
+                'clinic_id': slot.clinic_id
+            }
+            data.append(entry)
+        return self.get_paginated_response(data)
 
 class DoctorDetailView(generics.RetrieveAPIView):
     queryset = DoctorProfile.objects.all()
@@ -34,10 +132,121 @@ class DoctorDetailView(generics.RetrieveAPIView):
 
 @api_view(['GET'])
 def doctor_availability(request, doctor_id):
-    # This would contain logic to get available slots
-    # Implementation depends on your specific requirements
+    """Get free slot counts and the first free slot for every day in a date range."""
+    from datetime import datetime, timedelta
+    from django.utils import timezone
+    from appointments.slots import SlotEngine
+    
+    doctor = get_object_or_404(DoctorProfile.objects.only('id'), pk=doctor_id)
+    today = timezone.localdate()
+    
+    try:
+        start_str = request.query_params.get('start')
+        end_str = request.query_params.get('end')
+        start = datetime.strptime(start_str, '%Y-%m-%d').date() if start_str else today
+        end = datetime.strptime(end_str, '%Y-%m-%d').date() if end_str else start + timedelta(days=DEFAULT_AVAILABILITY_RANGE_DAYS - 1)
+    except ValueError:
+        return Response(
+            {'error': 'Invalid date format. Use YYYY-MM-DD'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    if end < start:
+        return Response(
+            {'error': 'end must not be before start'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    if (end - start).days + 1 > MAX_AVAILABILITY_RANGE_DAYS:
+        return Response(
+            {'error': f'Date range cannot exceed {MAX_AVAILABILITY_RANGE_DAYS} days'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    # One pass over schedules, unavailabilities and bookings for the whole range
+    engine = SlotEngine([doctor.id], max(start, today), end) if end >= today else None
+    now = timezone.localtime()
+    
+    days = []
+    day = start
+    while day <= end:
+        if engine is None or day < today:
+            free_slots, total_slots = [], 0
+        else:
+            free_slots = engine.free_slots(doctor.id, day, now=now)
+            total_slots = sum(count[0] for count in engine.counts(doctor.id, day).values())
+        days.append({
+            'date': day.isoformat(),
+            'available': bool(free_slots),
+            'available_count': len(free_slots),
+            'total_slots': total_slots,
+            'first_available_slot': free_slots[0].time.strftime('%H:%M') if free_slots else None
+        })
+        day += timedelta(days=1)
+    
+    return Response({
+        'doctor_id': doctor.id,
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'available_dates': [entry['date'] for entry in days if entry['available']],
+        'days': days
+    })
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def create_unavailability(request):
+    """Block out a date range for the doctor and cancel the appointments booked in it."""
+    from datetime import datetime, timedelta
+    from django.utils import timezone
+    from appointments.cancellations import block_out
+    
+    doctor = DoctorProfile.objects.only('id').filter(user=request.user).first()
+    if doctor is None:
+        return Response({'error': 'Only doctors can record unavailability'}, status=status.HTTP_403_FORBIDDEN)
+    
+    try:
+        start_date = datetime.strptime(request.data.get('start_date'), '%Y-%m-%d').date()
+        end_str = request.data.get('end_date')
+        end_date = datetime.strptime(end_str, '%Y-%m-%d').date() if end_str else start_date
+        start_str = request.data.get('start_time')
+        finish_str = request.data.get('end_time')
+        start_time = datetime.strptime(start_str, '%H:%M').time() if start_str else None
+        end_time = datetime.strptime(finish_str, '%H:%M').time() if finish_str else None
+    except (TypeError, ValueError):
+        return Response(
+            {'error': 'start_date (YYYY-MM-DD) is required; end_date, start_time and end_time (HH:MM) are optional'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    if start_date < timezone.localdate() or end_date < start_date:
+        return Response(
+            {'error': 'The date range must not be in the past and end_date must not be before start_date'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    if (end_date - start_date).days + 1 > MAX_UNAVAILABILITY_RANGE_DAYS:
+        return Response(
+            {'error': f'Date range cannot exceed {MAX_UNAVAILABILITY_RANGE_DAYS} days'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    if (start_time is None) != (end_time is None) or (start_time and start_time >= end_time):
+        return Response(
+            {'error': 'Give both start_time and end_time, with start_time before end_time, or neither for full days'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    dates = [start_date + timedelta(days=offset) for offset in range((end_date - start_date).days + 1)]
+    unavailabilities, cancelled, notifications = block_out(
+        doctor, dates, start_time, end_time,
+        reason=request.data.get('reason', ''),
+        changed_by=request.user
+    )
+    
     return Response({
-        'doctor_id': doctor_id,
-        'available_dates': [],  # Add your logic here
-        'message': 'Availability endpoint - implement based on requirements'
-    })
\ No newline at end of file
+        'doctor_id': doctor.id,
+        'start_date': start_date.isoformat(),
+        'end_date': end_date.isoformat(),
+        'is_full_day': start_time is None,
+        'unavailability_ids': [unavailability.id for unavailability in unavailabilities],
+        'cancelled_appointments': [row.booking_id for row in cancelled],
+        'cancelled_count': len(cancelled),
+        'notified_count': len(notifications)
+    }, status=status.HTTP_201_CREATED)
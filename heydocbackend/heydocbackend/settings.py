@@ -14,6 +14,7 @@ from pathlib import Path
 from decouple import config
 import os
 from datetime import timedelta
+from corsheaders.defaults import default_headers
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -40,6 +41,7 @@ DJANGO_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
 ]
 
 THIRD_PARTY_APPS = [
@@ -69,9 +71,13 @@ MIDDLEWARE = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'corsheaders.middleware.CorsMiddleware',
+    'utils.middleware.IdempotencyMiddleware',
 ]
 
 CORS_ALLOW_ALL_ORIGINS = True 
+# Clients may retry POSTs with an Idempotency-Key (see utils.middleware)
+CORS_ALLOW_HEADERS = (*default_headers, 'idempotency-key')
+CORS_EXPOSE_HEADERS = ['Idempotent-Replayed']
 ROOT_URLCONF = 'heydocbackend.urls'
 
 TEMPLATES = [
@@ -194,7 +200,7 @@ FRONTEND_URL = config('FRONTEND_URL', default='http://localhost:3000')
 # Cache Configuration (for email rate limiting)
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'BACKEND': 'django_redis.cache.RedisCache',
         'LOCATION': config('REDIS_URL', default='redis://127.0.0.1:6379/1'),
         'OPTIONS': {
             'CLIENT_CLASS': 'django_redis.client.DefaultClient',
@@ -204,6 +210,21 @@ CACHES = {
     }
 }
 
+# How long a patient may hold a slot during checkout
+SLOT_HOLD_SECONDS = config('SLOT_HOLD_SECONDS', default=300, cast=int)
+
+# How long a freed slot stays held for the waitlisted patient it is offered to
+WAITLIST_OFFER_SECONDS = config('WAITLIST_OFFER_SECONDS', default=900, cast=int)
+
+# How long responses to POSTs carrying an Idempotency-Key are kept for replay
+IDEMPOTENCY_KEY_TTL = config('IDEMPOTENCY_KEY_TTL', default=86400, cast=int)
+
+# How long a doctor's cached day agenda lives; changes to the day drop it sooner
+AGENDA_CACHE_SECONDS = config('AGENDA_CACHE_SECONDS', default=600, cast=int)
+
+# Number of days ahead kept in the materialized DailyAvailability table
+AVAILABILITY_HORIZON_DAYS = config('AVAILABILITY_HORIZON_DAYS', default=60, cast=int)
+
 # Logging Configuration
 LOGGING = {
     'version': 1,
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:40
+
+import django.db.models.deletion
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('notifications', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='notification',
+            options={'ordering': ['-created_at', '-id']},
+        ),
+        # Build the list index without blocking writes, then drop the user FK index it covers
+        AddIndexConcurrently(
+            model_name='notification',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='notif_user_created_idx'),
+        ),
+        migrations.AlterField(
+            model_name='notification',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='notifications', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
@@ -1,5 +1,6 @@
 from django.db import models
 from accounts.models import CustomUser
+from .registry import notification_types
 import json
 
 class NotificationType(models.Model):
@@ -28,7 +29,7 @@ class NotificationType(models.Model):
         return methods
 
 class Notification(models.Model):
-    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='notifications')
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='notifications', db_index=False)
     type = models.ForeignKey(NotificationType, on_delete=models.CASCADE)
     title = models.CharField(max_length=200)
     message = models.TextField()
@@ -39,7 +40,11 @@ class Notification(models.Model):
 
     class Meta:
         db_table = 'notifications_notification'
-        ordering = ['-created_at']
+        ordering = ['-created_at', '-id']
+        indexes = [
+            # A user's notifications, newest first; also covers the user FK
+            models.Index(fields=['user', '-created_at', '-id'], name='notif_user_created_idx'),
+        ]
 
     def __str__(self):
         return f"{self.title} - {self.user.get_full_name()}"
@@ -107,7 +112,7 @@ class Notification(models.Model):
     def create_notification(cls, user, notification_type, title, message, data=None):
         """Create a new notification."""
         if isinstance(notification_type, str):
-            notification_type = NotificationType.objects.get(name=notification_type)
+            notification_type = notification_types.get(notification_type)
         
         notification = cls.objects.create(
             user=user,
@@ -0,0 +1,3 @@
+from utils.registry import LookupRegistry
+
+notification_types = LookupRegistry('notifications.NotificationType')
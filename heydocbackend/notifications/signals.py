@@ -0,0 +1,10 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .models import NotificationType
+from .registry import notification_types
+
+@receiver(post_save, sender=NotificationType)
+@receiver(post_delete, sender=NotificationType)
+def invalidate_notification_type_registry(sender, **kwargs):
+    """Reload the notification type registry after the lookup table changes."""
+    notification_types.invalidate()
@@ -3,10 +3,12 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from .models import Notification
 from .serializers import NotificationSerializer
+from utils.pagination import OptionalCursorPagination
 
 class NotificationListView(generics.ListAPIView):
     serializer_class = NotificationSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = OptionalCursorPagination
 
     def get_queryset(self):
         return Notification.objects.filter(user=self.request.user)
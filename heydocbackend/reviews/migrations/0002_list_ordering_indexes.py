@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:40
+
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('appointments', '0010_list_ordering_indexes'),
+        ('doctors', '0002_alter_doctorprofile_options_and_more'),
+        ('reviews', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='review',
+            options={'ordering': ['-created_at', '-id']},
+        ),
+        AddIndexConcurrently(
+            model_name='review',
+            index=models.Index(condition=models.Q(('is_approved', True)), fields=['doctor', '-created_at', '-id'], name='review_doctor_created_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='review',
+            index=models.Index(fields=['patient', '-created_at', '-id'], name='review_patient_created_idx'),
+        ),
+    ]
@@ -22,7 +22,16 @@ class Review(models.Model):
     class Meta:
         db_table = 'reviews_review'
         unique_together = ['patient', 'doctor', 'appointment']
-        ordering = ['-created_at']
+        ordering = ['-created_at', '-id']
+        indexes = [
+            # Review lists, newest first: a doctor's approved reviews and a patient's own
+            models.Index(
+                fields=['doctor', '-created_at', '-id'],
+                name='review_doctor_created_idx',
+                condition=models.Q(is_approved=True)
+            ),
+            models.Index(fields=['patient', '-created_at', '-id'], name='review_patient_created_idx'),
+        ]
 
     def __str__(self):
         return f"{self.rating} stars for {self.doctor.display_name}"
@@ -49,7 +49,7 @@ class CreateReviewSerializer(serializers.ModelSerializer):
             })
             
         # Verify appointment is completed
-        if appointment and appointment.status.name.lower() != 'completed':
+        if appointment and appointment.get_status().name.lower() != 'completed':
             raise serializers.ValidationError({
                 'appointment': ['You can only review completed appointments.']
             })
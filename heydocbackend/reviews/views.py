@@ -1,9 +1,11 @@
 from rest_framework import generics, permissions
 from .models import Review
 from .serializers import ReviewSerializer, CreateReviewSerializer
+from utils.pagination import OptionalCursorPagination
 
 class ReviewListCreateView(generics.ListCreateAPIView):
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = OptionalCursorPagination
 
     def get_queryset(self):
         doctor_id = self.request.query_params.get('doctor_id')
@@ -0,0 +1,32 @@
+import logging
+from django.core.cache import cache
+from django_redis import get_redis_connection
+from redis.exceptions import LockError, RedisError
+
+logger = logging.getLogger(__name__)
+
+
+def run_exclusive(name, func, timeout=300, **kwargs):
+    """
+    Run ``func(**kwargs)`` under a Redis lock shared by all hosts.
+
+    Returns None without running when another host holds the lock. If Redis
+    is unreachable the work runs anyway, so ``func`` must be safe to run
+    concurrently on its own; the lock only avoids duplicated effort.
+    """
+    try:
+        lock = get_redis_connection('default').lock(cache.make_key(f'lock:{name}'), timeout=timeout, blocking=False)
+        acquired = lock.acquire()
+    except RedisError:
+        logger.warning('Lock %s unavailable, running without it', name, exc_info=True)
+        return func(**kwargs)
+    if not acquired:
+        return None
+    try:
+        return func(**kwargs)
+    finally:
+        try:
+            lock.release()
+        except (LockError, RedisError):
+            # Expired while running; the next run takes over
+            logger.warning('Lock %s was lost before release', name, exc_info=True)
@@ -0,0 +1,113 @@
+import hashlib
+import logging
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse, JsonResponse
+from django_redis.exceptions import ConnectionInterrupted
+from redis.exceptions import RedisError
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_HEADER = 'HTTP_IDEMPOTENCY_KEY'
+MAX_KEY_LENGTH = 255
+# Cache value of a key whose first request is still running, and how long
+# that claim survives a worker that dies mid-request
+IN_FLIGHT = 'in-flight'
+IN_FLIGHT_SECONDS = 60
+CACHE_ERRORS = (ConnectionInterrupted, RedisError)
+
+
+class IdempotencyMiddleware:
+    """
+    Replay the stored response of a POST retried with the same Idempotency-Key.
+
+    Keys are scoped to the authenticated user and the request path, so a
+    retry sent with a refreshed token still replays. A key reused with a
+    different body is rejected with 422, and a retry that arrives while the
+    first request is still running gets 409. Server errors are not stored,
+    so they can be retried; requests with invalid credentials are passed on
+    to be rejected by the view.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        idempotency_key = request.META.get(IDEMPOTENCY_HEADER)
+        if request.method != 'POST' or not idempotency_key:
+            return self.get_response(request)
+        if len(idempotency_key) > MAX_KEY_LENGTH:
+            return JsonResponse(
+                {'error': f'Idempotency-Key must be at most {MAX_KEY_LENGTH} characters'}, status=400
+            )
+
+        caller = self._caller(request)
+        if caller is None:
+            return self.get_response(request)
+        scope = hashlib.sha256(f"{caller}|{request.path}|{idempotency_key}".encode()).hexdigest()
+        cache_key = f'idempotency:{scope}'
+        fingerprint = hashlib.sha256(request.body).hexdigest()
+
+        try:
+            # A retry is a single read; only first requests go on to claim the key
+            stored = cache.get(cache_key)
+            claimed = stored is None and cache.add(cache_key, IN_FLIGHT, IN_FLIGHT_SECONDS)
+        except CACHE_ERRORS:
+            logger.warning('Idempotency store unavailable', exc_info=True)
+            return self.get_response(request)
+
+        if not claimed:
+            if stored is None or stored == IN_FLIGHT:
+                return JsonResponse(
+                    {'error': 'A request with this Idempotency-Key is still being processed'}, status=409
+                )
+            if stored['fingerprint'] != fingerprint:
+                return JsonResponse(
+                    {'error': 'This Idempotency-Key was already used with a different request body'}, status=422
+                )
+            response = HttpResponse(stored['content'], status=stored['status'], content_type=stored['content_type'])
+            response['Idempotent-Replayed'] = 'true'
+            return response
+
+        try:
+            response = self.get_response(request)
+        except Exception:
+            self._release(cache_key)
+            raise
+        if response.status_code >= 500 or getattr(response, 'streaming', False):
+            self._release(cache_key)
+            return response
+        try:
+            cache.set(cache_key, {
+                'fingerprint': fingerprint,
+                'status': response.status_code,
+                'content': response.content,
+                'content_type': response.get('Content-Type'),
+            }, settings.IDEMPOTENCY_KEY_TTL)
+        except CACHE_ERRORS:
+            logger.warning('Could not store idempotent response', exc_info=True)
+        return response
+
+    def _caller(self, request):
+        """Return who is calling: the authenticated user, 'anonymous', or None for invalid credentials."""
+        from rest_framework.exceptions import APIException
+        from rest_framework.settings import api_settings
+
+        # Views authenticate through DRF, after middleware; resolve the user the same way here
+        for authentication_class in api_settings.DEFAULT_AUTHENTICATION_CLASSES:
+            try:
+                authenticated = authentication_class().authenticate(request)
+            except APIException:
+                return None
+            if authenticated is not None:
+                return f'user:{authenticated[0].pk}'
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            return f'user:{user.pk}'
+        return 'anonymous'
+
+    def _release(self, cache_key):
+        try:
+            cache.delete(cache_key)
+        except CACHE_ERRORS:
+            logger.warning('Could not release Idempotency-Key', exc_info=True)
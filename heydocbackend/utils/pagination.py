@@ -1,4 +1,4 @@
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import CursorPagination, PageNumberPagination
 from rest_framework.response import Response
 
 class CustomPageNumberPagination(PageNumberPagination):
@@ -16,4 +16,54 @@ class CustomPageNumberPagination(PageNumberPagination):
             'total_pages': self.page.paginator.num_pages,
             'current_page': self.page.number,
             'results': data
-        })
\ No newline at end of file
+        })
+
+class OptionalCursorPagination(CursorPagination):
+    """
+    Page-number pagination, or keyset pagination for requests with ``?pagination=cursor``.
+
+    Cursor pages filter on the first ``ordering`` field instead of using
+    OFFSET and skip the COUNT(*), so the last page of a long history costs
+    the same as the first. The first field should be (nearly) unique and
+    indexed together with the list's filter; the rest break ties.
+    """
+    ordering = ('-created_at', '-id')
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    mode_query_param = 'pagination'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        use_cursor = (
+            request.query_params.get(self.mode_query_param) == 'cursor'
+            or self.cursor_query_param in request.query_params
+        )
+        # Existing clients keep the default page-number responses
+        self.fallback = None if use_cursor else PageNumberPagination()
+        if self.fallback is not None:
+            page = self.fallback.paginate_queryset(queryset, request, view)
+            self.display_page_controls = self.fallback.display_page_controls
+            return page
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.fallback is not None:
+            return self.fallback.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+    def to_html(self):
+        if self.fallback is not None:
+            return self.fallback.to_html()
+        return super().to_html()
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            *PageNumberPagination().get_schema_operation_parameters(view),
+            *super().get_schema_operation_parameters(view),
+            {
+                'name': self.mode_query_param,
+                'required': False,
+                'in': 'query',
+                'description': "Set to 'cursor' for cursor pagination.",
+                'schema': {'type': 'string', 'enum': ['cursor']},
+            },
+        ]
@@ -0,0 +1,82 @@
+import threading
+import time
+from django.apps import apps
+
+
+class LookupRegistry:
+    """
+    In-process cache of a small lookup table (e.g. statuses, types) keyed by name.
+
+    Rows are loaded once per process and reused until invalidated, which the
+    owning app does from post_save/post_delete signals. ``max_age`` bounds how
+    long a change made by another process can go unnoticed.
+    """
+
+    def __init__(self, model, key='name', max_age=300):
+        # Accept an 'app_label.ModelName' string so registries can be declared
+        # in modules imported before the app registry is ready
+        self._model = model
+        self.key = key
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._by_key = None
+        self._by_id = None
+        self._loaded_at = 0
+
+    @property
+    def model(self):
+        if isinstance(self._model, str):
+            self._model = apps.get_model(self._model)
+        return self._model
+
+    def _rows(self, reload=False):
+        cached = self._by_key, self._by_id
+        if reload or cached[0] is None or time.monotonic() - self._loaded_at > self.max_age:
+            with self._lock:
+                rows = list(self.model.objects.all())
+                cached = {getattr(row, self.key): row for row in rows}, {row.pk: row for row in rows}
+                self._by_key, self._by_id = cached
+                self._loaded_at = time.monotonic()
+        return cached
+
+    def get(self, name):
+        """Return the row with this name, raising the model's DoesNotExist if missing."""
+        by_key, _ = self._rows()
+        if name not in by_key:
+            # Possibly added by another process since the rows were loaded
+            by_key, _ = self._rows(reload=True)
+        try:
+            return by_key[name]
+        except KeyError:
+            raise self.model.DoesNotExist(f'{self.model.__name__} matching {self.key}={name!r} does not exist.')
+
+    def get_by_id(self, pk):
+        """Return the row with this primary key, raising the model's DoesNotExist if missing."""
+        _, by_id = self._rows()
+        if pk not in by_id:
+            _, by_id = self._rows(reload=True)
+        try:
+            return by_id[pk]
+        except KeyError:
+            raise self.model.DoesNotExist(f'{self.model.__name__} with pk={pk!r} does not exist.')
+
+    def get_or_create(self, name, **defaults):
+        """Return the row with this name, creating it with ``defaults`` if missing."""
+        try:
+            return self.get(name)
+        except self.model.DoesNotExist:
+            row, _ = self.model.objects.get_or_create(**{self.key: name}, defaults=defaults)
+            return row
+
+    def ids(self, names, ignore_case=False):
+        """Return primary keys of the rows matching any of the given names."""
+        by_key, _ = self._rows()
+        if ignore_case:
+            wanted = {name.lower() for name in names}
+            return [row.pk for key, row in by_key.items() if key.lower() in wanted]
+        return [by_key[name].pk for name in names if name in by_key]
+
+    def invalidate(self, **kwargs):
+        """Drop the cached rows; usable directly as a signal receiver."""
+        with self._lock:
+            self._by_key = self._by_id = None
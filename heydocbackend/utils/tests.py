@@ -1,3 +1,95 @@
+from datetime import timedelta
+from django.core.cache import cache
 from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+from accounts.models import CustomUser
+from appointments.models import Appointment, AppointmentStatus
+from appointments.testing import BookingTestCase
+from .middleware import IN_FLIGHT
+from .registry import LookupRegistry
 
-# Create your tests here.
+
+class LookupRegistryTests(TestCase):
+    """Rows are served from memory; a row added elsewhere is picked up by reloading once."""
+
+    def setUp(self):
+        self.scheduled = AppointmentStatus.objects.create(name='scheduled')
+        self.registry = LookupRegistry(AppointmentStatus)
+
+    def test_cached_lookups(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(self.registry.get('scheduled'), self.scheduled)
+            self.assertEqual(self.registry.get_by_id(self.scheduled.pk), self.scheduled)
+            self.assertEqual(self.registry.ids(['scheduled', 'unknown']), [self.scheduled.pk])
+
+    def test_rows_added_by_another_process(self):
+        self.registry.get('scheduled')
+        # bulk_create sends no signals, like a row created by another worker
+        confirmed, = AppointmentStatus.objects.bulk_create([AppointmentStatus(name='confirmed')])
+        with self.assertNumQueries(1):
+            self.assertEqual(self.registry.get_by_id(confirmed.pk), confirmed)
+            self.assertEqual(self.registry.get('confirmed'), confirmed)
+
+    def test_missing_rows_raise(self):
+        self.registry.get('scheduled')
+        with self.assertNumQueries(1):
+            with self.assertRaises(AppointmentStatus.DoesNotExist):
+                self.registry.get_by_id(0)
+        with self.assertRaisesMessage(AppointmentStatus.DoesNotExist, "name='unknown'"):
+            self.registry.get('unknown')
+
+
+class IdempotencyMiddlewareTests(BookingTestCase):
+    """A retried booking is replayed for the same user, whatever token the retry carries."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.other = CustomUser.objects.create(email='other@heydoc.test', first_name='Oth', last_name='Er')
+        cls.body = {
+            'doctor': cls.doctor.pk,
+            'appointment_date': (timezone.localdate() + timedelta(days=2)).isoformat(),
+            'appointment_time': '09:00',
+            'consultation_fee': '100.00',
+        }
+
+    def book(self, user, key='booking-1', body=None):
+        client = APIClient()
+        # A fresh token per request, as after a refresh
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(user)}', HTTP_IDEMPOTENCY_KEY=key)
+        return client.post('/api/appointments/', body or self.body, format='json')
+
+    def test_retry_with_a_new_token_is_replayed(self):
+        first = self.book(self.patient)
+        self.assertEqual(first.status_code, 201)
+        retry = self.book(self.patient)
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(Appointment.objects.count(), 1)
+
+    def test_keys_are_per_user(self):
+        self.book(self.patient)
+        # Same key from somebody else is a different request: the slot is taken
+        response = self.book(self.other)
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(response.has_header('Idempotent-Replayed'))
+
+    def test_reused_key_with_another_body(self):
+        self.book(self.patient)
+        response = self.book(self.patient, body={**self.body, 'appointment_time': '10:00'})
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(Appointment.objects.count(), 1)
+
+    def test_retry_while_in_flight(self):
+        self.book(self.patient)
+        cache.set(next(iter(cache.keys('idempotency:*'))), IN_FLIGHT)
+        self.assertEqual(self.book(self.patient).status_code, 409)
+
+    def test_invalid_credentials_are_not_stored(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION='Bearer not-a-token', HTTP_IDEMPOTENCY_KEY='booking-1')
+        self.assertEqual(client.post('/api/appointments/', self.body, format='json').status_code, 401)
+        self.assertEqual(self.book(self.patient).status_code, 201)